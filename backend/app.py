@@ -1,17 +1,20 @@
-from flask import Flask, jsonify, request, send_file
+from flask import Flask, Response, jsonify, request, send_file, stream_with_context, url_for
 from flask_cors import CORS
 import os
-import requests
 from pathlib import Path
 from dotenv import load_dotenv
-from video_separator import separate_video
-from video_analyzer import analyze_all_videos
-from sum_up import combine_analysis_results
-import uuid
-import cv2
-import numpy as np
-import tempfile
+from job_queue import FINAL_EVENTS, JobQueue
+from pipeline import SEPARATED_FOLDER, get_results_store, handle_job, job_paths
+from result_cache import RESULT_CACHE_DIR
+from storage import StorageManager
+from frame_server import FrameServer, read_frames, build_sprite, build_zip
+from timeline import parse_segments
+from video_separator import load_time_map, source_time_to_clip
+from metrics import registry as metrics
+import io
+import json
 import time
+import uuid
 from werkzeug.utils import secure_filename
 
 # 加载环境变量
@@ -22,7 +25,7 @@ else:
     print("Warning: .env file not found, using system environment variables")
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=["X-Storyboard-Layout"])
 
 # 确保上传目录存在
 UPLOAD_FOLDER = 'uploads'
@@ -30,31 +33,58 @@ if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+# 上传大小上限，默认 16MB；Werkzeug 会把较大的上传先写入临时文件，不占用内存
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv("UPLOAD_MAX_BYTES", str(16 * 1024 * 1024)))
 
 # 确保上传文件夹存在
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-os.makedirs('separated_videos', exist_ok=True)
+os.makedirs(SEPARATED_FOLDER, exist_ok=True)
 
-def get_video_frame(video_path, timestamp):
-    """获取视频指定时间点的帧"""
-    cap = cv2.VideoCapture(video_path)
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    frame_number = int(timestamp * fps)
-    
-    cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
-    ret, frame = cap.read()
-    cap.release()
-    
-    if not ret:
-        return None
-    
-    return frame
+# 后台任务队列
+job_queue = JobQueue(handle_job)
+job_queue.start()
+metrics.register_collector(job_queue.update_metrics)
+
+# 存储清理：按配额和过期时间删除上传文件与分割结果，跳过排队中和运行中任务的文件
+storage = StorageManager(
+    {"uploads": UPLOAD_FOLDER, "separated": SEPARATED_FOLDER},
+    in_use=lambda: [path for job in job_queue.active() for path in job_paths(job)]
+)
+storage.start()
+
+# 视频帧服务（复用解码器并缓存 JPEG）
+frame_server = FrameServer()
+# 抽帧接口只读取这些目录下的视频（上传文件、分割结果和结果缓存）
+FRAME_ROOTS = [os.path.realpath(folder) for folder in (UPLOAD_FOLDER, SEPARATED_FOLDER, RESULT_CACHE_DIR)]
+
+# 事件流轮询间隔，以及无新事件时发送心跳的间隔（秒）
+EVENT_POLL_INTERVAL = float(os.getenv("EVENT_POLL_INTERVAL", "0.5"))
+EVENT_HEARTBEAT_INTERVAL = 15
 
 @app.route('/api/hello', methods=['GET'])
 def hello():
     return jsonify({"message": "Hello from Flask!"})
 
+@app.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus 格式的运行指标（每个进程独立统计）"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+def _full_res_flag(value):
+    """是否保留全分辨率视角视频；未指定时返回 None，使用 SEPARATOR_FULL_RES"""
+    if value is None or value == '':
+        return None
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+def _frame_source_allowed(video_path):
+    """客户端传入的视频路径是否位于允许抽帧的目录内（解析符号链接和 ..）"""
+    path = os.path.realpath(video_path)
+    return any(os.path.commonpath([root, path]) == root for root in FRAME_ROOTS)
+
+def _view_path(result, view):
+    """视角视频路径：优先全分辨率版本，否则为分析用的小视频"""
+    return result.get("full_res_videos", {}).get(view) or result.get("separated_videos", {}).get(view)
+
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
     if 'video' not in request.files:
@@ -65,32 +95,24 @@ def upload_file():
         return jsonify({"error": "没有选择文件"}), 400
     
     if file:
-        # 保存文件
-        filename = os.path.join(app.config['UPLOAD_FOLDER'], file.filename)
+        # 保存文件：文件名加唯一前缀，同名文件的并发上传不会互相覆盖
+        safe_name = secure_filename(file.filename) or "video.mp4"
+        filename = os.path.join(app.config['UPLOAD_FOLDER'], f"{uuid.uuid4().hex}_{safe_name}")
         file.save(filename)
         
-        try:
-            # 分割视频
-            separated_videos = separate_video(filename)
-            
-            # 分析视频
-            analysis_results = analyze_all_videos(separated_videos)
-            
-            # 汇总分析结果
-            combined_result = combine_analysis_results(analysis_results)
-            
-            return jsonify({
-                "message": "File uploaded, split and analyzed successfully",
-                "filename": file.filename,
-                "separated_videos": separated_videos,
-                "analysis_results": analysis_results,
-                "combined_result": combined_result
-            }), 200
-        except Exception as e:
-            return jsonify({
-                "error": f"处理失败: {str(e)}",
-                "filename": file.filename
-            }), 500
+        # 提交后台任务
+        job_id = job_queue.submit("file", {
+            "source": "file",
+            "path": filename,
+            "filename": file.filename,
+            "full_res": _full_res_flag(request.form.get('full_res'))
+        })
+        return jsonify({
+            "message": "File uploaded, processing started",
+            "job_id": job_id,
+            "filename": file.filename,
+            "status_url": f"/api/status/{job_id}"
+        }), 202
 
 @app.route('/api/upload-url', methods=['POST'])
 def upload_from_url():
@@ -98,76 +120,245 @@ def upload_from_url():
     if not data or 'url' not in data:
         return jsonify({"error": "请提供视频URL"}), 400
     
-    url = data['url']
+    # 下载和处理都在后台任务中进行
+    job_id = job_queue.submit("url", {
+        "source": "url",
+        "url": data['url'],
+        "full_res": _full_res_flag(data.get('full_res'))
+    })
+    return jsonify({
+        "message": "任务已提交",
+        "job_id": job_id,
+        "status_url": f"/api/status/{job_id}"
+    }), 202
+
+@app.route('/api/status/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "任务不存在"}), 404
+    
+    job.pop("payload", None)
+    return jsonify(job), 200
+
+def _sse(event_id, event_type, data):
+    """按 Server-Sent Events 格式编码一条事件"""
+    return f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.route('/api/events/<job_id>', methods=['GET'])
+def job_events(job_id):
+    """
+    以 Server-Sent Events 推送任务进度和部分结果，任务结束（done / failed 事件）后关闭
+    
+    断线重连时浏览器会带上 Last-Event-ID，从该事件之后继续推送；也可用 ?after=<id> 指定
+    """
+    if job_queue.get(job_id) is None:
+        return jsonify({"error": "任务不存在"}), 404
     try:
-        # 下载视频
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
-        
-        # 生成唯一文件名
-        filename = f"{uuid.uuid4()}.mp4"
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        
-        # 保存文件
-        with open(filepath, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
-        
-        try:
-            # 分割视频
-            separated_videos = separate_video(filepath)
-            
-            # 分析视频
-            analysis_results = analyze_all_videos(separated_videos)
-            
-            # 汇总分析结果
-            combined_result = combine_analysis_results(analysis_results)
-            
-            return jsonify({
-                "message": "文件上传、分割和分析成功",
-                "filename": filename,
-                "separated_videos": separated_videos,
-                "analysis_results": analysis_results,
-                "combined_result": combined_result
-            }), 200
-        except Exception as e:
-            return jsonify({
-                "error": f"处理失败: {str(e)}",
-                "filename": filename
-            }), 500
-            
-    except requests.exceptions.RequestException as e:
-        return jsonify({"error": f"下载视频失败: {str(e)}"}), 400
-    except Exception as e:
-        return jsonify({"error": f"处理失败: {str(e)}"}), 500
+        after = int(request.headers.get('Last-Event-ID') or request.args.get('after') or 0)
+    except ValueError:
+        return jsonify({"error": "无效的事件 ID"}), 400
+    
+    def stream():
+        last_id = after
+        last_sent = time.monotonic()
+        while True:
+            events = job_queue.events(job_id, after=last_id)
+            if not events:
+                job = job_queue.get(job_id)
+                if job["status"] in FINAL_EVENTS:
+                    # 结束事件可能刚刚写入；仍然没有时（例如事件表出现前完成的任务）按任务状态补发
+                    events = job_queue.events(job_id, after=last_id)
+                    if not events:
+                        data = {"result": job["result"]} if job["status"] == "done" else {"error": job["error"]}
+                        yield _sse(last_id, job["status"], data)
+                        return
+            for event in events:
+                last_id = event["id"]
+                yield _sse(event["id"], event["type"], event["data"])
+                if event["type"] in FINAL_EVENTS:
+                    return
+            if events:
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= EVENT_HEARTBEAT_INTERVAL:
+                # 注释行保持连接，避免被代理超时断开
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+            time.sleep(EVENT_POLL_INTERVAL)
+    
+    return Response(stream_with_context(stream()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        # 关闭 Nginx 缓冲，事件才能立即送达
+        'X-Accel-Buffering': 'no'
+    })
 
-@app.route('/api/get_frame', methods=['POST'])
+@app.route('/api/download/<job_id>', methods=['GET'])
+def download_result(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "任务不存在"}), 404
+    if job["status"] == "failed":
+        return jsonify({"error": f"处理失败: {job['error']}", "status": job["status"]}), 500
+    if job["status"] != "done":
+        return jsonify({"error": "任务尚未完成", "status": job["status"], "stage": job["stage"]}), 409
+    
+    result = job["result"]
+    view = request.args.get('view')
+    if view is None:
+        return jsonify(result), 200
+    
+    # 下载指定视角的分割视频（有全分辨率版本时优先）
+    video_path = _view_path(result, view)
+    if not video_path or not os.path.exists(video_path):
+        return jsonify({"error": "视频文件不存在"}), 404
+    response = send_file(
+        os.path.abspath(video_path),
+        mimetype='video/mp4',
+        as_attachment=True,
+        download_name=os.path.basename(video_path)
+    )
+    storage.touch(video_path)
+    return response
+
+@app.route('/api/get_frame', methods=['GET', 'POST'])
 def get_frame():
     try:
-        data = request.json
+        # GET 参数可以直接作为链接使用（例如搜索结果中的 frame_url）
+        data = request.args if request.method == 'GET' else request.json
         video_path = data.get('video_path')
         timestamp = float(data.get('timestamp', 0))
+        width = data.get('width')
+        quality = data.get('quality')
+        width = int(width) if width else None
+        quality = min(100, max(1, int(quality))) if quality else None
         
+        if video_path and not _frame_source_allowed(video_path):
+            return jsonify({'error': '不允许访问该视频路径'}), 400
         if not video_path or not os.path.exists(video_path):
             return jsonify({'error': '视频文件不存在'}), 400
         
-        frame = get_video_frame(video_path, timestamp)
-        if frame is None:
+        # 分析用视频去掉了静止帧时，按时间映射换算到视频内的时间
+        time_map = load_time_map(video_path)
+        read_at = source_time_to_clip(time_map, timestamp) if time_map else timestamp
+        jpeg = frame_server.get_jpeg(video_path, read_at, width=width, quality=quality)
+        # 取帧后再记录使用时间（只改访问时间，不影响按修改时间缓存的解码器和帧）
+        storage.touch(video_path)
+        if jpeg is None:
             return jsonify({'error': '无法获取指定时间点的帧'}), 400
         
-        # 将帧保存为临时文件
-        temp_file = tempfile.NamedTemporaryFile(suffix='.jpg', delete=False)
-        cv2.imwrite(temp_file.name, frame)
-        
+        # 直接从内存返回 JPEG，不再写临时文件
         return send_file(
-            temp_file.name,
+            io.BytesIO(jpeg),
             mimetype='image/jpeg',
-            as_attachment=True,
+            as_attachment=request.method == 'POST',
             download_name=f'frame_{timestamp}.jpg'
         )
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/search', methods=['GET'])
+def search_segments():
+    """
+    搜索已分析视频的片段（全文检索 + 时间范围）
+    
+    Query:
+        q: 描述中包含的词，例如 "right arm battery door"
+        view: top/front/right/left，或 timeline（合并后的时间轴）
+        start, end: 只返回与该时间范围（秒）重叠的片段
+        video_hash, limit（默认 50，最多 500）, offset: 可选
+    """
+    store = get_results_store()
+    if store is None:
+        return jsonify({'error': '结果存储未启用'}), 404
+    try:
+        start = request.args.get('start')
+        end = request.args.get('end')
+        results = store.search(
+            query=request.args.get('q'),
+            view=request.args.get('view'),
+            start=float(start) if start else None,
+            end=float(end) if end else None,
+            video_hash=request.args.get('video_hash'),
+            limit=min(500, max(1, int(request.args.get('limit', 50)))),
+            offset=max(0, int(request.args.get('offset', 0)))
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # 每个片段附带开始时间的截图链接
+    for result in results:
+        result["frame_url"] = url_for(
+            'get_frame', video_path=result["video_path"], timestamp=result["start"]
+        ) if result["video_path"] else None
+    return jsonify({"results": results, "count": len(results)}), 200
+
+@app.route('/api/storyboard', methods=['POST'])
+def storyboard():
+    """
+    批量抽帧：按时间排序，一次顺序解码，返回拼图 (sprite) 或 JPEG 压缩包 (zip)
+    
+    Body:
+        video_path + timestamps: 指定视频和时间点列表
+        video_path + timeline, 或 job_id + view: 每个时间轴片段取一帧（片段开始时间）
+        format: "sprite"（默认）或 "zip"
+        width, quality, columns: 可选的缩略图宽度、JPEG 质量和拼图列数
+    """
+    try:
+        data = request.get_json() or {}
+        video_path = data.get('video_path')
+        timestamps = data.get('timestamps')
+        timeline = data.get('timeline')
+        
+        if data.get('job_id'):
+            job = job_queue.get(data['job_id'])
+            if job is None or job["status"] != "done":
+                return jsonify({'error': '任务不存在或尚未完成'}), 404
+            view = data.get('view', 'top')
+            video_path = _view_path(job["result"], view)
+            timeline = job["result"]["combined_result"]["timeline"]
+        
+        if timestamps is None and timeline is not None:
+            timestamps = [segment.start for segment in parse_segments(timeline)]
+        if not timestamps:
+            return jsonify({'error': '请提供时间点或时间轴'}), 400
+        if video_path and not _frame_source_allowed(video_path):
+            return jsonify({'error': '不允许访问该视频路径'}), 400
+        if not video_path or not os.path.exists(video_path):
+            return jsonify({'error': '视频文件不存在'}), 400
+        
+        timestamps = [float(timestamp) for timestamp in timestamps]
+        width = int(data.get('width', 320))
+        quality = min(100, max(1, int(data['quality']))) if data.get('quality') else None
+        # 分析用视频去掉了静止帧时，按时间映射换算到视频内的时间
+        time_map = load_time_map(video_path)
+        read_at = [source_time_to_clip(time_map, t) for t in timestamps] if time_map else timestamps
+        frames = read_frames(video_path, read_at)
+        storage.touch(video_path)
+        
+        if data.get('format', 'sprite') == 'zip':
+            archive = build_zip(frames, timestamps, width=width, quality=quality)
+            return send_file(
+                io.BytesIO(archive),
+                mimetype='application/zip',
+                as_attachment=True,
+                download_name='storyboard.zip'
+            )
+        
+        columns = int(data['columns']) if data.get('columns') else None
+        sprite, layout = build_sprite(frames, width, columns=columns, quality=quality)
+        layout["timestamps"] = timestamps
+        response = send_file(
+            io.BytesIO(sprite),
+            mimetype='image/jpeg',
+            download_name='storyboard.jpg'
+        )
+        # 前端按布局信息从拼图中裁出每一帧
+        response.headers['X-Storyboard-Layout'] = json.dumps(layout)
+        return response
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000) 
\ No newline at end of file
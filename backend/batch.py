@@ -0,0 +1,270 @@
+"""
+Offline batch processing of many recordings
+
+Splits videos in a process pool sized to the CPU count, analyzes them through the
+shared, rate-limited Gemini pool and appends one JSON line per recording to the
+output file. Progress is checkpointed to a manifest next to the output, so an
+interrupted run picks up where it stopped: finished recordings are skipped and
+recordings that were already split are not split again.
+
+Example:
+    python batch.py recordings/ --output results.jsonl --split-workers 8 --analyze-workers 4 --rpm 60
+"""
+import os
+import argparse
+import json
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional
+
+from gemini_client import pool
+from pipeline import get_cache, index_result, process_video
+from result_cache import cache_key, hash_file
+import video_separator
+from video_separator import create_separator, without_time_maps
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi", ".mkv", ".webm")
+MANIFEST_SUFFIX = ".manifest.jsonl"
+
+
+def find_videos(inputs: List[str]) -> List[str]:
+    """
+    Videos to process, in a stable order
+
+    Args:
+        inputs: Directories (searched recursively), video files, or manifest files listing
+            one path per line (plain text, or JSON lines with a "path" field)
+
+    Returns:
+        List[str]: Absolute video paths without duplicates
+    """
+    videos = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for dir_path, dir_names, names in os.walk(item):
+                dir_names.sort()
+                videos += [os.path.join(dir_path, name) for name in sorted(names)
+                           if name.lower().endswith(VIDEO_EXTENSIONS)]
+        elif item.lower().endswith(VIDEO_EXTENSIONS):
+            videos.append(item)
+        else:
+            base_dir = os.path.dirname(os.path.abspath(item))
+            with open(item, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line or line.startswith("#"):
+                        continue
+                    path = json.loads(line)["path"] if line.startswith("{") else line
+                    videos.append(os.path.join(base_dir, path))
+    return list(dict.fromkeys(os.path.abspath(video) for video in videos))
+
+
+def load_manifest(path: str) -> Dict[str, Dict]:
+    """Latest checkpoint of every recording; a line cut off by an interruption is ignored"""
+    state: Dict[str, Dict] = {}
+    if not os.path.exists(path):
+        return state
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            state[record["path"]] = record
+    return state
+
+
+def split_recording(video_path: str, work_dir: str, engine: Optional[str] = None) -> Dict:
+    """
+    Hash and split one recording; runs in a worker process
+
+    Returns:
+        Dict: path, video_hash, separated_videos, the engine that split the video and the separator stats
+    """
+    video_hash = hash_file(video_path)
+    cache = get_cache()
+    if cache is not None:
+        engine_used = video_separator.separator_engine(engine, video_path)
+        cached = cache.get_files("split", cache_key(video_hash, video_separator.output_format(engine_used)))
+        if cached is not None:
+            return {"path": video_path, "video_hash": video_hash, "engine": engine_used,
+                    "separated_videos": without_time_maps(cached), "stats": {"cached": True}}
+    separator = create_separator(video_path, os.path.join(work_dir, video_hash[:16]), engine=engine)
+    separated_videos = separator.separate_video()
+    return {"path": video_path, "video_hash": video_hash, "engine": separator.engine,
+            "separated_videos": separated_videos, "stats": separator.stats}
+
+
+class BatchRunner:
+    def __init__(self, output_path: str, work_dir: str, split_workers: int, analyze_workers: int,
+                 engine: Optional[str] = None, retry_failed: bool = True):
+        """
+        Initialize a batch run
+
+        Args:
+            output_path: JSONL file receiving one result per recording
+            work_dir: Directory for the separated videos
+            split_workers: Processes splitting videos
+            analyze_workers: Recordings analyzed at the same time (Gemini requests are
+                further limited by the shared pool's quota)
+            engine: Separator engine, if None then use SEPARATOR_ENGINE
+            retry_failed: Process recordings that failed in an earlier run again
+        """
+        self.output_path = output_path
+        self.manifest_path = output_path + MANIFEST_SUFFIX
+        self.work_dir = work_dir
+        self.split_workers = max(1, split_workers)
+        self.analyze_workers = max(1, analyze_workers)
+        self.engine = engine
+        self.retry_failed = retry_failed
+        self.counts = {"done": 0, "failed": 0, "skipped": 0}
+        self._lock = threading.Lock()
+
+    def _append(self, path: str, record: Dict):
+        """Append a JSON line and flush it, so a crash loses at most the line being written"""
+        with self._lock, open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _checkpoint(self, video_path: str, state: str, **data):
+        self._append(self.manifest_path, {"path": video_path, "state": state, "time": time.time(), **data})
+
+    def _pending(self, videos: List[str]) -> Iterator[Dict]:
+        """Recordings still to process, with the split outputs of an interrupted run where still on disk"""
+        manifest = load_manifest(self.manifest_path)
+        for video_path in videos:
+            record = manifest.get(video_path, {})
+            if record.get("state") == "done" or (record.get("state") == "failed" and not self.retry_failed):
+                self.counts["skipped"] += 1
+                continue
+            clips = record.get("separated_videos") if record.get("state") == "split" else None
+            if clips and not all(os.path.exists(clip) for clip in clips.values()):
+                clips = None
+            yield {"path": video_path, "video_hash": record.get("video_hash"), "separated_videos": clips,
+                   "engine": record.get("engine") if clips else None}
+
+    def _analyze(self, split: Dict) -> Dict:
+        """Analyze, merge and summarize one split recording; runs in the analysis thread pool"""
+        start = time.perf_counter()
+        result = process_video(split["path"], video_hash=split["video_hash"],
+                               separated_videos=split["separated_videos"], engine=split["engine"] or self.engine)
+        index_result(split["path"], result, filename=os.path.basename(split["path"]))
+        failed = {view: segments for view, segments in result["analysis_results"].items()
+                  if segments.startswith("Analysis failed:")}
+        return {
+            "path": split["path"],
+            "status": "failed" if failed else "done",
+            "error": "; ".join(f"{view}: {segments}" for view, segments in failed.items()) or None,
+            "seconds": round(time.perf_counter() - start, 3),
+            **result
+        }
+
+    def _finish(self, video_path: str, record: Dict):
+        status = record["status"]
+        self.counts[status] += 1
+        self._append(self.output_path, record)
+        self._checkpoint(video_path, status, video_hash=record.get("video_hash"), error=record.get("error"))
+        print(f"[{status}] {video_path} ({record.get('seconds', 0):g}s)"
+              + (f": {record['error']}" if record.get("error") else ""))
+
+    def run(self, videos: List[str]) -> Dict[str, int]:
+        """
+        Process every recording not finished in an earlier run
+
+        Splitting runs in a process pool; each split recording is handed to the
+        analysis thread pool as soon as it is ready, so Gemini calls overlap with
+        splitting. At most twice the analysis workers are kept waiting for analysis,
+        which bounds the separated videos on disk.
+
+        Returns:
+            Dict[str, int]: Number of recordings done, failed and skipped
+        """
+        os.makedirs(self.work_dir, exist_ok=True)
+        pending = self._pending(videos)
+        backlog_limit = 2 * self.analyze_workers
+        splitting = {}
+        analyzing = {}
+        with ProcessPoolExecutor(max_workers=self.split_workers) as splitters, \
+                ThreadPoolExecutor(max_workers=self.analyze_workers, thread_name_prefix="batch-analyze") as analyzers:
+
+            def fill():
+                # Keep every split process busy while the analysis backlog is bounded
+                while len(splitting) < self.split_workers and len(analyzing) < backlog_limit + self.analyze_workers:
+                    item = next(pending, None)
+                    if item is None:
+                        return
+                    if item["separated_videos"]:
+                        analyzing[analyzers.submit(self._analyze, item)] = item["path"]
+                    else:
+                        future = splitters.submit(split_recording, item["path"], self.work_dir, self.engine)
+                        splitting[future] = item["path"]
+
+            fill()
+            while splitting or analyzing:
+                finished, _ = wait(list(splitting) + list(analyzing), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    if future in splitting:
+                        video_path = splitting.pop(future)
+                        try:
+                            split = future.result()
+                        except Exception as e:
+                            self._finish(video_path, {"path": video_path, "status": "failed",
+                                                      "error": f"split failed: {e}"})
+                            continue
+                        self._checkpoint(video_path, "split", video_hash=split["video_hash"],
+                                         separated_videos=split["separated_videos"], engine=split["engine"])
+                        analyzing[analyzers.submit(self._analyze, split)] = video_path
+                    else:
+                        video_path = analyzing.pop(future)
+                        try:
+                            record = future.result()
+                        except Exception as e:
+                            record = {"path": video_path, "status": "failed", "error": str(e)}
+                        self._finish(video_path, record)
+                fill()
+        return self.counts
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Split and analyze many recordings offline")
+    parser.add_argument("inputs", nargs="+", help="Directories, video files or manifest files listing videos")
+    parser.add_argument("--output", default="results.jsonl", help="JSONL file the results are appended to")
+    parser.add_argument("--work-dir", default="batch_videos", help="Directory for the separated videos")
+    parser.add_argument("--split-workers", type=int, default=os.cpu_count() or 1,
+                        help="Processes splitting videos (default: CPU cores)")
+    parser.add_argument("--analyze-workers", type=int, default=4, help="Recordings analyzed at the same time")
+    parser.add_argument("--engine", choices=["opencv", "ffmpeg"], default=None,
+                        help="Separator engine (default SEPARATOR_ENGINE)")
+    parser.add_argument("--rpm", type=float, default=None, help="Requests/min limit per API key (default GEMINI_RPM)")
+    parser.add_argument("--tpm", type=float, default=None, help="Input tokens/min limit per API key (default GEMINI_TPM)")
+    parser.add_argument("--skip-failed", action="store_true", help="Do not retry recordings that failed before")
+    args = parser.parse_args(argv)
+
+    if args.rpm is not None:
+        pool.rpm = args.rpm
+    if args.tpm is not None:
+        pool.tpm = args.tpm
+
+    videos = find_videos(args.inputs)
+    if not videos:
+        print("No videos found", file=sys.stderr)
+        sys.exit(1)
+    print(f"Found {len(videos)} recordings")
+
+    runner = BatchRunner(args.output, args.work_dir, args.split_workers, args.analyze_workers,
+                         engine=args.engine, retry_failed=not args.skip_failed)
+    start = time.perf_counter()
+    counts = runner.run(videos)
+    elapsed = time.perf_counter() - start
+    processed = counts["done"] + counts["failed"]
+    print(f"\n--- Batch ---")
+    print(f"Done {counts['done']}, failed {counts['failed']}, skipped {counts['skipped']} in {elapsed:.1f}s"
+          + (f" ({processed / elapsed * 60:.1f} recordings/min)" if processed and elapsed > 0 else ""))
+    print(f"Results: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
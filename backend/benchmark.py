@@ -0,0 +1,222 @@
+"""
+Offline pipeline benchmark
+
+Generates a synthetic four-view recording, then measures the video separator and
+the full split → analyze → combine pipeline against a local Gemini stand-in, so no
+API quota is used.
+
+Example:
+    python benchmark.py --width 2560 --height 480 --duration 30 --jobs 8 --concurrency 4 --latency 2
+"""
+import os
+import argparse
+import json
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+# The analysis modules only check that a key is set; the stand-in never uses it
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+
+import cv2
+import numpy as np
+import gemini_cache
+from fake_genai import FakeClient
+from gemini_client import pool, set_client_factory
+from video_separator import create_separator, separator_engine
+from video_analyzer import analyze_all_videos
+from sum_up import combine_analysis_results
+
+
+def generate_video(path: str, width: int, height: int, duration: float, fps: float) -> int:
+    """
+    Write a synthetic 4-up recording with a moving shape in each view
+
+    Args:
+        path: Output mp4 path
+        width: Total width of the four side-by-side views
+        height: Frame height
+        duration: Length in seconds
+        fps: Frame rate
+
+    Returns:
+        int: Number of frames written
+    """
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    if not writer.isOpened():
+        raise RuntimeError(f"Cannot create video file: {path}")
+    w_sub = width // 4
+    frame_count = int(duration * fps)
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 60, size=(height, width, 3), dtype=np.uint8)
+    radius = max(4, min(w_sub, height) // 10)
+    try:
+        for i in range(frame_count):
+            frame = background.copy()
+            for view in range(4):
+                phase = i / max(1, frame_count - 1)
+                x = view * w_sub + int((0.2 + 0.6 * phase) * w_sub)
+                y = int(height * (0.3 + 0.4 * ((phase * (view + 1)) % 1)))
+                cv2.circle(frame, (x, y), radius, (40 + 50 * view, 200, 255 - 50 * view), -1)
+            writer.write(frame)
+    finally:
+        writer.release()
+    return frame_count
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MiB (Linux reports KiB)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def bench_separator(video_path: str, output_dir: str, repeats: int, engine: Optional[str] = None) -> Dict:
+    """Split the video several times and report frame throughput"""
+    runs = []
+    for _ in range(repeats):
+        separator = create_separator(video_path, output_dir, engine=engine)
+        separator.separate_video()
+        runs.append(separator.stats)
+    total_frames = sum(run["frames"] for run in runs)
+    total_seconds = sum(run["seconds"] for run in runs)
+    return {
+        "engine": separator_engine(engine),
+        "runs": repeats,
+        "frames_per_run": runs[0]["frames"],
+        "fps": round(total_frames / total_seconds, 1) if total_seconds else 0.0,
+        "seconds_per_run": round(total_seconds / repeats, 3),
+    }
+
+
+def bench_pipeline(video_path: str, work_dir: str, jobs: int, concurrency: int,
+                   engine: Optional[str] = None) -> Dict:
+    """Run complete split → analyze → combine jobs in parallel and report latency and throughput"""
+    latencies = []
+    failures = 0
+
+    def run_job(index: int) -> float:
+        start = time.perf_counter()
+        separated = create_separator(video_path, os.path.join(work_dir, f"job{index}"), engine=engine).separate_video()
+        results = analyze_all_videos(separated)
+        combine_analysis_results(results)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(run_job, i) for i in range(jobs)]:
+            try:
+                latencies.append(future.result())
+            except Exception as e:
+                failures += 1
+                print(f"Job failed: {e}", file=sys.stderr)
+    elapsed = time.perf_counter() - start
+
+    report = {
+        "jobs": jobs,
+        "concurrency": concurrency,
+        "failed_jobs": failures,
+        "seconds": round(elapsed, 3),
+        "jobs_per_min": round(len(latencies) / elapsed * 60, 2) if elapsed else 0.0,
+    }
+    if latencies:
+        report.update({
+            "latency_p50": round(percentile(latencies, 50), 3),
+            "latency_p99": round(percentile(latencies, 99), 3),
+            "latency_mean": round(statistics.mean(latencies), 3),
+        })
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the video pipeline against a local Gemini stand-in")
+    parser.add_argument("--width", type=int, default=1280, help="Width of the 4-up source video")
+    parser.add_argument("--height", type=int, default=240, help="Height of the source video")
+    parser.add_argument("--duration", type=float, default=10, help="Source video length in seconds")
+    parser.add_argument("--fps", type=float, default=30, help="Source video frame rate")
+    parser.add_argument("--engine", choices=["opencv", "ffmpeg"], default=None,
+                        help="Separator engine (default SEPARATOR_ENGINE)")
+    parser.add_argument("--split-repeats", type=int, default=3, help="Separator runs for the frames/sec figure")
+    parser.add_argument("--jobs", type=int, default=4, help="Pipeline jobs to run")
+    parser.add_argument("--concurrency", type=int, default=2, help="Pipeline jobs running at the same time")
+    parser.add_argument("--latency", type=float, default=1.0, help="Mean seconds per fake Gemini call")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Relative latency spread")
+    parser.add_argument("--latency-per-mb", type=float, default=0.0, help="Extra fake seconds per MiB sent")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Probability a fake call fails with 503")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the stand-in")
+    parser.add_argument("--quota-rpm", type=int, default=0, help="Requests per minute the stand-in accepts before returning 429")
+    parser.add_argument("--rpm", type=float, default=None, help="Client-side requests/min limit (default GEMINI_RPM)")
+    parser.add_argument("--cache-min-tokens", type=int, default=None,
+                        help="Smallest instruction block put in the context cache, by the client and the stand-in "
+                             "(default GEMINI_CACHE_MIN_TOKENS)")
+    parser.add_argument("--keep", action="store_true", help="Keep the generated files")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    if args.cache_min_tokens is not None:
+        gemini_cache.GEMINI_CACHE_MIN_TOKENS = args.cache_min_tokens
+    client = FakeClient(latency=args.latency, jitter=args.jitter, latency_per_mb=args.latency_per_mb,
+                        failure_rate=args.failure_rate, seed=args.seed, quota_rpm=args.quota_rpm,
+                        cache_min_tokens=gemini_cache.GEMINI_CACHE_MIN_TOKENS)
+    set_client_factory(lambda api_key: client)
+    if args.rpm is not None:
+        pool.rpm = args.rpm
+
+    work_dir = tempfile.mkdtemp(prefix="bench-")
+    try:
+        video_path = os.path.join(work_dir, "synthetic.mp4")
+        start = time.perf_counter()
+        frames = generate_video(video_path, args.width, args.height, args.duration, args.fps)
+        report = {
+            "video": {
+                "width": args.width,
+                "height": args.height,
+                "fps": args.fps,
+                "frames": frames,
+                "bytes": os.path.getsize(video_path),
+                "generate_seconds": round(time.perf_counter() - start, 3),
+            },
+            "separator": bench_separator(video_path, os.path.join(work_dir, "split"), args.split_repeats,
+                                         args.engine),
+            "pipeline": bench_pipeline(video_path, work_dir, args.jobs, args.concurrency, args.engine),
+            "fake_api": {"calls": client.calls, "failures": client.failures, "rate_limited": client.rate_limited,
+                         "input_tokens": client.input_tokens, "cached_tokens": client.cached_tokens,
+                         "caches_created": client.caches_created},
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+        }
+    finally:
+        if args.keep:
+            print(f"Files kept in {work_dir}", file=sys.stderr)
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    video, separator, pipeline = report["video"], report["separator"], report["pipeline"]
+    print("\n--- Benchmark ---")
+    print(f"Source video:  {video['width']}x{video['height']} @ {video['fps']:g} fps, {video['frames']} frames")
+    print(f"Separator:     {separator['fps']} frames/sec ({separator['seconds_per_run']}s per run, {separator['engine']})")
+    print(f"Pipeline:      {pipeline['jobs_per_min']} jobs/min, {pipeline['failed_jobs']} failed")
+    if "latency_p50" in pipeline:
+        print(f"Job latency:   p50 {pipeline['latency_p50']}s, p99 {pipeline['latency_p99']}s")
+    fake_api = report["fake_api"]
+    print(f"Fake API:      {fake_api['calls']} calls, {fake_api['failures']} failures, {fake_api['rate_limited']} rate limited")
+    print(f"Text tokens:   {fake_api['input_tokens']} sent, {fake_api['cached_tokens']} from "
+          f"{fake_api['caches_created']} cached contents")
+    print(f"Peak RSS:      {report['peak_rss_mb']} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+import os
+import pytest
+from benchmark import generate_video
+
+
+@pytest.fixture
+def video_file(tmp_path):
+    """A short synthetic four-view recording"""
+    path = os.path.join(tmp_path, "recording.mp4")
+    generate_video(path, width=320, height=60, duration=1, fps=10)
+    return path
@@ -0,0 +1,227 @@
+import os
+import json
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Dict, Iterator, Optional, Tuple
+from google.genai import types
+
+SUMMARY = "The robot arms pick up a battery, insert it into the compartment and close the door."
+
+SEGMENT_ACTIONS = [
+    "The left robotic arm moves along a straight trajectory toward the center and grasps the container.",
+    "The right robotic arm rotates clockwise at a slow pace, pushing a battery into the compartment.",
+    "Both arms lift upward and retract in synchronization.",
+    "The right robotic arm closes the battery compartment door with light pressure.",
+    "The left robotic arm releases the container and moves back to its start position.",
+]
+
+
+class FakeAPIError(Exception):
+    """Error raised by the stand-in, formatted like the real API's server errors"""
+
+
+class _FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _FakeModels:
+    def __init__(self, client: "FakeClient"):
+        self.client = client
+
+    def _answer(self, contents, config=None) -> str:
+        if getattr(config, "response_mime_type", None) == "application/json":
+            # Merge + summary in one answer; a timeline to rewrite keeps its lines
+            timeline = contents.splitlines() if isinstance(contents, str) else \
+                self.client._segments(seed="merge").splitlines()
+            return json.dumps({"timeline": timeline, "summary": SUMMARY})
+        if isinstance(contents, str):
+            return SUMMARY
+        if isinstance(contents, list):
+            return self.client._segments(seed="merge")
+        return self.client._segments(seed=str(id(contents)))
+
+    def generate_content(self, model: str, contents, config=None) -> _FakeResponse:
+        """Sleep for the configured latency, fail at the configured rate, then return plausible text"""
+        self.client._simulate(contents, config=config)
+        return _FakeResponse(self._answer(contents, config))
+
+    def generate_content_stream(self, model: str, contents, config=None) -> Iterator[_FakeResponse]:
+        """Like generate_content, but the first line arrives after a third of the latency and the rest follow"""
+        delay = self.client._simulate(contents, fraction=1 / 3, config=config)
+        lines = self._answer(contents, config).splitlines(keepends=True)
+        for i, line in enumerate(lines):
+            if i:
+                self.client._sleep(delay * 2 / max(1, len(lines) - 1))
+            yield _FakeResponse(line)
+
+
+class _FakeFiles:
+    def __init__(self, client: "FakeClient"):
+        self.client = client
+        self._files: Dict[str, types.File] = {}
+        self._lock = threading.Lock()
+
+    def upload(self, file, config=None) -> types.File:
+        size = os.path.getsize(file) if isinstance(file, (str, os.PathLike)) else 0
+        self.client._sleep(self.client.latency_per_mb * size / (1024 * 1024))
+        name = f"files/{uuid.uuid4().hex[:12]}"
+        uploaded = types.File(
+            name=name,
+            uri=f"https://fake.local/{name}",
+            mime_type=getattr(config, "mime_type", None),
+            size_bytes=size,
+            state=types.FileState.ACTIVE,
+        )
+        with self._lock:
+            self._files[name] = uploaded
+        return uploaded
+
+    def get(self, name: str) -> types.File:
+        with self._lock:
+            if name not in self._files:
+                raise FakeAPIError(f"404 NOT_FOUND. File {name} does not exist.")
+            return self._files[name]
+
+    def delete(self, name: str):
+        with self._lock:
+            self._files.pop(name, None)
+
+
+class _FakeCaches:
+    def __init__(self, client: "FakeClient"):
+        self.client = client
+        self._caches: Dict[str, Tuple[types.CachedContent, int, float]] = {}
+        self._lock = threading.Lock()
+
+    def create(self, model: str, config=None) -> types.CachedContent:
+        """Store the system instruction; like the API, contents below the minimum size are rejected"""
+        tokens = _text_tokens(getattr(config, "system_instruction", None))
+        if tokens < self.client.cache_min_tokens:
+            raise FakeAPIError(f"400 INVALID_ARGUMENT. Cached content is too small. total_token_count={tokens}, "
+                               f"min_total_token_count={self.client.cache_min_tokens}")
+        ttl = float(str(getattr(config, "ttl", None) or "3600s").rstrip("s"))
+        name = f"cachedContents/{uuid.uuid4().hex[:12]}"
+        cached = types.CachedContent(name=name, model=model, display_name=getattr(config, "display_name", None),
+                                     usage_metadata=types.CachedContentUsageMetadata(total_token_count=tokens))
+        with self._lock:
+            self.client.caches_created += 1
+            self._caches[name] = (cached, tokens, time.monotonic() + ttl)
+        return cached
+
+    def tokens(self, name: str) -> int:
+        """Token count of a live cached content; raises the API's 404 for unknown or expired ones"""
+        with self._lock:
+            entry = self._caches.get(name)
+            if entry is None or time.monotonic() > entry[2]:
+                self._caches.pop(name, None)
+                raise FakeAPIError(f"404 NOT_FOUND. CachedContent {name} not found.")
+            return entry[1]
+
+    def get(self, name: str) -> types.CachedContent:
+        self.tokens(name)
+        with self._lock:
+            return self._caches[name][0]
+
+    def delete(self, name: str):
+        with self._lock:
+            self._caches.pop(name, None)
+
+
+def _text_tokens(contents) -> int:
+    """Rough token count of the text in contents, like gemini_client.estimate_text_tokens"""
+    if not contents:
+        return 0
+    if isinstance(contents, str):
+        return len(contents) // 4 + 1
+    if isinstance(contents, (list, tuple)):
+        return sum(_text_tokens(item) for item in contents)
+    return sum(len(part.text) // 4 + 1 for part in getattr(contents, "parts", None) or [] if part.text)
+
+
+class FakeClient:
+    def __init__(self, api_key: Optional[str] = None, latency: float = 1.0, jitter: float = 0.2,
+                 latency_per_mb: float = 0.0, failure_rate: float = 0.0, segments: int = 6,
+                 seed: Optional[int] = None, quota_rpm: int = 0, cache_min_tokens: int = 0):
+        """
+        Local stand-in for genai.Client with configurable latency and failure rate
+
+        Args:
+            api_key: Ignored; accepted so the stand-in can be used as a client factory
+            latency: Mean seconds per generate_content call
+            jitter: Relative spread of the latency (0.2 means ±20%)
+            latency_per_mb: Extra seconds per MiB of inline video or uploaded file
+            failure_rate: Probability that a call fails with a 503 error
+            segments: Number of MM:SS–MM:SS segments returned per analysis
+            seed: Random seed for reproducible runs
+            quota_rpm: Requests accepted per rolling minute before calls fail with 429 (0 is unlimited)
+            cache_min_tokens: Smallest system instruction caches.create accepts
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.latency_per_mb = latency_per_mb
+        self.failure_rate = failure_rate
+        self.segment_count = segments
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.quota_rpm = quota_rpm
+        self._recent = deque()
+        self.calls = 0
+        self.failures = 0
+        self.rate_limited = 0
+        self.cache_min_tokens = cache_min_tokens
+        self.caches_created = 0
+        # Text tokens sent with requests, and tokens read from cached contents instead
+        self.input_tokens = 0
+        self.cached_tokens = 0
+        self.models = _FakeModels(self)
+        self.files = _FakeFiles(self)
+        self.caches = _FakeCaches(self)
+
+    def _sleep(self, seconds: float):
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def _simulate(self, contents, fraction: float = 1.0, config=None) -> float:
+        """Apply latency (or a fraction of it) and random failures to one call; returns the full latency"""
+        payload = 0
+        for part in getattr(contents, "parts", None) or []:
+            if part.inline_data is not None:
+                payload += len(part.inline_data.data)
+        cached_content = getattr(config, "cached_content", None)
+        cached = self.caches.tokens(cached_content) if cached_content else 0
+        sent = _text_tokens(contents) + _text_tokens(getattr(config, "system_instruction", None))
+        with self._lock:
+            self.calls += 1
+            self.input_tokens += sent
+            self.cached_tokens += cached
+            if self.quota_rpm:
+                now = time.monotonic()
+                while self._recent and now - self._recent[0] >= 60:
+                    self._recent.popleft()
+                if len(self._recent) >= self.quota_rpm:
+                    self.rate_limited += 1
+                    raise FakeAPIError("429 RESOURCE_EXHAUSTED. Quota exceeded for requests per minute.")
+                self._recent.append(now)
+            delay = self.latency * (1 + self._random.uniform(-self.jitter, self.jitter))
+            fail = self._random.random() < self.failure_rate
+            if fail:
+                self.failures += 1
+        self._sleep(delay * fraction + self.latency_per_mb * payload / (1024 * 1024))
+        if fail:
+            raise FakeAPIError("503 UNAVAILABLE. The model is overloaded. Please try again later.")
+        return delay
+
+    def _segments(self, seed: str) -> str:
+        """Build a segment list in the MM:SS–MM:SS : description format"""
+        rng = random.Random(seed)
+        lines = []
+        start = 0
+        for _ in range(self.segment_count):
+            end = start + rng.randint(2, 5)
+            lines.append(f"{start // 60:02d}:{start % 60:02d}–{end // 60:02d}:{end % 60:02d} : {rng.choice(SEGMENT_ACTIONS)}")
+            start = end
+        return "\n".join(lines)
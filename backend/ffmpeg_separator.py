@@ -0,0 +1,194 @@
+import os
+import subprocess
+import time
+from typing import Dict, List, Optional, Tuple
+import cv2
+from metrics import registry as metrics
+from video_separator import FFMPEG_BINARY, SEPARATOR_FFMPEG_PRESET, VIEWS, VideoSeparator, separator_engine
+
+# Threads for decoding and for the filter graph; 0 lets FFmpeg use every core
+SEPARATOR_FFMPEG_THREADS = int(os.getenv("SEPARATOR_FFMPEG_THREADS", "0"))
+
+# Encoder arguments of each preset, and the option its quality maps to: (flag, worst, best, default)
+CODEC_PRESETS: Dict[str, Dict] = {
+    # Same codec as the OpenCV engine's mp4v writer, and the cheapest to encode
+    "mpeg4": {"encoder": ["-c:v", "mpeg4"], "quality": ("-q:v", 31, 1, 5)},
+    # Smaller clips to upload, at a few times the encode cost
+    "h264": {"encoder": ["-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p"],
+             "quality": ("-crf", 51, 0, 23)},
+    "h264-ultrafast": {"encoder": ["-c:v", "libx264", "-preset", "ultrafast", "-tune", "fastdecode",
+                                   "-pix_fmt", "yuv420p"],
+                       "quality": ("-crf", 51, 0, 26)},
+}
+
+
+def codec_args(preset: str, quality: int = 0) -> List[str]:
+    """
+    FFmpeg output arguments of a codec preset
+
+    Args:
+        preset: Name in CODEC_PRESETS
+        quality: 1-100 as in the analysis profiles; 0 keeps the preset's default
+
+    Returns:
+        List[str]: Encoder arguments
+    """
+    if preset not in CODEC_PRESETS:
+        raise ValueError(f"Unknown codec preset: {preset} (available: {', '.join(CODEC_PRESETS)})")
+    flag, worst, best, default = CODEC_PRESETS[preset]["quality"]
+    value = round(worst + (best - worst) * (min(100, quality) - 1) / 99) if quality > 0 else default
+    return CODEC_PRESETS[preset]["encoder"] + [flag, str(value)]
+
+
+class FFmpegSeparator(VideoSeparator):
+    """
+    VideoSeparator that splits with a single FFmpeg process
+    
+    One filter graph decodes the input once, splits it and crops, samples, scales and
+    rotates every view, with decoding, filtering and the encoders running on FFmpeg's
+    own threads. Output paths, sizes, frame sampling and stats match VideoSeparator.
+    """
+    
+    def __init__(self, input_path: Optional[str] = None, output_dir: Optional[str] = None,
+                 preset: Optional[str] = None, threads: Optional[int] = None, **kwargs):
+        """
+        Initialize FFmpeg video separator
+        
+        Args:
+            input_path: Input video path, if None then use default path
+            output_dir: Output directory path, if None then use default path
+            preset: Codec preset in CODEC_PRESETS, if None then use SEPARATOR_FFMPEG_PRESET
+            threads: Decoder and filter threads, if None then use SEPARATOR_FFMPEG_THREADS
+            **kwargs: VideoSeparator options (full_res, profiles, static_threshold, ...)
+        """
+        super().__init__(input_path, output_dir, **kwargs)
+        self.preset = preset or SEPARATOR_FFMPEG_PRESET
+        self.threads = SEPARATOR_FFMPEG_THREADS if threads is None else threads
+        self.engine = "ffmpeg"
+    
+    @staticmethod
+    def _sample(source_fps: float, clip_fps: float) -> List[str]:
+        """
+        Filters keeping every step-th frame with the same rounding as VideoSeparator
+        
+        Frame n is kept when some k has ceil(k * step) == n, i.e. when floor(n / step)
+        increases at n; timestamps are then renumbered to the clip frame rate.
+        """
+        step = source_fps / clip_fps
+        if step <= 1:
+            return []
+        return [f"select='eq(n,0)+gt(floor(n/{step:.6f}),floor((n-1)/{step:.6f}))'",
+                f"setpts=N/({clip_fps:.6f}*TB)"]
+    
+    def _build_command(self, paths: Dict[str, str], full_res_paths: Dict[str, str],
+                       quadrant: int, w_sub: int, h_sub: int, source_fps: float,
+                       clip_fps: List[float], sizes: List[Optional[Tuple[int, int]]]) -> List[str]:
+        """FFmpeg command line writing every analysis clip (and full-resolution view) in one pass"""
+        outputs = ["count"] + [f"v{i}" for i in range(len(VIEWS))] + [f"f{i}" for i in range(len(full_res_paths))]
+        graph = [f"[0:v]split={len(outputs)}" + "".join(f"[in_{name}]" for name in outputs)]
+        for i, view in enumerate(VIEWS):
+            crop = f"crop={w_sub}:{h_sub}:{i * quadrant}:0"
+            # The second video needs to be rotated 90 degrees (clockwise)
+            rotate = ["transpose=1"] if i == 1 else []
+            filters = self._sample(source_fps, clip_fps[i]) + [crop]
+            if sizes[i]:
+                filters.append(f"scale={sizes[i][0]}:{sizes[i][1]}:flags=area")
+            graph.append(f"[in_v{i}]" + ",".join(filters + rotate) + f"[v{i}]")
+            if full_res_paths:
+                graph.append(f"[in_f{i}]" + ",".join([crop] + rotate) + f"[f{i}]")
+        
+        command = [FFMPEG_BINARY, "-hide_banner", "-nostdin", "-loglevel", "error", "-y",
+                   "-threads", str(self.threads), "-i", self.input_path,
+                   "-filter_complex", ";".join(graph),
+                   "-filter_complex_threads", str(self.threads or os.cpu_count() or 1),
+                   "-progress", "pipe:1", "-nostats",
+                   # Counts the decoded frames for the stats; FFmpeg's progress reports the first output
+                   "-map", "[in_count]", "-f", "null", "-"]
+        for i, view in enumerate(VIEWS):
+            command += ["-map", f"[v{i}]", "-an", "-r", f"{clip_fps[i]:.6f}",
+                        *codec_args(self.preset, self.profiles[view]["quality"]), paths[view]]
+        for i, view in enumerate(full_res_paths):
+            command += ["-map", f"[f{i}]", "-an", *codec_args(self.preset), full_res_paths[view]]
+        return command
+    
+    @staticmethod
+    def _frame_count(path: str) -> int:
+        """Frames written to a clip, read from its header"""
+        cap = cv2.VideoCapture(path)
+        try:
+            return int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        finally:
+            cap.release()
+    
+    def separate_video(self) -> Dict[str, str]:
+        """
+        Separate video into four perspectives with one FFmpeg filter graph
+        
+        Static-frame dropping decides per frame in Python, and a pipe cannot be probed
+        for its size before decoding; both cases are handed to VideoSeparator, and
+        self.engine then reports "opencv".
+        
+        Returns:
+            Dict[str, str]: Dictionary containing paths to four perspectives analysis clips
+        """
+        if separator_engine("ffmpeg", self.input_path, self.static_threshold) != "ffmpeg":
+            self.engine = "opencv"
+            return super().separate_video()
+        self.engine = "ffmpeg"
+        
+        self._setup_output_dir()
+        cap = cv2.VideoCapture(self.input_path)
+        if not cap.isOpened():
+            raise RuntimeError(f"Cannot open video file: {self.input_path}")
+        try:
+            video_info = self._get_video_info(cap)
+        finally:
+            cap.release()
+        
+        # Even crop sizes, which yuv420p encoders such as libx264 require
+        quadrant = video_info["width"] // 4
+        w_sub = quadrant // 2 * 2
+        h_sub = video_info["height"] // 2 * 2
+        source_fps = video_info["fps"] or 30.0
+        clip_fps = []
+        sizes = []
+        for view in VIEWS:
+            profile = self.profiles[view]
+            clip_fps.append(profile["fps"] if 0 < profile["fps"] < source_fps else source_fps)
+            sizes.append(self._analysis_size(w_sub, h_sub, profile["max_dim"]))
+        
+        analysis_paths = self._output_paths()
+        full_res_paths = self._output_paths("_full") if self.full_res else {}
+        command = self._build_command(analysis_paths, full_res_paths, quadrant, w_sub, h_sub,
+                                      source_fps, clip_fps, sizes)
+        
+        start_time = time.perf_counter()
+        process = subprocess.run(command, capture_output=True, text=True)
+        elapsed = time.perf_counter() - start_time
+        if process.returncode != 0:
+            raise RuntimeError(f"Failed to separate video with ffmpeg: {process.stderr.strip()[-500:]}")
+        
+        frame_count = 0
+        for line in process.stdout.splitlines():
+            if line.startswith("frame="):
+                frame_count = int(line.split("=", 1)[1] or 0)
+        
+        # Remove time maps left over from an earlier split with static-frame dropping
+        self._write_time_maps(analysis_paths, clip_fps, [[] for _ in VIEWS], [0] * len(VIEWS))
+        
+        self.stats = {
+            "frames": frame_count,
+            "clip_frames": {view: self._frame_count(analysis_paths[view]) for view in VIEWS},
+            "static_frames_dropped": {view: 0 for view in VIEWS},
+            "seconds": round(elapsed, 3),
+            "fps": round(frame_count / elapsed, 1) if elapsed > 0 else 0.0,
+            "engine": self.engine
+        }
+        metrics.inc("frames_processed_total", frame_count)
+        metrics.observe("separate_video_seconds", elapsed)
+        metrics.set_gauge("separator_last_fps", self.stats["fps"])
+        print(f"Separated {frame_count} frames with ffmpeg ({self.preset}) in {elapsed:.2f}s "
+              f"({self.stats['fps']} fps), analysis clip frames {self.stats['clip_frames']}")
+        
+        self.full_res_videos = full_res_paths
+        return analysis_paths
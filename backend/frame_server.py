@@ -0,0 +1,320 @@
+import os
+import io
+import json
+import math
+import threading
+import zipfile
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import cv2
+import numpy as np
+
+# Frame server settings
+FRAME_DECODER_POOL_SIZE = int(os.getenv("FRAME_DECODER_POOL_SIZE", "8"))
+FRAME_CACHE_MAX_BYTES = int(os.getenv("FRAME_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Targets at most this many frames ahead are reached by decoding forward instead of seeking
+FRAME_FORWARD_DECODE_LIMIT = int(os.getenv("FRAME_FORWARD_DECODE_LIMIT", "90"))
+FRAME_DEFAULT_QUALITY = int(os.getenv("FRAME_DEFAULT_QUALITY", "90"))
+# Frame rates remembered per open decoder slot, so cached frames of recently closed videos stay servable
+FPS_ENTRIES_PER_DECODER = 16
+
+
+class _Decoder:
+    """An open video with its current read position"""
+
+    def __init__(self, video_path: str):
+        self.cap = cv2.VideoCapture(video_path)
+        if not self.cap.isOpened():
+            raise RuntimeError(f"Cannot open video file: {video_path}")
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 0.0
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        # Index of the frame the next read() returns
+        self.position = 0
+        self.last_index = -1
+        self.last_frame: Optional[np.ndarray] = None
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def frame_index(self, timestamp: float) -> int:
+        """Convert a timestamp in seconds to a frame index"""
+        return int(timestamp * self.fps)
+
+    def read(self, index: int) -> Optional[np.ndarray]:
+        """
+        Decode the frame at an index; the caller must hold self.lock
+
+        Sequential requests (scrubbing forward) decode forward from the current
+        position. Anything else seeks, which FFmpeg serves from the nearest
+        preceding keyframe.
+        """
+        if index < 0 or (self.frame_count > 0 and index >= self.frame_count):
+            return None
+        if index == self.last_index:
+            return self.last_frame
+
+        if not (self.position <= index <= self.position + FRAME_FORWARD_DECODE_LIMIT):
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+            self.position = index
+        while self.position < index:
+            if not self.cap.grab():
+                return None
+            self.position += 1
+
+        ret, frame = self.cap.read()
+        if not ret:
+            # Leave the position unknown so the next request seeks
+            self.position = -FRAME_FORWARD_DECODE_LIMIT - 1
+            return None
+        self.position = index + 1
+        self.last_index = index
+        self.last_frame = frame
+        return frame
+
+    def release(self):
+        self.closed = True
+        self.cap.release()
+
+
+def _resize_to_width(frame: np.ndarray, width: Optional[int]) -> np.ndarray:
+    """Scale a frame down to a width, keeping its aspect ratio"""
+    if width and width < frame.shape[1]:
+        height = max(1, round(frame.shape[0] * width / frame.shape[1]))
+        frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+    return frame
+
+
+def encode_jpeg(frame: np.ndarray, width: Optional[int] = None, quality: Optional[int] = None) -> bytes:
+    """
+    Encode a frame as JPEG, optionally scaled down to a thumbnail width
+
+    Args:
+        frame: BGR frame
+        width: Target width in pixels; the frame is never scaled up
+        quality: JPEG quality 1-100, if None then use FRAME_DEFAULT_QUALITY
+
+    Returns:
+        bytes: JPEG data
+    """
+    frame = _resize_to_width(frame, width)
+    quality = FRAME_DEFAULT_QUALITY if quality is None else quality
+    ok, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise RuntimeError("Failed to encode frame as JPEG")
+    return buffer.tobytes()
+
+
+def read_frames(video_path: str, timestamps: List[float]) -> List[Optional[np.ndarray]]:
+    """
+    Decode the frames at many timestamps in one forward pass over the file
+
+    Timestamps are visited in sorted order with a dedicated decoder, so nearby
+    targets are reached by decoding forward and only large gaps seek.
+
+    Args:
+        video_path: Video file path
+        timestamps: Times in seconds, in any order
+
+    Returns:
+        List[Optional[np.ndarray]]: Frames in the order of timestamps; None where a timestamp is outside the video
+    """
+    decoder = _Decoder(video_path)
+    try:
+        indices = [decoder.frame_index(timestamp) for timestamp in timestamps]
+        frames: Dict[int, Optional[np.ndarray]] = {}
+        for index in sorted(set(indices)):
+            frames[index] = decoder.read(index)
+        return [frames[index] for index in indices]
+    finally:
+        decoder.release()
+
+
+def build_sprite(frames: List[Optional[np.ndarray]], width: int, columns: Optional[int] = None,
+                 quality: Optional[int] = None) -> Tuple[bytes, Dict]:
+    """
+    Tile frames into a single JPEG sprite sheet
+
+    Args:
+        frames: Frames to tile, left to right and top to bottom; None leaves a black tile
+        width: Tile width in pixels
+        columns: Tiles per row, if None then a roughly square grid
+        quality: JPEG quality, if None then use FRAME_DEFAULT_QUALITY
+
+    Returns:
+        Tuple[bytes, Dict]: JPEG data and the layout (columns, rows, tile_width, tile_height)
+    """
+    available = [frame for frame in frames if frame is not None]
+    if not available:
+        raise ValueError("No frames to tile")
+    sample = _resize_to_width(available[0], width)
+    tile_height, tile_width = sample.shape[:2]
+    columns = columns or math.ceil(math.sqrt(len(frames)))
+    rows = math.ceil(len(frames) / columns)
+
+    sheet = np.zeros((rows * tile_height, columns * tile_width, 3), dtype=np.uint8)
+    for i, frame in enumerate(frames):
+        if frame is None:
+            continue
+        tile = cv2.resize(frame, (tile_width, tile_height), interpolation=cv2.INTER_AREA)
+        y0 = (i // columns) * tile_height
+        x0 = (i % columns) * tile_width
+        sheet[y0:y0 + tile_height, x0:x0 + tile_width] = tile
+
+    layout = {"columns": columns, "rows": rows, "tile_width": tile_width, "tile_height": tile_height}
+    return encode_jpeg(sheet, quality=quality), layout
+
+
+def build_zip(frames: List[Optional[np.ndarray]], timestamps: List[float], width: Optional[int] = None,
+              quality: Optional[int] = None) -> bytes:
+    """
+    Pack frames as individual JPEGs into a zip archive with an index.json
+
+    Args:
+        frames: Frames in the order of timestamps; None entries are skipped
+        timestamps: Time in seconds of each frame
+        width: Optional thumbnail width
+        quality: Optional JPEG quality
+
+    Returns:
+        bytes: Zip archive data
+    """
+    buffer = io.BytesIO()
+    index = []
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+        for i, (frame, timestamp) in enumerate(zip(frames, timestamps)):
+            if frame is None:
+                continue
+            name = f"frame_{i:04d}_{timestamp:g}.jpg"
+            archive.writestr(name, encode_jpeg(frame, width, quality))
+            index.append({"index": i, "timestamp": timestamp, "file": name})
+        archive.writestr("index.json", json.dumps(index, indent=2))
+    return buffer.getvalue()
+
+
+class FrameServer:
+    def __init__(self, pool_size: Optional[int] = None, cache_max_bytes: Optional[int] = None):
+        """
+        Initialize a frame server with pooled decoders and a JPEG cache
+
+        Args:
+            pool_size: Maximum number of open decoders, if None then use FRAME_DECODER_POOL_SIZE
+            cache_max_bytes: Size limit of the JPEG cache, if None then use FRAME_CACHE_MAX_BYTES
+        """
+        self.pool_size = pool_size or FRAME_DECODER_POOL_SIZE
+        self.cache_max_bytes = FRAME_CACHE_MAX_BYTES if cache_max_bytes is None else cache_max_bytes
+        self._decoders: "OrderedDict[Tuple, _Decoder]" = OrderedDict()
+        self._jpegs: "OrderedDict[Tuple, bytes]" = OrderedDict()
+        self._jpeg_bytes = 0
+        # Frame rate of recently used videos, so cached frames can be served without a decoder
+        self._fps: "OrderedDict[Tuple, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _video_key(video_path: str) -> Tuple:
+        """Identify a video file; a rewritten file gets a new key"""
+        stat = os.stat(video_path)
+        return (os.path.realpath(video_path), stat.st_mtime_ns, stat.st_size)
+
+    def _acquire_decoder(self, video_key: Tuple) -> _Decoder:
+        """Return a locked decoder for a video, opening it and evicting the least recently used one if needed"""
+        while True:
+            with self._lock:
+                decoder = self._decoders.get(video_key)
+                if decoder is not None:
+                    self._decoders.move_to_end(video_key)
+            if decoder is None:
+                # Opening a video takes a while; other videos are served meanwhile
+                opened = _Decoder(video_key[0])
+                evicted = []
+                with self._lock:
+                    decoder = self._decoders.get(video_key)
+                    if decoder is None:
+                        decoder = self._decoders[video_key] = opened
+                        while len(self._decoders) > self.pool_size:
+                            evicted.append(self._decoders.popitem(last=False)[1])
+                    else:
+                        # Another request opened it first
+                        evicted.append(opened)
+                    self._remember_fps(video_key, decoder.fps)
+                for old in evicted:
+                    # Wait for any request still using the decoder before closing it
+                    with old.lock:
+                        old.release()
+            decoder.lock.acquire()
+            if not decoder.closed:
+                return decoder
+            # Evicted between lookup and locking; open it again
+            decoder.lock.release()
+
+    def _remember_fps(self, video_key: Tuple, fps: float):
+        """Record a video's frame rate, forgetting the least recently used ones; the caller holds self._lock"""
+        self._fps[video_key] = fps
+        self._fps.move_to_end(video_key)
+        while len(self._fps) > self.pool_size * FPS_ENTRIES_PER_DECODER:
+            self._fps.popitem(last=False)
+
+    def _cache_get(self, key: Tuple) -> Optional[bytes]:
+        with self._lock:
+            data = self._jpegs.get(key)
+            if data is not None:
+                self._jpegs.move_to_end(key)
+            return data
+
+    def _cache_put(self, key: Tuple, data: bytes):
+        if len(data) > self.cache_max_bytes:
+            return
+        with self._lock:
+            if key in self._jpegs:
+                return
+            self._jpegs[key] = data
+            self._jpeg_bytes += len(data)
+            while self._jpeg_bytes > self.cache_max_bytes:
+                _, old = self._jpegs.popitem(last=False)
+                self._jpeg_bytes -= len(old)
+
+    def get_jpeg(self, video_path: str, timestamp: float, width: Optional[int] = None,
+                 quality: Optional[int] = None) -> Optional[bytes]:
+        """
+        Get the frame at a timestamp as JPEG bytes
+
+        Args:
+            video_path: Video file path
+            timestamp: Time in seconds
+            width: Optional thumbnail width
+            quality: Optional JPEG quality
+
+        Returns:
+            bytes: JPEG data, or None if the timestamp is outside the video
+        """
+        video_key = self._video_key(video_path)
+        with self._lock:
+            fps = self._fps.get(video_key)
+            if fps is not None:
+                self._fps.move_to_end(video_key)
+        if fps is not None:
+            data = self._cache_get((video_key, int(timestamp * fps), width, quality))
+            if data is not None:
+                return data
+
+        decoder = self._acquire_decoder(video_key)
+        try:
+            index = decoder.frame_index(timestamp)
+            frame = decoder.read(index)
+            if frame is None:
+                return None
+            data = encode_jpeg(frame, width, quality)
+        finally:
+            decoder.lock.release()
+        self._cache_put((video_key, index, width, quality), data)
+        return data
+
+    def close(self):
+        """Release all open decoders and drop cached frames"""
+        with self._lock:
+            decoders = list(self._decoders.values())
+            self._decoders.clear()
+            self._jpegs.clear()
+            self._jpeg_bytes = 0
+            self._fps.clear()
+        for decoder in decoders:
+            with decoder.lock:
+                decoder.release()
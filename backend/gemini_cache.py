@@ -0,0 +1,177 @@
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+from google.genai import types
+from gemini_client import estimate_text_tokens, generate_content
+from metrics import registry as metrics
+from prompts import Prompt
+
+# Keep static instruction blocks in Gemini's context cache instead of resending them
+GEMINI_CONTEXT_CACHE = os.getenv("GEMINI_CONTEXT_CACHE", "1") != "0"
+GEMINI_CACHE_TTL = float(os.getenv("GEMINI_CACHE_TTL", "3600"))
+# The API rejects cached contents below a model-dependent size (4096 tokens for gemini-2.0-flash);
+# smaller instructions are sent as the system instruction of each request
+GEMINI_CACHE_MIN_TOKENS = int(os.getenv("GEMINI_CACHE_MIN_TOKENS", "4096"))
+# Stop using a cached content this long before it expires
+CACHE_EXPIRY_MARGIN = 60
+
+
+class CachedContentRegistry:
+    """
+    Process-wide record of instruction blocks stored with the cached-content API
+
+    Entries are keyed by API key, model and the prompt's versioned key, so every
+    request with the same instructions refers to one cached content until it
+    expires, and a new prompt version gets a new one. Concurrent requests wait for
+    a single create call. When creating fails (e.g. the model does not support
+    caching), the instructions are sent inline until the TTL has passed. Expired
+    entries are dropped together with their locks on the next lookup.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Tuple, Tuple[Optional[str], float]] = {}
+        self._key_locks: Dict[Tuple, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _prune(self):
+        """Drop expired entries and unused locks; called with _lock held"""
+        now = time.time()
+        for key, (_, expires) in list(self._entries.items()):
+            key_lock = self._key_locks.get(key)
+            if now >= expires and (key_lock is None or not key_lock.locked()):
+                del self._entries[key]
+                self._key_locks.pop(key, None)
+        # Locks left without an entry, e.g. by invalidate()
+        for key, key_lock in list(self._key_locks.items()):
+            if key not in self._entries and not key_lock.locked():
+                del self._key_locks[key]
+
+    def get_or_create(self, client, api_key: str, model: str, prompt: Prompt,
+                      ttl: Optional[float] = None) -> Optional[str]:
+        """
+        Name of a cached content holding the prompt as system instruction
+
+        Args:
+            client: genai.Client used to create the cache
+            api_key: API key the client was created with; cached contents belong to its project
+            model: Model the cached content is used with
+            prompt: Instruction block to cache
+            ttl: Seconds the cached content lives, if None then use GEMINI_CACHE_TTL
+
+        Returns:
+            str: Cached content name, or None when the instructions have to be sent inline
+        """
+        ttl = GEMINI_CACHE_TTL if ttl is None else ttl
+        key = (api_key, model, prompt.key)
+        with self._lock:
+            self._prune()
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() < entry[1]:
+                metrics.inc("gemini_context_cache_total", result="hit" if entry[0] else "inline")
+                return entry[0]
+
+            try:
+                with metrics.span("gemini_cache_create"):
+                    cached = client.caches.create(model=model, config=types.CreateCachedContentConfig(
+                        display_name=prompt.key,
+                        system_instruction=prompt.text,
+                        ttl=f"{int(ttl)}s",
+                    ))
+                name = cached.name
+                expires = time.time() + ttl - CACHE_EXPIRY_MARGIN
+                metrics.inc("gemini_context_cache_total", result="created")
+            except Exception as e:
+                print(f"Could not cache the {prompt.key} instructions ({e}), sending them inline")
+                name = None
+                expires = time.time() + ttl
+                metrics.inc("gemini_context_cache_total", result="inline")
+            with self._lock:
+                self._entries[key] = (name, expires)
+            return name
+
+    def invalidate(self, api_key: str, model: str, prompt: Prompt):
+        """Forget a cached content, e.g. after Gemini reports it no longer exists"""
+        key = (api_key, model, prompt.key)
+        with self._lock:
+            self._entries.pop(key, None)
+            key_lock = self._key_locks.get(key)
+            if key_lock is not None and not key_lock.locked():
+                del self._key_locks[key]
+
+
+registry = CachedContentRegistry()
+
+
+def instruction_config(model: str, prompt: Prompt, config: Optional[types.GenerateContentConfig] = None,
+                       use_cache: Optional[bool] = None) -> Callable[[object, str], types.GenerateContentConfig]:
+    """
+    Per-key request config carrying a static instruction block
+
+    Args:
+        model: Gemini model name
+        prompt: Instruction block
+        config: Other request settings, e.g. a response schema
+        use_cache: Use the context cache, if None then use GEMINI_CONTEXT_CACHE and
+            GEMINI_CACHE_MIN_TOKENS
+
+    Returns:
+        Callable (client, api_key) -> config referencing the cached content, or with the
+            instructions as system instruction
+    """
+    if use_cache is None:
+        use_cache = GEMINI_CONTEXT_CACHE and estimate_text_tokens(prompt.text) >= GEMINI_CACHE_MIN_TOKENS
+    base = config or types.GenerateContentConfig()
+
+    def build(client, api_key: str) -> types.GenerateContentConfig:
+        name = registry.get_or_create(client, api_key, model, prompt) if use_cache else None
+        if name is not None:
+            return base.model_copy(update={"cached_content": name})
+        return base.model_copy(update={"system_instruction": prompt.text})
+
+    return build
+
+
+def generate_with_instructions(model: str, prompt: Prompt, contents, call: str,
+                               config: Optional[types.GenerateContentConfig] = None,
+                               use_cache: Optional[bool] = None,
+                               on_not_found: Optional[Callable[[str], None]] = None,
+                               estimated_tokens: Optional[int] = None, **kwargs):
+    """
+    generate_content() with a static instruction block kept out of the per-request contents
+
+    Args:
+        model: Gemini model name
+        prompt: Instruction block, cached per key and prompt version when possible
+        contents: The request's own contents (video, segment lists, timeline, ...)
+        call: Call type used in metrics
+        config: Other request settings, e.g. a response schema
+        use_cache: See instruction_config
+        on_not_found: Called with the key after a 403/404, in addition to dropping the cached content
+        estimated_tokens: Input tokens of contents; the instructions are added to it
+        **kwargs: Passed on to GeminiPool.generate_content (on_text, api_key, ...)
+
+    Returns:
+        The generate_content response
+    """
+    if estimated_tokens is None and not callable(contents):
+        estimated_tokens = estimate_text_tokens(contents)
+
+    def not_found(api_key: str):
+        # The cached content expired or was deleted; create it again
+        registry.invalidate(api_key, model, prompt)
+        if on_not_found is not None:
+            on_not_found(api_key)
+
+    return generate_content(
+        model,
+        contents,
+        call=call,
+        estimated_tokens=(estimated_tokens or 0) + estimate_text_tokens(prompt.text),
+        config=instruction_config(model, prompt, config, use_cache),
+        on_not_found=not_found,
+        **kwargs,
+    )
@@ -0,0 +1,331 @@
+import os
+import random
+import re
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+from google import genai
+from metrics import registry as metrics
+
+# Quota per API key; 0 disables the limit
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "0"))
+GEMINI_TPM = float(os.getenv("GEMINI_TPM", "0"))
+# Server processes sharing that quota, each with its own buckets; every process gets an
+# equal share (gunicorn.conf.py sets it to the worker count)
+GEMINI_PROCESSES = max(1, int(os.getenv("GEMINI_PROCESSES", "1")))
+# Retries of rate-limited (429) and server (5xx) errors, with jittered exponential backoff
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "5"))
+GEMINI_BACKOFF_BASE = float(os.getenv("GEMINI_BACKOFF_BASE", "2"))
+GEMINI_BACKOFF_MAX = float(os.getenv("GEMINI_BACKOFF_MAX", "60"))
+
+# Status codes worth retrying, and how they show up in error messages
+RETRY_STATUS = {429, 500, 502, 503, 504}
+NOT_FOUND_STATUS = {403, 404}
+# Errors caused by the key itself; the key is rested and another one is tried
+KEY_FAILURE_STATUS = {403, 429}
+STATUS_PATTERN = re.compile(r"\b(4\d\d|5\d\d)\b")
+
+# Factory used to build Gemini clients; replaced by the benchmark's local stand-in
+_client_factory: Callable[[str], object] = lambda api_key: genai.Client(api_key=api_key)
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    """HTTP status of an API error; google.genai errors carry it as .code, others only in the message"""
+    code = getattr(error, "code", None)
+    if isinstance(code, int):
+        return code
+    match = STATUS_PATTERN.search(str(error))
+    return int(match.group(1)) if match else None
+
+
+def estimate_text_tokens(contents) -> int:
+    """Rough token count of text contents (about four characters per token)"""
+    if isinstance(contents, str):
+        return len(contents) // 4 + 1
+    if isinstance(contents, (list, tuple)):
+        return sum(estimate_text_tokens(item) for item in contents)
+    parts = getattr(contents, "parts", None) or []
+    return sum(len(part.text) // 4 + 1 for part in parts if getattr(part, "text", None))
+
+
+class StreamedResponse(NamedTuple):
+    """Text and usage of a streamed answer, shaped like the parts of a response the callers read"""
+    text: str
+    usage_metadata: object
+
+
+class TokenBucket:
+    """Refills at rate_per_minute / 60 per second up to one minute's worth"""
+
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60
+        self.capacity = rate_per_minute
+        self.level = rate_per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount can be taken; 0 for an unlimited bucket"""
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        # A single request larger than the bucket waits for a full bucket instead of forever
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def take(self, amount: float):
+        """Take amount; may go negative when a request used more than estimated"""
+        if self.rate > 0:
+            self.level -= amount
+
+
+class _KeyState:
+    def __init__(self, rpm: float, tpm: float):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.cooldown_until = 0.0
+
+
+class GeminiPool:
+    """
+    Process-wide access to Gemini shared by all jobs
+
+    Clients are created once per API key and reused, so connections are kept alive.
+    Every request first takes one request and its estimated tokens from the key's
+    token buckets, waiting while the quota is used up. With several keys
+    (GEMINI_API_KEYS) each request goes to the key that can serve it soonest, and a
+    key that returned 429 or 403 is rested for the backoff period. Failed calls are
+    retried with jittered exponential backoff.
+    """
+
+    def __init__(self, rpm: Optional[float] = None, tpm: Optional[float] = None):
+        self.rpm = GEMINI_RPM / GEMINI_PROCESSES if rpm is None else rpm
+        self.tpm = GEMINI_TPM / GEMINI_PROCESSES if tpm is None else tpm
+        self._clients: Dict[str, object] = {}
+        self._states: Dict[str, _KeyState] = {}
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._turn = 0
+
+    @staticmethod
+    def keys() -> List[str]:
+        """API keys from GEMINI_API_KEYS (comma-separated), falling back to GOOGLE_API_KEY"""
+        keys = [key.strip() for key in os.getenv("GEMINI_API_KEYS", "").split(",") if key.strip()]
+        if not keys and os.getenv("GOOGLE_API_KEY"):
+            keys = [os.getenv("GOOGLE_API_KEY")]
+        return keys
+
+    def client(self, api_key: str):
+        """Shared client for an API key"""
+        with self._lock:
+            client = self._clients.get(api_key)
+            if client is None:
+                client = self._clients[api_key] = _client_factory(api_key)
+            return client
+
+    def reset(self):
+        """Drop cached clients, e.g. after the client factory changed"""
+        with self._lock:
+            self._clients.clear()
+
+    def _state(self, api_key: str) -> _KeyState:
+        state = self._states.get(api_key)
+        if state is None:
+            state = self._states[api_key] = _KeyState(self.rpm, self.tpm)
+        return state
+
+    def acquire(self, tokens: int, api_key: Optional[str] = None) -> str:
+        """
+        Wait until a key has quota for one request of this many tokens and take it
+
+        Args:
+            tokens: Estimated tokens of the request
+            api_key: Use only this key, e.g. because the request references files uploaded with it
+
+        Returns:
+            str: The API key to use
+        """
+        keys = [api_key] if api_key else self.keys()
+        if not keys:
+            raise RuntimeError("GOOGLE_API_KEY not found in environment variables")
+        with self._lock:
+            self._waiting += 1
+            metrics.set_gauge("gemini_queue_depth", self._waiting)
+        start = time.perf_counter()
+        try:
+            while True:
+                with self._lock:
+                    now = time.monotonic()
+                    best_wait, best_key = None, None
+                    # Start at a different key each time so equally free keys share the load
+                    self._turn += 1
+                    for key in keys[self._turn % len(keys):] + keys[:self._turn % len(keys)]:
+                        state = self._state(key)
+                        wait = max(state.cooldown_until - now,
+                                   state.requests.wait_time(1, now),
+                                   state.tokens.wait_time(tokens, now))
+                        if best_wait is None or wait < best_wait:
+                            best_wait, best_key = wait, key
+                    if best_wait <= 0:
+                        state = self._state(best_key)
+                        state.requests.take(1)
+                        state.tokens.take(tokens)
+                        return best_key
+                # Re-check at least every second; other waiters may take the quota first
+                time.sleep(min(best_wait, 1.0))
+        finally:
+            with self._lock:
+                self._waiting -= 1
+                metrics.set_gauge("gemini_queue_depth", self._waiting)
+            metrics.observe("gemini_quota_wait_seconds", time.perf_counter() - start)
+
+    def settle(self, api_key: str, estimated: int, actual: Optional[int]):
+        """Charge the difference between estimated and reported token usage"""
+        if actual is None:
+            return
+        with self._lock:
+            self._state(api_key).tokens.take(actual - estimated)
+
+    def cool_down(self, api_key: str, seconds: float):
+        """Keep requests away from a key that is being rate limited"""
+        with self._lock:
+            state = self._state(api_key)
+            state.cooldown_until = max(state.cooldown_until, time.monotonic() + seconds)
+
+    @staticmethod
+    def _stream(client, model: str, request, on_text: Callable[[str, int], None], attempt: int, **kwargs) -> StreamedResponse:
+        """Collect a streamed answer while handing each fragment to on_text"""
+        fragments = []
+        usage = None
+        for chunk in client.models.generate_content_stream(model=model, contents=request, **kwargs):
+            usage = getattr(chunk, "usage_metadata", None) or usage
+            if chunk.text:
+                fragments.append(chunk.text)
+                on_text(chunk.text, attempt)
+        return StreamedResponse("".join(fragments), usage)
+
+    def generate_content(self, model: str, contents, call: str,
+                         estimated_tokens: Optional[int] = None,
+                         api_key: Optional[str] = None,
+                         max_retries: Optional[int] = None,
+                         backoff_base: Optional[float] = None,
+                         on_not_found: Optional[Callable[[str], None]] = None,
+                         on_text: Optional[Callable[[str, int], None]] = None,
+                         **kwargs):
+        """
+        Call generate_content within the quota, retrying rate-limit and server errors
+
+        Args:
+            model: Gemini model name
+            contents: Request contents, or a callable (client, api_key) -> contents for
+                requests that must be built per key (e.g. with uploaded files)
+            call: Call type used in metrics (segments, merge, summary, ...)
+            estimated_tokens: Input tokens charged against the quota before the call;
+                estimated from the text when None
+            api_key: Pin the request to one key instead of rotating
+            max_retries: Attempts in total (at least one), if None then use GEMINI_MAX_RETRIES
+            backoff_base: First backoff delay in seconds, if None then use GEMINI_BACKOFF_BASE
+            on_not_found: Called with the key after a 403/404 (e.g. an expired upload);
+                the request is then rebuilt and retried after the backoff. Without it those
+                errors are raised, except that a 403 is retried on another key when the
+                request is not pinned and there are several keys
+            on_text: Stream the answer and call on_text(fragment, attempt) as text arrives;
+                a new attempt number means earlier fragments belong to a failed try
+            **kwargs: Passed on to generate_content (e.g. config); config may also be a
+                callable (client, api_key) -> config, e.g. to refer to a per-key cached content
+
+        Returns:
+            The generate_content response
+        """
+        if max_retries is None:
+            max_retries = GEMINI_MAX_RETRIES
+        max_retries = max(1, max_retries)
+        if backoff_base is None:
+            backoff_base = GEMINI_BACKOFF_BASE
+        if estimated_tokens is None and not callable(contents):
+            estimated_tokens = estimate_text_tokens(contents)
+        estimated_tokens = estimated_tokens or 0
+
+        for attempt in range(max_retries):
+            key = self.acquire(estimated_tokens, api_key)
+            client = self.client(key)
+            try:
+                request = contents(client, key) if callable(contents) else contents
+                request_kwargs = dict(kwargs)
+                if callable(request_kwargs.get("config")):
+                    request_kwargs["config"] = request_kwargs["config"](client, key)
+                with metrics.span("gemini_latency", call=call):
+                    if on_text is None:
+                        response = client.models.generate_content(model=model, contents=request, **request_kwargs)
+                    else:
+                        response = self._stream(client, model, request, on_text, attempt, **request_kwargs)
+            except Exception as e:
+                metrics.inc("gemini_requests_total", call=call, status="error")
+                status = _status_code(e)
+                not_found = status in NOT_FOUND_STATUS and on_not_found is not None
+                other_key = status == 403 and api_key is None and len(self.keys()) > 1
+                if not (status in RETRY_STATUS or not_found or other_key) or attempt >= max_retries - 1:
+                    raise
+                # Full backoff plus up to the same again in jitter, so waiting callers spread out
+                delay = min(GEMINI_BACKOFF_MAX, backoff_base * 2 ** attempt)
+                delay = delay / 2 + random.uniform(0, delay / 2)
+                if status in KEY_FAILURE_STATUS:
+                    self.cool_down(key, delay)
+                if not_found:
+                    print(f"Gemini request ({call}) referenced a missing file or cached content ({e}), "
+                          f"retrying in {delay:.1f}s (attempt {attempt + 1}/{max_retries})")
+                    metrics.inc("gemini_retries_total", call=call, reason="not_found")
+                    on_not_found(key)
+                else:
+                    print(f"Gemini request ({call}) failed with {status} ({e}), retrying in {delay:.1f}s "
+                          f"(attempt {attempt + 1}/{max_retries})")
+                    metrics.inc("gemini_retries_total", call=call, reason=str(status))
+                time.sleep(delay)
+                continue
+
+            metrics.inc("gemini_requests_total", call=call, status="ok")
+            usage = getattr(response, "usage_metadata", None)
+            actual = getattr(usage, "prompt_token_count", None) if usage is not None else None
+            if actual is not None:
+                metrics.inc("gemini_tokens_total", actual, call=call)
+            cached = getattr(usage, "cached_content_token_count", None) if usage is not None else None
+            if cached:
+                metrics.inc("gemini_cached_tokens_total", cached, call=call)
+            self.settle(key, estimated_tokens, actual)
+            return response
+
+
+pool = GeminiPool()
+
+
+def get_client(api_key: str):
+    """
+    Shared Gemini client for an API key
+
+    Args:
+        api_key: Google API Key
+
+    Returns:
+        genai.Client, or whatever the configured factory returns
+    """
+    return pool.client(api_key)
+
+
+def generate_content(model: str, contents, call: str, **kwargs):
+    """GeminiPool.generate_content() on the process-wide pool"""
+    return pool.generate_content(model, contents, call, **kwargs)
+
+
+def set_client_factory(factory: Optional[Callable[[str], object]]):
+    """
+    Replace the client factory, e.g. with fake_genai.FakeClient for offline runs
+
+    Args:
+        factory: Callable taking an API key and returning a client; None restores genai.Client
+    """
+    global _client_factory
+    _client_factory = factory or (lambda api_key: genai.Client(api_key=api_key))
+    pool.reset()
@@ -0,0 +1,149 @@
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from google.genai import types
+from metrics import registry as metrics
+
+# Clips up to this size are sent inline; larger ones go through the Files API
+GEMINI_INLINE_MAX_BYTES = int(os.getenv("GEMINI_INLINE_MAX_BYTES", str(8 * 1024 * 1024)))
+# Uploaded files expire after 48 hours; stop reusing them a little earlier
+GEMINI_FILE_REUSE_SECONDS = float(os.getenv("GEMINI_FILE_REUSE_SECONDS", str(46 * 3600)))
+GEMINI_FILE_ACTIVE_TIMEOUT = float(os.getenv("GEMINI_FILE_ACTIVE_TIMEOUT", "300"))
+GEMINI_FILE_POLL_INTERVAL = float(os.getenv("GEMINI_FILE_POLL_INTERVAL", "2"))
+
+
+class UploadedFileRegistry:
+    """
+    Process-wide record of videos already uploaded through the Files API
+
+    Entries are keyed by API key, path, size and modification time, so retries and
+    any later request for the same clip reuse the upload instead of sending the bytes
+    again. Concurrent requests for the same clip wait for a single upload. Expired
+    uploads and those of clips that were changed or deleted are dropped together with
+    their locks on the next lookup.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Tuple, Tuple[types.File, float]] = {}
+        self._key_locks: Dict[Tuple, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(api_key: str, path: str) -> Tuple:
+        stat = os.stat(path)
+        return (api_key, os.path.realpath(path), stat.st_size, stat.st_mtime_ns)
+
+    @staticmethod
+    def _is_current(key: Tuple) -> bool:
+        """Whether the clip an entry was uploaded from is still on disk unchanged"""
+        try:
+            stat = os.stat(key[1])
+        except OSError:
+            return False
+        return (stat.st_size, stat.st_mtime_ns) == key[2:]
+
+    def _prune(self):
+        """Drop expired or outdated uploads and unused locks; called with _lock held"""
+        now = time.time()
+        for key, (_, uploaded_at) in list(self._entries.items()):
+            key_lock = self._key_locks.get(key)
+            if key_lock is not None and key_lock.locked():
+                continue
+            if now - uploaded_at >= GEMINI_FILE_REUSE_SECONDS or not self._is_current(key):
+                del self._entries[key]
+                self._key_locks.pop(key, None)
+        # Locks of failed uploads; at worst a clip racing with this is uploaded twice
+        for key, key_lock in list(self._key_locks.items()):
+            if key not in self._entries and not key_lock.locked():
+                del self._key_locks[key]
+
+    def _wait_until_active(self, client, file: types.File) -> types.File:
+        """Poll an uploaded file until Gemini has finished processing it"""
+        deadline = time.monotonic() + GEMINI_FILE_ACTIVE_TIMEOUT
+        while file.state != types.FileState.ACTIVE:
+            if file.state == types.FileState.FAILED:
+                raise RuntimeError(f"Gemini failed to process uploaded file {file.name}: {file.error}")
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Uploaded file {file.name} not ready after {GEMINI_FILE_ACTIVE_TIMEOUT:g} seconds")
+            time.sleep(GEMINI_FILE_POLL_INTERVAL)
+            file = client.files.get(name=file.name)
+        return file
+
+    def get_or_upload(self, client, api_key: str, path: str, mime_type: str) -> types.File:
+        """
+        Return an active uploaded file for a local video, uploading it if needed
+
+        Args:
+            client: genai.Client used for the upload
+            api_key: API key the client was created with; uploads are only visible to that project
+            path: Local video path
+            mime_type: MIME type of the video
+
+        Returns:
+            types.File: The uploaded file, in ACTIVE state
+        """
+        key = self._key(api_key, path)
+        with self._lock:
+            self._prune()
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[1] < GEMINI_FILE_REUSE_SECONDS:
+                metrics.inc("gemini_file_reuses_total")
+                return entry[0]
+
+            size = os.path.getsize(path)
+            print(f"Uploading {path} ({size} bytes) through the Files API")
+            with metrics.span("gemini_file_upload"):
+                # The SDK streams the file from disk in chunks
+                file = client.files.upload(file=path, config=types.UploadFileConfig(mime_type=mime_type))
+                file = self._wait_until_active(client, file)
+            metrics.inc("gemini_bytes_sent_total", size, transport="file")
+            with self._lock:
+                self._entries[key] = (file, time.time())
+            return file
+
+    def invalidate(self, api_key: str, path: str):
+        """Forget the upload of a clip, e.g. after Gemini reports it no longer exists"""
+        try:
+            key = self._key(api_key, path)
+        except OSError:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            key_lock = self._key_locks.get(key)
+            if key_lock is not None and not key_lock.locked():
+                del self._key_locks[key]
+
+
+registry = UploadedFileRegistry()
+
+
+def video_part(client, api_key: str, path: str, mime_type: str = "video/mp4",
+               inline_max_bytes: Optional[int] = None) -> types.Part:
+    """
+    Build the content part for a video, choosing between inline bytes and the Files API
+
+    Args:
+        client: genai.Client used for uploads
+        api_key: API key the client was created with
+        path: Local video path
+        mime_type: MIME type of the video
+        inline_max_bytes: Size threshold, if None then use GEMINI_INLINE_MAX_BYTES
+
+    Returns:
+        types.Part: Inline blob for small clips, file reference for large ones
+    """
+    if inline_max_bytes is None:
+        inline_max_bytes = GEMINI_INLINE_MAX_BYTES
+    size = os.path.getsize(path)
+    if size <= inline_max_bytes:
+        with open(path, "rb") as f:
+            data = f.read()
+        metrics.inc("gemini_bytes_sent_total", size, transport="inline")
+        return types.Part(inline_data=types.Blob(data=data, mime_type=mime_type))
+
+    file = registry.get_or_upload(client, api_key, path, mime_type)
+    return types.Part.from_uri(file_uri=file.uri, mime_type=mime_type)
@@ -0,0 +1,24 @@
+import os
+
+# Gunicorn settings for the production image (start.sh); every value can be overridden with an env var
+cpus = os.cpu_count() or 1
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+# Each worker process also runs JOB_WORKERS background jobs, so video work is spread over the processes
+workers = int(os.getenv("GUNICORN_WORKERS", str(max(2, cpus // 2))))
+# Threads keep event streams, downloads and frame requests from blocking each other within a process
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+# Seconds a worker may stay silent before it is restarted; long requests are fine with gthread
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+# The app starts its job worker threads on import, which must happen in each worker, not the master
+preload_app = False
+accesslog = "-"
+errorlog = "-"
+
+# Background jobs per process, so all processes together run about one job per core
+os.environ.setdefault("JOB_WORKERS", str(max(1, cpus // workers)))
+# Every process keeps its own Gemini token buckets, so each one gets an equal share of GEMINI_RPM/GEMINI_TPM
+os.environ.setdefault("GEMINI_PROCESSES", str(workers))
@@ -0,0 +1,414 @@
+import os
+import errno
+import json
+import hashlib
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from video_separator import create_separator
+from metrics import registry as metrics
+
+# Ingest settings
+INGEST_MAX_BYTES = int(os.getenv("INGEST_MAX_BYTES", str(4 * 1024 ** 3)))
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", str(1024 * 1024)))
+INGEST_CONNECT_TIMEOUT = float(os.getenv("INGEST_CONNECT_TIMEOUT", "10"))
+INGEST_READ_TIMEOUT = float(os.getenv("INGEST_READ_TIMEOUT", "60"))
+INGEST_MAX_RETRIES = int(os.getenv("INGEST_MAX_RETRIES", "3"))
+# Files at least this large are fetched as parallel byte ranges when the server allows it
+INGEST_PARALLEL_MIN_BYTES = int(os.getenv("INGEST_PARALLEL_MIN_BYTES", str(64 * 1024 * 1024)))
+INGEST_PARALLEL_PARTS = int(os.getenv("INGEST_PARALLEL_PARTS", "4"))
+INGEST_RANGE_SIZE = int(os.getenv("INGEST_RANGE_SIZE", str(16 * 1024 * 1024)))
+# Split while downloading by feeding the separator through a named pipe
+INGEST_STREAM_SPLIT = os.getenv("INGEST_STREAM_SPLIT", "0") == "1"
+
+PART_SUFFIX = ".part"
+PROGRESS_SUFFIX = ".part.json"
+
+
+class DownloadTooLarge(ValueError):
+    """The remote file is larger than the configured limit"""
+
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Process-wide HTTP session, so connections are pooled and reused across downloads"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            retry = Retry(
+                total=INGEST_MAX_RETRIES,
+                backoff_factor=0.5,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=("HEAD", "GET"),
+            )
+            adapter = HTTPAdapter(
+                pool_connections=16,
+                pool_maxsize=max(16, INGEST_PARALLEL_PARTS * 4),
+                max_retries=retry,
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+
+def _timeout() -> Tuple[float, float]:
+    return (INGEST_CONNECT_TIMEOUT, INGEST_READ_TIMEOUT)
+
+
+def _probe(url: str) -> Tuple[Optional[int], bool]:
+    """Return the remote size (if advertised) and whether byte ranges are supported"""
+    try:
+        response = get_session().head(url, allow_redirects=True, timeout=_timeout())
+        response.raise_for_status()
+    except requests.exceptions.RequestException:
+        # Some servers reject HEAD; fall back to a plain streaming GET
+        return None, False
+    length = response.headers.get("Content-Length")
+    size = int(length) if length and length.isdigit() else None
+    accepts_ranges = response.headers.get("Accept-Ranges", "").lower() == "bytes"
+    return size, accepts_ranges
+
+
+def _check_size(size: int, max_bytes: int):
+    if size > max_bytes:
+        raise DownloadTooLarge(f"Video is {size} bytes, larger than the {max_bytes} byte limit")
+
+
+def _hash_existing(path: str, digest) -> int:
+    """Feed an already downloaded prefix into the hash; returns its length"""
+    if not os.path.exists(path):
+        return 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(INGEST_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return os.path.getsize(path)
+
+
+def _download_stream(url: str, part_path: str, max_bytes: int, accepts_ranges: bool,
+                     sink: Optional[Callable[[bytes], None]]) -> str:
+    """
+    Download sequentially in large chunks, hashing as bytes arrive
+
+    An interrupted transfer is resumed with a Range request when the server supports
+    it, including a .part file left behind by an earlier process.
+    """
+    digest = hashlib.sha256()
+    offset = _hash_existing(part_path, digest) if accepts_ranges else 0
+    if offset and sink is not None:
+        # The sink has to see the whole file from the start
+        with open(part_path, "rb") as f:
+            for chunk in iter(lambda: f.read(INGEST_CHUNK_SIZE), b""):
+                sink(chunk)
+
+    attempt = 0
+    while True:
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        try:
+            with get_session().get(url, stream=True, headers=headers, timeout=_timeout()) as response:
+                response.raise_for_status()
+                if offset and response.status_code != 206:
+                    if sink is not None:
+                        # The sink already has the first bytes and cannot start over; stop feeding it
+                        abandon = getattr(sink, "abandon", None)
+                        if abandon is not None:
+                            abandon()
+                        sink = None
+                    # Start over from the beginning
+                    offset = 0
+                    digest = hashlib.sha256()
+                with open(part_path, "ab" if offset else "wb") as f:
+                    for chunk in response.iter_content(chunk_size=INGEST_CHUNK_SIZE):
+                        if not chunk:
+                            continue
+                        offset += len(chunk)
+                        _check_size(offset, max_bytes)
+                        f.write(chunk)
+                        digest.update(chunk)
+                        if sink is not None:
+                            sink(chunk)
+            return digest.hexdigest()
+        except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError,
+                requests.exceptions.Timeout) as e:
+            attempt += 1
+            if not accepts_ranges or attempt > INGEST_MAX_RETRIES:
+                raise
+            print(f"Download interrupted at {offset} bytes ({e}), resuming... (Attempt {attempt}/{INGEST_MAX_RETRIES})")
+            time.sleep(min(2 ** attempt, 10))
+
+
+def _download_ranges(url: str, part_path: str, size: int) -> str:
+    """
+    Download fixed-size byte ranges in parallel into a preallocated file
+
+    Finished ranges are recorded in a .part.json file so a restarted download only
+    fetches what is missing. The hash follows the contiguous finished prefix, so it
+    is ready as soon as the last range lands.
+    """
+    progress_path = part_path[:-len(PART_SUFFIX)] + PROGRESS_SUFFIX
+    ranges = [(start, min(start + INGEST_RANGE_SIZE, size) - 1) for start in range(0, size, INGEST_RANGE_SIZE)]
+
+    done: List[int] = []
+    if os.path.exists(part_path) and os.path.getsize(part_path) == size and os.path.exists(progress_path):
+        try:
+            with open(progress_path, "r", encoding="utf-8") as f:
+                progress = json.load(f)
+            if progress.get("url") == url and progress.get("size") == size:
+                done = progress.get("done", [])
+        except (OSError, ValueError):
+            done = []
+    else:
+        with open(part_path, "wb") as f:
+            f.truncate(size)
+    done_set = set(done)
+    progress_lock = threading.Lock()
+
+    def fetch(index: int):
+        if index in done_set:
+            return
+        start, end = ranges[index]
+        for attempt in range(INGEST_MAX_RETRIES + 1):
+            try:
+                with get_session().get(url, stream=True, headers={"Range": f"bytes={start}-{end}"},
+                                       timeout=_timeout()) as response:
+                    response.raise_for_status()
+                    if response.status_code != 206:
+                        raise RuntimeError("Server ignored the Range request")
+                    position = start
+                    with open(part_path, "r+b") as f:
+                        f.seek(start)
+                        for chunk in response.iter_content(chunk_size=INGEST_CHUNK_SIZE):
+                            f.write(chunk)
+                            position += len(chunk)
+                    if position != end + 1:
+                        raise requests.exceptions.ChunkedEncodingError(f"Short range {start}-{end}: got {position - start} bytes")
+                break
+            except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError,
+                    requests.exceptions.Timeout):
+                if attempt == INGEST_MAX_RETRIES:
+                    raise
+                time.sleep(min(2 ** attempt, 10))
+        with progress_lock:
+            done_set.add(index)
+            with open(progress_path, "w", encoding="utf-8") as f:
+                json.dump({"url": url, "size": size, "done": sorted(done_set)}, f)
+
+    digest = hashlib.sha256()
+    with ThreadPoolExecutor(max_workers=INGEST_PARALLEL_PARTS, thread_name_prefix="ingest") as executor:
+        futures = [executor.submit(fetch, index) for index in range(len(ranges))]
+        # Unbuffered, so no read-ahead picks up bytes of ranges that are still downloading
+        fd = os.open(part_path, os.O_RDONLY)
+        try:
+            for (start, end), future in zip(ranges, futures):
+                future.result()
+                position = start
+                while position <= end:
+                    chunk = os.pread(fd, min(INGEST_CHUNK_SIZE, end + 1 - position), position)
+                    if not chunk:
+                        raise RuntimeError(f"Downloaded file is shorter than {size} bytes")
+                    digest.update(chunk)
+                    position += len(chunk)
+        finally:
+            os.close(fd)
+
+    os.remove(progress_path)
+    return digest.hexdigest()
+
+
+def download(url: str, dest_path: str, max_bytes: Optional[int] = None,
+             sink: Optional[Callable[[bytes], None]] = None) -> Dict:
+    """
+    Download a remote video with a size limit, resume support and a running SHA-256
+
+    Large files from servers that support byte ranges are fetched in parallel ranges;
+    everything else streams sequentially in INGEST_CHUNK_SIZE chunks.
+
+    Args:
+        url: Video URL
+        dest_path: Final file path; data is written to dest_path + ".part" until complete
+        max_bytes: Size limit, if None then use INGEST_MAX_BYTES
+        sink: Optional callback receiving every chunk in order as it arrives; forces
+            sequential download. When a resumed download has to start over, the sink's
+            abandon() method (if any) is called and it receives nothing more
+
+    Returns:
+        Dict: path, bytes and sha256 of the downloaded file
+    """
+    max_bytes = INGEST_MAX_BYTES if max_bytes is None else max_bytes
+    part_path = dest_path + PART_SUFFIX
+    size, accepts_ranges = _probe(url)
+    if size is not None:
+        _check_size(size, max_bytes)
+
+    start_time = time.perf_counter()
+    try:
+        if sink is None and accepts_ranges and size is not None and size >= INGEST_PARALLEL_MIN_BYTES:
+            sha256 = _download_ranges(url, part_path, size)
+        else:
+            sha256 = _download_stream(url, part_path, max_bytes, accepts_ranges, sink)
+    except DownloadTooLarge:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+    os.replace(part_path, dest_path)
+
+    elapsed = time.perf_counter() - start_time
+    total = os.path.getsize(dest_path)
+    metrics.inc("download_bytes_total", total)
+    metrics.observe("download_seconds", elapsed)
+    print(f"Downloaded {total} bytes in {elapsed:.2f}s ({total / max(elapsed, 1e-6) / 1024 ** 2:.1f} MiB/s)")
+    return {"path": dest_path, "bytes": total, "sha256": sha256}
+
+
+class _FifoSink:
+    """Write downloaded chunks into a named pipe read by the separator"""
+
+    def __init__(self, fifo_path: str, reader: threading.Thread, open_timeout: float = 30):
+        self.fifo_path = fifo_path
+        self.reader = reader
+        self.open_timeout = open_timeout
+        self.fd: Optional[int] = None
+        self.broken = False
+
+    def _open(self):
+        # Opening for write fails with ENXIO until the reader has opened its end
+        deadline = time.monotonic() + self.open_timeout
+        while True:
+            try:
+                fd = os.open(self.fifo_path, os.O_WRONLY | os.O_NONBLOCK)
+                os.set_blocking(fd, True)
+                return fd
+            except OSError as e:
+                if e.errno != errno.ENXIO or not self.reader.is_alive() or time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+
+    def __call__(self, chunk: bytes):
+        if self.broken:
+            return
+        try:
+            if self.fd is None:
+                self.fd = self._open()
+            view = memoryview(chunk)
+            while view:
+                written = os.write(self.fd, view)
+                view = view[written:]
+        except OSError:
+            # The separator gave up (e.g. the mp4 index is at the end); the file download carries on
+            self.broken = True
+            self.close()
+
+    def abandon(self):
+        """Stop streaming, e.g. when the download restarts; the file is split once it is complete"""
+        self.broken = True
+        self.close()
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def finish(self) -> bool:
+        """
+        Close the write end and wait for the reader to see the end of the stream
+
+        An open of the pipe's read end blocks until there is a writer. The reader may
+        not have reached its open yet when the download ends early, and OpenCV opens
+        the path again with another backend after the demuxer gives up, so the write
+        end is opened and closed until the reader has finished, for at most
+        open_timeout seconds.
+
+        Returns:
+            bool: False when the reader is still running
+        """
+        self.close()
+        deadline = time.monotonic() + self.open_timeout
+        while self.reader.is_alive():
+            if time.monotonic() > deadline:
+                return False
+            try:
+                os.close(os.open(self.fifo_path, os.O_WRONLY | os.O_NONBLOCK))
+            except OSError:
+                # ENXIO: no reader has the pipe open right now
+                pass
+            self.reader.join(0.05)
+        return True
+
+
+def download_and_split(url: str, dest_path: str, output_dir: Optional[str] = None,
+                       max_bytes: Optional[int] = None, full_res: Optional[bool] = None,
+                       engine: Optional[str] = None) -> Dict:
+    """
+    Download a video while the separator decodes it from a named pipe
+
+    Streaming only works for files the demuxer can read front to back, such as
+    fast-start or fragmented MP4. When it fails, the video is split from the finished
+    file instead.
+
+    Args:
+        url: Video URL
+        dest_path: Final file path
+        output_dir: Separator output directory
+        max_bytes: Size limit, if None then use INGEST_MAX_BYTES
+        full_res: Also write full-resolution views, if None then use SEPARATOR_FULL_RES
+        engine: Separator engine, if None then use SEPARATOR_ENGINE; the stream itself is
+            always split by opencv
+
+    Returns:
+        Dict: download() result plus separated_videos, full_res_videos and the engine
+            that split the video
+    """
+    fifo_dir = os.path.join(os.path.dirname(dest_path) or ".", f".stream-{uuid.uuid4().hex}")
+    os.makedirs(fifo_dir)
+    # Same base name as the download, so the separated files are named the same either way
+    fifo_path = os.path.join(fifo_dir, os.path.basename(dest_path))
+    os.mkfifo(fifo_path)
+
+    outcome: Dict = {}
+
+    def split_stream():
+        try:
+            separator = create_separator(fifo_path, output_dir, engine=engine, full_res=full_res)
+            separated_videos = separator.separate_video()
+            # A file whose index sits at the end opens but yields no frames from a pipe
+            if separator.stats.get("frames"):
+                outcome["separated_videos"] = separated_videos
+                outcome["full_res_videos"] = separator.full_res_videos
+                outcome["engine"] = separator.engine
+            else:
+                outcome["error"] = "no frames decoded from the stream"
+        except Exception as e:
+            outcome["error"] = e
+
+    reader = threading.Thread(target=split_stream, name="stream-split", daemon=True)
+    reader.start()
+    sink = _FifoSink(fifo_path, reader)
+    try:
+        result = download(url, dest_path, max_bytes=max_bytes, sink=sink)
+    finally:
+        if not sink.finish():
+            print("Streaming split did not finish after the download, giving up on it")
+            outcome.pop("separated_videos", None)
+            outcome.setdefault("error", "stream reader did not finish")
+        os.remove(fifo_path)
+        os.rmdir(fifo_dir)
+
+    if sink.broken or "separated_videos" not in outcome:
+        print(f"Streaming split failed ({outcome.get('error')}), splitting the downloaded file")
+        separator = create_separator(result["path"], output_dir, engine=engine, full_res=full_res)
+        outcome["separated_videos"] = separator.separate_video()
+        outcome["full_res_videos"] = separator.full_res_videos
+        outcome["engine"] = separator.engine
+    result["separated_videos"] = outcome["separated_videos"]
+    result["full_res_videos"] = outcome["full_res_videos"]
+    result["engine"] = outcome["engine"]
+    return result
@@ -0,0 +1,411 @@
+import os
+import json
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from typing import Callable, Dict, List, Optional
+from metrics import registry as metrics
+
+# Job queue settings
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "jobs.db")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+# Jobs left "running" longer than this without an update (e.g. the process died) are re-queued
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "3600"))
+# How often a process bumps updated_at of the jobs it is running; must stay well below JOB_STALE_SECONDS
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", "60"))
+
+# Pipeline stages in execution order; "download" only applies to URL jobs
+STAGES = ["download", "split", "analyze", "combine", "summarize"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    stage TEXT,
+    progress REAL NOT NULL DEFAULT 0,
+    stages TEXT NOT NULL DEFAULT '{}',
+    payload TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs(status, created_at);
+CREATE TABLE IF NOT EXISTS job_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    type TEXT NOT NULL,
+    data TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_job_events_job ON job_events(job_id, id);
+"""
+
+# Event types that end a job's event stream
+FINAL_EVENTS = ("done", "failed")
+
+
+class JobQueue:
+    def __init__(
+        self,
+        handler: Callable[[Dict, "JobContext"], Dict],
+        db_path: Optional[str] = None,
+        workers: Optional[int] = None,
+    ):
+        """
+        Initialize a SQLite-backed job queue
+
+        Args:
+            handler: Function called as handler(payload, context) for each job; its return
+                value is stored as the job result
+            db_path: SQLite database path, if None then use JOB_DB_PATH
+            workers: Number of worker threads, if None then use JOB_WORKERS
+        """
+        self.handler = handler
+        self.db_path = db_path or JOB_DB_PATH
+        self.workers = JOB_WORKERS if workers is None else workers
+        self._threads: List[threading.Thread] = []
+        # IDs of the jobs this process is running, kept alive by the heartbeat thread
+        self._running: set = set()
+        self._running_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection; one per operation keeps the queue safe across threads and processes"""
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        """Create the job table"""
+        db_dir = os.path.dirname(os.path.abspath(self.db_path))
+        os.makedirs(db_dir, exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _row_to_dict(row: sqlite3.Row) -> Dict:
+        """Convert a job row to a JSON-serializable dictionary"""
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["stages"] = json.loads(job["stages"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def submit(self, kind: str, payload: Dict) -> str:
+        """
+        Add a job to the queue
+
+        Args:
+            kind: Job type, e.g. "file" or "url"
+            payload: JSON-serializable job parameters passed to the handler
+
+        Returns:
+            str: The new job ID
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, payload, created_at, updated_at) VALUES (?, ?, 'queued', ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), now, now),
+            )
+        finally:
+            conn.close()
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Get a job by ID, or None if it does not exist"""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        return self._row_to_dict(row) if row else None
+
+    def _update(self, job_id: str, **fields):
+        """Update job columns and bump updated_at"""
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        conn = self._connect()
+        try:
+            conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+        finally:
+            conn.close()
+
+    def add_event(self, job_id: str, event_type: str, data: Optional[Dict] = None) -> int:
+        """
+        Record a progress event of a job; events are kept in SQLite so every server process can stream them
+
+        Args:
+            job_id: Job ID
+            event_type: Event name, e.g. "stage", "segments", "done"
+            data: JSON-serializable event details
+
+        Returns:
+            int: Event ID, increasing within the database
+        """
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                "INSERT INTO job_events (job_id, type, data, created_at) VALUES (?, ?, ?, ?)",
+                (job_id, event_type, json.dumps(data or {}), time.time()),
+            )
+            return cursor.lastrowid
+        finally:
+            conn.close()
+
+    def events(self, job_id: str, after: int = 0, limit: int = 500) -> List[Dict]:
+        """Events of a job with an ID greater than after, oldest first"""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT id, type, data, created_at FROM job_events WHERE job_id = ? AND id > ? ORDER BY id LIMIT ?",
+                (job_id, after, limit),
+            ).fetchall()
+        finally:
+            conn.close()
+        return [{"id": row["id"], "type": row["type"], "data": json.loads(row["data"]),
+                 "created_at": row["created_at"]} for row in rows]
+
+    def _drop_delta_events(self, job_id: str):
+        """Streamed text fragments are only useful while a job runs; the final events hold the full text"""
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM job_events WHERE job_id = ? AND type LIKE '%_delta'", (job_id,))
+        finally:
+            conn.close()
+
+    def _claim(self) -> Optional[Dict]:
+        """Atomically take the oldest queued job, or return None"""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            now = time.time()
+            conn.execute(
+                "UPDATE jobs SET status = 'running', started_at = ?, updated_at = ? WHERE id = ?",
+                (now, now, row["id"]),
+            )
+            conn.execute("COMMIT")
+            return self._row_to_dict(row)
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def counts(self) -> Dict[str, int]:
+        """Number of jobs in each status"""
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        finally:
+            conn.close()
+        return {status: count for status, count in rows}
+
+    def active(self) -> List[Dict]:
+        """Queued and running jobs"""
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT * FROM jobs WHERE status IN ('queued', 'running')").fetchall()
+        finally:
+            conn.close()
+        return [self._row_to_dict(row) for row in rows]
+
+    def update_metrics(self):
+        """Metrics collector: publish queued/running job counts as gauges"""
+        counts = self.counts()
+        for status in ("queued", "running"):
+            metrics.set_gauge("jobs_in_queue", counts.get(status, 0), status=status)
+
+    def heartbeat(self) -> int:
+        """
+        Bump updated_at of the jobs this process is running, so a long stage is never
+        mistaken for a job whose worker disappeared
+
+        Returns:
+            int: Number of jobs updated
+        """
+        with self._running_lock:
+            job_ids = list(self._running)
+        if not job_ids:
+            return 0
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                f"UPDATE jobs SET updated_at = ? WHERE status = 'running' AND id IN ({', '.join('?' * len(job_ids))})",
+                (time.time(), *job_ids),
+            )
+            return cursor.rowcount
+        finally:
+            conn.close()
+
+    def _heartbeat_loop(self):
+        """Send heartbeats every JOB_HEARTBEAT_INTERVAL until stopped"""
+        while not self._stop.wait(JOB_HEARTBEAT_INTERVAL):
+            try:
+                self.heartbeat()
+            except sqlite3.OperationalError as e:
+                print(f"Job heartbeat failed: {e}")
+
+    def requeue_stale(self) -> int:
+        """Put jobs whose worker disappeared (no heartbeat for JOB_STALE_SECONDS) back into the queue"""
+        cutoff = time.time() - JOB_STALE_SECONDS
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'queued', stage = NULL, progress = 0, stages = '{}' "
+                "WHERE status = 'running' AND updated_at < ?",
+                (cutoff,),
+            )
+            return cursor.rowcount
+        finally:
+            conn.close()
+
+    def _run_job(self, job: Dict):
+        """Run one claimed job through the handler and record the outcome"""
+        context = JobContext(self, job["id"])
+        with self._running_lock:
+            self._running.add(job["id"])
+        try:
+            result = self.handler(job["payload"], context)
+            context.finish()
+            self._update(
+                job["id"],
+                status="done",
+                stage=None,
+                progress=1.0,
+                result=json.dumps(result),
+                finished_at=time.time(),
+            )
+            self.add_event(job["id"], "done", {"result": result})
+            metrics.inc("jobs_total", status="done")
+        except Exception as e:
+            traceback.print_exc()
+            context.fail_stage()
+            self._update(job["id"], status="failed", error=str(e), finished_at=time.time())
+            self.add_event(job["id"], "failed", {"error": str(e)})
+            metrics.inc("jobs_total", status="failed")
+        finally:
+            with self._running_lock:
+                self._running.discard(job["id"])
+        self._drop_delta_events(job["id"])
+
+    def _worker_loop(self):
+        """Poll for queued jobs until stopped"""
+        while not self._stop.is_set():
+            try:
+                job = self._claim()
+            except sqlite3.OperationalError as e:
+                print(f"Job queue busy: {e}")
+                job = None
+            if job is None:
+                self._wakeup.wait(JOB_POLL_INTERVAL)
+                self._wakeup.clear()
+                continue
+            print(f"Starting job {job['id']} ({job['kind']})")
+            self._run_job(job)
+
+    def start(self):
+        """Start the worker threads"""
+        if self._threads:
+            return
+        requeued = self.requeue_stale()
+        if requeued:
+            print(f"Re-queued {requeued} stale job(s)")
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = None):
+        """Signal the worker threads to exit and wait for them"""
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+
+class JobContext:
+    """Handle given to a job handler for reporting per-stage progress"""
+
+    def __init__(self, queue: JobQueue, job_id: str):
+        self.queue = queue
+        self.job_id = job_id
+        self.stages: Dict[str, Dict] = {}
+        self.current: Optional[str] = None
+        self.planned: List[str] = list(STAGES)
+
+    def plan(self, stages: List[str]):
+        """Declare which stages this job runs, so progress is measured against them"""
+        self.planned = list(stages)
+
+    def stage(self, name: str, **info):
+        """
+        Mark the start of a pipeline stage; the previous stage is marked done
+
+        Args:
+            name: Stage name from STAGES
+            **info: Extra JSON-serializable details shown in the job status
+        """
+        now = time.time()
+        self._finish_current(now, "done")
+        self.current = name
+        self.stages[name] = {"status": "running", "started_at": now, **info}
+        self.queue._update(
+            self.job_id,
+            stage=name,
+            progress=self.planned.index(name) / len(self.planned),
+            stages=json.dumps(self.stages),
+        )
+        self.emit("stage", stage=name, progress=self.planned.index(name) / len(self.planned), **info)
+
+    def emit(self, event_type: str, **data):
+        """Publish a progress event to clients following the job (see JobQueue.events)"""
+        self.queue.add_event(self.job_id, event_type, data)
+
+    def fail_stage(self):
+        """Mark the running stage as failed"""
+        if self._finish_current(time.time(), "failed"):
+            self.queue._update(self.job_id, stages=json.dumps(self.stages))
+
+    def _finish_current(self, now: float, status: str) -> bool:
+        """Close the running stage; returns False if there was none"""
+        if self.current is None:
+            return False
+        entry = self.stages[self.current]
+        entry["status"] = status
+        entry["finished_at"] = now
+        entry["duration"] = round(now - entry["started_at"], 3)
+        self.current = None
+        return True
+
+    def finish(self):
+        """Mark the last stage as done"""
+        if self._finish_current(time.time(), "done"):
+            self.queue._update(self.job_id, stages=json.dumps(self.stages))
@@ -0,0 +1,199 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# Histogram buckets in seconds, from fast local work up to long Gemini calls
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class JobMetrics:
+    """Per-job record of spans and counters, attached to the job result"""
+
+    def __init__(self):
+        self.spans: List[Dict] = []
+        self.counters: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, seconds: float, labels: Dict):
+        with self._lock:
+            self.spans.append({"name": name, "seconds": round(seconds, 3), **labels})
+
+    def add(self, name: str, value: float, labels: Dict):
+        key = name + _format_labels(_label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {"spans": list(self.spans), "counters": dict(self.counters)}
+
+
+_current_job: contextvars.ContextVar[Optional[JobMetrics]] = contextvars.ContextVar("job_metrics", default=None)
+
+
+class MetricsRegistry:
+    """
+    Process-wide counters, gauges and histograms rendered in the Prometheus text format
+
+    Each server process keeps its own values; scrape every process, or run a single
+    worker process, to see the totals.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Tuple[Tuple[float, ...], Dict[LabelKey, List]]] = {}
+        self._collectors: List[Callable[[], None]] = []
+
+    def describe(self, name: str, kind: str, help_text: str):
+        self._help[name] = (kind, help_text)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """Increase a counter; also counted on the current job"""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+        job = _current_job.get()
+        if job is not None:
+            job.add(name, value, labels)
+
+    def set_gauge(self, name: str, value: float, **labels):
+        """Set a gauge to its current value"""
+        with self._lock:
+            self._gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def observe(self, name: str, value: float, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, **labels):
+        """Record a histogram observation"""
+        key = _label_key(labels)
+        with self._lock:
+            bounds, series = self._histograms.setdefault(name, (buckets, {}))
+            state = series.get(key)
+            if state is None:
+                # Per-bucket counts (last one is +Inf), sum, count
+                state = series[key] = [[0] * (len(bounds) + 1), 0.0, 0]
+            state[0][bisect.bisect_left(bounds, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def register_collector(self, collector: Callable[[], None]):
+        """Register a function that refreshes gauges right before each render"""
+        self._collectors.append(collector)
+
+    @contextmanager
+    def span(self, name: str, **labels) -> Iterator[None]:
+        """
+        Time a block of work
+
+        The duration goes into the {name}_seconds histogram and, when running inside
+        collect_job(), into that job's span list. Failed blocks are labelled status="error".
+        """
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            yield
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe(f"{name}_seconds", elapsed, status=status, **labels)
+            job = _current_job.get()
+            if job is not None:
+                job.add_span(name, elapsed, {**labels, "status": status} if status != "ok" else labels)
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format"""
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                print(f"Metrics collector failed: {e}")
+
+        lines = []
+        with self._lock:
+            for kind, metrics in (("counter", self._counters), ("gauge", self._gauges)):
+                for name, series in sorted(metrics.items()):
+                    help_text = self._help.get(name, (kind, ""))[1]
+                    if help_text:
+                        lines.append(f"# HELP {name} {help_text}")
+                    lines.append(f"# TYPE {name} {kind}")
+                    for key, value in sorted(series.items()):
+                        lines.append(f"{name}{_format_labels(key)} {value:g}")
+            for name, (bounds, series) in sorted(self._histograms.items()):
+                help_text = self._help.get(name, ("histogram", ""))[1]
+                if help_text:
+                    lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, (counts, total, count) in sorted(series.items()):
+                    cumulative = 0
+                    for bound, bucket_count in zip(bounds, counts):
+                        cumulative += bucket_count
+                        lines.append(f"{name}_bucket{_format_labels(key, ('le', f'{bound:g}'))} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(key, ('le', '+Inf'))} {count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {total:g}")
+                    lines.append(f"{name}_count{_format_labels(key)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+registry.describe("frames_processed_total", "counter", "Frames decoded by the video separator")
+registry.describe("static_frames_dropped_total", "counter", "Sampled frames left out of analysis clips because the scene did not change")
+registry.describe("gemini_requests_total", "counter", "Gemini generate_content calls by call type and outcome")
+registry.describe("gemini_retries_total", "counter", "Gemini calls retried after an error, by call type and reason")
+registry.describe("gemini_tokens_total", "counter", "Input tokens reported by Gemini by call type")
+registry.describe("gemini_cached_tokens_total", "counter", "Input tokens served from Gemini's context cache by call type")
+registry.describe("gemini_context_cache_total", "counter", "Instruction blocks sent by cached-content reference (hit, created) or inline")
+registry.describe("gemini_queue_depth", "gauge", "Gemini requests waiting for quota")
+registry.describe("gemini_quota_wait_seconds", "histogram", "Time Gemini requests waited for quota")
+registry.describe("gemini_bytes_sent_total", "counter", "Video bytes sent to Gemini by transport (inline or file upload)")
+registry.describe("gemini_latency_seconds", "histogram", "Latency of individual Gemini API calls")
+registry.describe("stage_seconds", "histogram", "Duration of pipeline stages")
+registry.describe("jobs_total", "counter", "Finished background jobs by status")
+registry.describe("storage_bytes", "gauge", "Disk space used by uploads and separated videos, by area")
+registry.describe("storage_quota_bytes", "gauge", "Storage quota of uploads and separated videos")
+registry.describe("storage_evicted_total", "counter", "Uploads and job directories removed by the storage janitor, by area and reason")
+registry.describe("storage_evicted_bytes_total", "counter", "Disk space freed by the storage janitor, by area")
+registry.describe("storage_dedup_bytes_total", "counter", "Bytes saved by hardlinking identical uploads")
+registry.describe("results_search_seconds", "histogram", "Latency of results store searches")
+
+
+@contextmanager
+def collect_job() -> Iterator[JobMetrics]:
+    """Collect the spans and counters of everything run inside this block, including worker threads started with run_in_context()"""
+    job = JobMetrics()
+    token = _current_job.set(job)
+    try:
+        yield job
+    finally:
+        _current_job.reset(token)
+
+
+def run_in_context(fn: Callable) -> Callable:
+    """Wrap a function so it runs in a copy of the caller's context, carrying the job collector into a worker thread"""
+    context = contextvars.copy_context()
+
+    def wrapper(*args, **kwargs):
+        return context.run(fn, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,318 @@
+import os
+import uuid
+from typing import Callable, Dict, List, Optional
+import ingest
+import video_analyzer
+import video_separator
+import storage
+import sum_up
+from video_separator import create_separator, with_time_maps, without_time_maps
+from video_analyzer import analyze_all_videos
+from sum_up import merge_and_summarize, merge_timelines, generate_video_summary
+from result_cache import RESULT_CACHE_ENABLED, ResultCache, cache_key, hash_file
+from results_store import RESULTS_STORE_ENABLED, ResultsStore
+from metrics import registry as metrics, collect_job
+
+UPLOAD_FOLDER = 'uploads'
+SEPARATED_FOLDER = 'separated_videos'
+
+# Stage callback: on_stage(name, **info)
+StageCallback = Callable[..., None]
+# Event callback: on_event(type, **data), see JobContext.emit
+EventCallback = Callable[..., None]
+
+
+def _no_stage(name: str, **info):
+    pass
+
+
+def _no_event(event_type: str, **data):
+    pass
+
+
+_cache: Optional[ResultCache] = None
+
+
+def get_cache() -> Optional[ResultCache]:
+    """Shared result cache, or None when RESULT_CACHE_ENABLED is off"""
+    global _cache
+    if RESULT_CACHE_ENABLED and _cache is None:
+        _cache = ResultCache()
+    return _cache
+
+
+_results_store: Optional[ResultsStore] = None
+
+
+def get_results_store() -> Optional[ResultsStore]:
+    """Shared searchable results store, or None when RESULTS_STORE_ENABLED is off"""
+    global _results_store
+    if RESULTS_STORE_ENABLED and _results_store is None:
+        _results_store = ResultsStore()
+    return _results_store
+
+
+def index_result(video_path: str, result: Dict, filename: Optional[str] = None,
+                 job_id: Optional[str] = None):
+    """Add a processed video's segments to the results store; indexing errors never fail the job"""
+    store = get_results_store()
+    if store is None:
+        return
+    try:
+        with metrics.span("index_result"):
+            store.save(result["video_hash"] or hash_file(video_path), result, filename=filename, job_id=job_id)
+    except Exception as e:
+        print(f"Failed to index the results of {video_path}: {e}")
+
+
+def _count_lookup(layer: str, value):
+    """Record a result cache hit or miss and pass the value through"""
+    metrics.inc("result_cache_lookups_total", layer=layer, result="miss" if value is None else "hit")
+    return value
+
+
+def _is_failed(segments: str) -> bool:
+    """analyze_all_videos reports failed views as an error string instead of raising"""
+    return segments.startswith("Analysis failed:")
+
+
+def new_upload_path(name: Optional[str] = None, upload_folder: str = UPLOAD_FOLDER) -> str:
+    """Path for a downloaded video; a stable name (e.g. the job ID) lets a re-queued job resume its download"""
+    return os.path.join(upload_folder, f"{name or uuid.uuid4()}.mp4")
+
+
+def job_output_dir(job_id: str, separated_folder: str = SEPARATED_FOLDER) -> str:
+    """Working directory of a job's separated videos, so jobs with the same file name never share outputs"""
+    return os.path.join(separated_folder, job_id)
+
+
+def job_paths(job: Dict) -> List[str]:
+    """Files and directories a queued or running job still needs, for the storage janitor"""
+    paths = [new_upload_path(job["id"]), job_output_dir(job["id"])]
+    if job["payload"].get("path"):
+        paths.append(job["payload"]["path"])
+    return paths
+
+
+def process_video(video_path: str, on_stage: Optional[StageCallback] = None,
+                  video_hash: Optional[str] = None,
+                  separated_videos: Optional[Dict[str, str]] = None,
+                  full_res: Optional[bool] = None,
+                  full_res_videos: Optional[Dict[str, str]] = None,
+                  on_event: Optional[EventCallback] = None,
+                  output_dir: Optional[str] = None,
+                  engine: Optional[str] = None) -> Dict:
+    """
+    Run the split → analyze → combine → summarize pipeline on a local video
+
+    Each stage is looked up in the result cache first, keyed by the content hash of
+    the video plus the model and prompt version the stage depends on.
+
+    Args:
+        video_path: Path of the uploaded four-view video
+        on_stage: Optional callback invoked with the stage name when each stage starts
+        video_hash: SHA-256 of the video if already known, otherwise it is computed
+        separated_videos: Views already split (e.g. while downloading); skips the split stage
+        full_res: Also keep full-resolution views for download, if None then use SEPARATOR_FULL_RES
+        full_res_videos: Full-resolution views written together with separated_videos
+        on_event: Optional callback receiving partial results as they become available:
+            split, segments_delta, segments, timeline, summary_delta and summary. Gemini
+            answers are only streamed when it is given
+        output_dir: Directory for the separated videos, if None then use the separator's default
+        engine: Separator engine that splits the video, or that split separated_videos,
+            if None then use SEPARATOR_ENGINE
+
+    Returns:
+        Dict: separated_videos (analysis clips), full_res_videos, analysis_results,
+            combined_result and video_hash
+    """
+    on_stage = on_stage or _no_stage
+    # Answers are only streamed when someone listens; batch runs and plain calls use one request
+    streaming = on_event is not None
+    on_event = on_event or _no_event
+    if full_res is None:
+        full_res = video_separator.SEPARATOR_FULL_RES
+    split_format = video_separator.output_format(engine, video_path)
+    cache = get_cache()
+    if cache is not None and video_hash is None:
+        with metrics.span("hash_video"):
+            video_hash = hash_file(video_path)
+
+    # 分割视频
+    if cache is not None:
+        split_key = cache_key(video_hash, split_format)
+    if separated_videos is not None:
+        # Already split while downloading
+        if cache is not None:
+            cache.put_files("split", split_key, with_time_maps(separated_videos))
+            if full_res_videos:
+                cache.put_files("full_res", split_key, full_res_videos)
+    else:
+        if cache is not None:
+            separated_videos = _count_lookup("split", cache.get_files("split", split_key))
+            if separated_videos is not None:
+                separated_videos = without_time_maps(separated_videos)
+            if separated_videos is not None and full_res:
+                full_res_videos = _count_lookup("full_res", cache.get_files("full_res", split_key))
+                if full_res_videos is None:
+                    # Full-resolution views are only written on request; split again to get them
+                    separated_videos = None
+        on_stage("split", cached=separated_videos is not None)
+        if separated_videos is None:
+            with metrics.span("stage", stage="split"):
+                separator = create_separator(video_path, output_dir, engine=engine, full_res=full_res)
+                separated_videos = separator.separate_video()
+                full_res_videos = separator.full_res_videos
+            # Key the clips and everything derived from them by the engine that wrote them
+            split_format = video_separator.output_format(separator.engine)
+            if cache is not None:
+                split_key = cache_key(video_hash, split_format)
+                cache.put_files("split", split_key, with_time_maps(separated_videos))
+                if full_res_videos:
+                    cache.put_files("full_res", split_key, full_res_videos)
+
+    on_event("split", views=list(separated_videos))
+
+    # 分析视频
+    analysis_results = {}
+    segment_keys = {}
+    if cache is not None:
+        for view in separated_videos:
+            segment_keys[view] = cache_key(
+                video_hash, split_format, view,
+                video_analyzer.DEFAULT_MODEL, video_analyzer.PROMPT_VERSION, video_analyzer.WINDOW_FORMAT
+            )
+            segments = _count_lookup("segments", cache.get_json("segments", segment_keys[view]))
+            if segments is not None:
+                analysis_results[view] = segments
+                on_event("segments", view=view, segments=segments, cached=True)
+    pending = {view: path for view, path in separated_videos.items() if view not in analysis_results}
+    on_stage("analyze", views=list(pending), cached_views=list(analysis_results))
+    if pending:
+        with metrics.span("stage", stage="analyze"):
+            fresh_results = analyze_all_videos(pending, on_event=on_event if streaming else None)
+        for view, segments in fresh_results.items():
+            if cache is not None and not _is_failed(segments):
+                cache.put_json("segments", segment_keys[view], segments)
+        analysis_results.update(fresh_results)
+    analysis_results = {view: analysis_results[view] for view in separated_videos}
+
+    # 汇总分析结果
+    combined_result = None
+    all_succeeded = not any(_is_failed(segments) for segments in analysis_results.values())
+    if cache is not None and all_succeeded:
+        combined_key = cache_key(
+            video_hash, split_format,
+            video_analyzer.DEFAULT_MODEL, video_analyzer.PROMPT_VERSION, video_analyzer.WINDOW_FORMAT,
+            sum_up.DEFAULT_MODEL, sum_up.PROMPT_VERSION, sum_up.MERGE_FORMAT
+        )
+        combined_result = _count_lookup("combined", cache.get_json("combined", combined_key))
+    if combined_result is None:
+        on_stage("combine")
+        with metrics.span("stage", stage="combine"):
+            # With SUMMARY_IN_COMBINE the merge call also writes the summary
+            combined_result = merge_and_summarize(analysis_results)
+            timeline = combined_result["timeline"] if combined_result else merge_timelines(analysis_results)
+        on_event("timeline", timeline=timeline)
+
+        if combined_result is not None:
+            on_stage("summarize", combined=True)
+            summary = combined_result["summary"]
+        else:
+            on_stage("summarize")
+            with metrics.span("stage", stage="summarize"):
+                summary = generate_video_summary(
+                    timeline,
+                    on_text=(lambda text, attempt: on_event("summary_delta", attempt=attempt, text=text))
+                    if streaming else None
+                )
+        on_event("summary", summary=summary)
+
+        combined_result = {
+            "summary": summary,
+            "timeline": timeline
+        }
+        # Results built from failed views are not cached, so a retry can fill them in
+        if cache is not None and all_succeeded:
+            cache.put_json("combined", combined_key, combined_result)
+    else:
+        on_stage("combine", cached=True)
+        on_event("timeline", timeline=combined_result["timeline"], cached=True)
+        on_event("summary", summary=combined_result["summary"], cached=True)
+
+    return {
+        "video_hash": video_hash,
+        "separated_videos": separated_videos,
+        "full_res_videos": full_res_videos or {},
+        "analysis_results": analysis_results,
+        "combined_result": combined_result
+    }
+
+
+def handle_job(payload: Dict, context) -> Dict:
+    """
+    Job queue handler for uploaded and URL videos
+
+    Args:
+        payload: {"source": "file", "path": ..., "filename": ...} or {"source": "url", "url": ...},
+            optionally with "full_res" to keep full-resolution views for download
+        context: JobContext used to report stage progress and partial results
+
+    Returns:
+        Dict: Job result, the same shape the synchronous upload endpoints used to return,
+            plus the job's timing spans and counters under "metrics"
+    """
+    with collect_job() as job_metrics:
+        result = _run_job(payload, context)
+    result["metrics"] = job_metrics.to_dict()
+    return result
+
+
+def _run_job(payload: Dict, context) -> Dict:
+    """Download (for URL jobs) and process one video"""
+    video_hash = None
+    separated_videos = None
+    full_res_videos = None
+    engine = None
+    full_res = payload.get("full_res")
+    output_dir = job_output_dir(context.job_id)
+    if payload["source"] == "url":
+        if ingest.INGEST_STREAM_SPLIT:
+            # Splitting happens during the download
+            context.plan(["download", "analyze", "combine", "summarize"])
+            context.stage("download", url=payload["url"], split=True)
+            with metrics.span("stage", stage="download"):
+                download = ingest.download_and_split(payload["url"], new_upload_path(context.job_id),
+                                                     output_dir=output_dir, full_res=full_res)
+            separated_videos = download["separated_videos"]
+            full_res_videos = download["full_res_videos"]
+            # Streamed clips come from opencv; the cache keys have to say so
+            engine = download["engine"]
+        else:
+            context.plan(["download", "split", "analyze", "combine", "summarize"])
+            context.stage("download", url=payload["url"])
+            with metrics.span("stage", stage="download"):
+                download = ingest.download(payload["url"], new_upload_path(context.job_id))
+        video_path = download["path"]
+        video_hash = download["sha256"]
+        filename = os.path.basename(video_path)
+    else:
+        context.plan(["split", "analyze", "combine", "summarize"])
+        video_path = payload["path"]
+        filename = payload["filename"]
+
+    if storage.STORAGE_DEDUP:
+        # Identical uploads share one file on disk; the hash is reused by the result cache
+        with metrics.span("hash_video"):
+            video_hash = storage.dedup(video_path, video_hash)
+
+    result = process_video(video_path, on_stage=context.stage, video_hash=video_hash,
+                           separated_videos=separated_videos, full_res=full_res,
+                           full_res_videos=full_res_videos, on_event=context.emit,
+                           output_dir=output_dir, engine=engine)
+    index_result(video_path, result, filename=filename, job_id=context.job_id)
+    return {
+        "message": "File uploaded, split and analyzed successfully",
+        "filename": filename,
+        **result
+    }
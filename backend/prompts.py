@@ -0,0 +1,122 @@
+from typing import Dict, NamedTuple
+
+# Static instruction blocks sent with Gemini requests. Each template carries a version
+# that is part of the Gemini context cache key and of the result cache keys, so bump
+# it whenever the text changes.
+
+
+class Prompt(NamedTuple):
+    """A versioned instruction block"""
+    name: str
+    version: str
+    text: str
+
+    @property
+    def key(self) -> str:
+        """Stable identifier, e.g. "merge-v1"; used as the cached content's display name"""
+        return f"{self.name}-v{self.version}"
+
+
+def prompt_version(*prompts: Prompt) -> str:
+    """Combined version of the templates a result depends on, for the result cache"""
+    return "+".join(prompt.key for prompt in prompts)
+
+
+# View prompt mapping, by the labels analyze_all_videos passes
+VIEW_PROMPTS: Dict[str, str] = {
+    'up': (
+        "This video is captured from an overhead camera. Provide the most detailed description possible of all movements, spatial relationships between objects, relative displacements, angle changes, and sense of speed, and note any observable changes in object state (e.g., opening, locking, deformation, tension)."
+    ),
+    'front': (
+        "This video is captured from a front-facing camera. Provide the most detailed description possible of the action sequence, including each arm's motion trajectory, the sense of gripping force, changes in object surface characteristics, and any subtle adjustments in object orientation, angle, or position."
+    ),
+    'left': (
+        "This video is captured by a camera mounted on the left robotic arm. From the left-arm perspective, provide a thorough description of each extension, rotation, and gripping action, focusing on any deformation, posture changes, and relative position shifts of objects upon contact, as well as changes in the left arm's joint angles."
+    ),
+    'right': (
+        "This video is captured by a camera mounted on the right robotic arm. From the right-arm perspective, provide a thorough description of each movement, gripping action, direction and magnitude of applied force, and describe any changes in object state, including position, orientation, locking, or any physical interactions."
+    ),
+}
+
+SEGMENTS_TEXT = "Split the video into the finest-grained action segments, each focusing on one distinct action, and include the following details:\n" + \
+    "1. Time range (MM:SS–MM:SS)\n" + \
+    "2. Actor (left arm, right arm, or both)\n" + \
+    "3. Target object and any relevant properties (material, shape, etc.)\n" + \
+    "4. Motion trajectory, sense of speed, and direction of force\n" + \
+    "5. Any changes in object state or position (e.g., locked, released, rotated, displaced)\n\n" + \
+    "6. Output ONLY the unified list, one segment per line, with no extra text.\n\n" + \
+    "Example:\n" + \
+    "00:00–00:03 : The left robotic arm moves along a straight trajectory toward the center, grasps the translucent plastic container with slight locking pressure.\n" + \
+    "00:03–00:06 : The right robotic arm rotates clockwise by 45° at a slow pace, pushing a Duracell battery into the compartment until an audible click.\n" + \
+    "00:06–00:09 : Both arms lift upward and retract in synchronization, leaving the closed battery compartment behind."
+
+SEGMENTS_VERSION = "1"
+
+
+def segments_prompt(view: str) -> Prompt:
+    """Instructions of the per-view analysis: the view's prompt followed by the segment format"""
+    text = f"{VIEW_PROMPTS[view]}\n\n{SEGMENTS_TEXT}" if view in VIEW_PROMPTS else SEGMENTS_TEXT
+    return Prompt(f"segments-{view or 'any'}", SEGMENTS_VERSION, text)
+
+
+MERGE = Prompt("merge", "1", "\n".join([
+    "You have four synchronized camera views of the same action sequence, each providing time-stamped segments in MM:SS–MM:SS : description format:",
+    "- Top: overhead view",
+    "- Front: frontal view",
+    "- Right: camera on the right robotic arm",
+    "- Left: camera on the left robotic arm",
+    "",
+    "Generate a single chronological list of unified action segments with these rules:",
+    "1. Order by start time (then end time).",
+    "2. When segments share identical times, merge their information into one description without view labels.",
+    "3. Merge overlapping segments only if they describe the same continuous motion—use the earliest start, latest end, and combine details.",
+    "4. Do not separate actions by individual arms; describe arm actions collectively (e.g., 'Both arms pick up…').",
+    "5. Keep segments granular: start a new segment whenever the action changes (e.g., moving vs. grasping vs. placing).",
+    "6. Preserve the exact MM:SS–MM:SS format.",
+    "7. Ensure no two segments start at the same timestamp: if two would share a start, set the later one's start to the earlier segment's end.",
+    "8. Output ONLY the unified list, one segment per line, with no extra text.",
+    "",
+    "# Expected unified output:",
+    "00:00–00:06 : Both arms pick up an AA Duracell battery and insert it into the battery compartment.",
+    "00:06–00:09 : Left arms pick up a second AA Duracell battery and insert it into the battery compartment.",
+    "00:09–00:14 : Right arms retract upward, Right arm rotates slightly, and close the battery compartment door.",
+    "00:14–00:17 : Both arms move away from the closed battery compartment."
+]))
+
+FUSION = Prompt("fusion", "1", "\n".join([
+    "Each line you are given is one action segment of a robot manipulation video in MM:SS–MM:SS : description format.",
+    "The description of a line combines notes from several camera views and may repeat itself.",
+    "Rewrite every description as one concise, detailed sentence that describes the arms collectively (e.g., 'Both arms pick up…') instead of separately.",
+    "Keep every line and its exact time range, in the same order.",
+    "Output ONLY the rewritten list, one segment per line, with no extra text."
+]))
+
+SUMMARY = Prompt("summary", "1", "\n".join([
+    "You are given the detailed action sequence of a robot manipulation video, one MM:SS–MM:SS : description segment per line.",
+    "Provide a concise English summary of what the robot did in this video. Focus on the main actions and their purpose.",
+    "Please provide a brief summary in 2-3 sentences, focusing on the key actions and their purpose."
+]))
+
+# Appended to MERGE or FUSION when the summary is written by the same call
+WITH_SUMMARY = Prompt("with-summary", "1", "\n".join([
+    "",
+    "Answer with a JSON object instead of plain lines:",
+    '- "timeline": the segment lines described above, each one "MM:SS–MM:SS : description" string, in order',
+    '- "summary": a concise English summary of what the robot did in the video, in 2-3 sentences, focusing on the key actions and their purpose'
+]))
+
+# Structured output of the folded merge + summary call
+COMBINED_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "timeline": {"type": "ARRAY", "items": {"type": "STRING"}},
+        "summary": {"type": "STRING"},
+    },
+    "required": ["timeline", "summary"],
+}
+
+
+def with_summary(prompt: Prompt) -> Prompt:
+    """Instructions of a merge prompt that also asks for the summary as JSON"""
+    return Prompt(f"{prompt.name}+summary", f"{prompt.version}.{WITH_SUMMARY.version}",
+                  prompt.text + "\n" + WITH_SUMMARY.text)
@@ -0,0 +1,220 @@
+import os
+import json
+import hashlib
+import shutil
+import tempfile
+import threading
+import time
+from typing import Dict, Optional
+
+# Result cache settings
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "1") != "0"
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", "cache")
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(5 * 1024 ** 3)))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", str(7 * 24 * 3600)))
+# Minimum seconds between eviction sweeps
+RESULT_CACHE_SWEEP_INTERVAL = float(os.getenv("RESULT_CACHE_SWEEP_INTERVAL", "60"))
+
+# Cache layers: analysis clips, full-resolution views, per-view Gemini segments, combined timeline/summary
+LAYERS = ("split", "full_res", "segments", "combined")
+
+META_FILE = "meta.json"
+
+
+def hash_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Compute the SHA-256 of a file without loading it into memory
+
+    Args:
+        path: File path
+        chunk_size: Bytes read per iteration
+
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_key(*parts: str) -> str:
+    """Build a cache key from the content hash plus whatever else the result depends on"""
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: Optional[int] = None,
+                 ttl: Optional[float] = None):
+        """
+        Initialize an on-disk, content-addressed result cache
+
+        Each entry is a directory cache_dir/<layer>/<key>/ holding meta.json and, for the
+        split layer, the cached video files. Entries are written to a temporary directory
+        and renamed into place, so readers never see partial entries.
+
+        Args:
+            cache_dir: Cache root directory, if None then use RESULT_CACHE_DIR
+            max_bytes: Total size limit, if None then use RESULT_CACHE_MAX_BYTES
+            ttl: Seconds an entry lives after its last use, if None then use RESULT_CACHE_TTL
+        """
+        self.cache_dir = os.path.abspath(cache_dir or RESULT_CACHE_DIR)
+        self.max_bytes = RESULT_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.ttl = RESULT_CACHE_TTL if ttl is None else ttl
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+        for layer in LAYERS:
+            os.makedirs(os.path.join(self.cache_dir, layer), exist_ok=True)
+
+    def _entry_dir(self, layer: str, key: str) -> str:
+        """Directory of a cache entry"""
+        if layer not in LAYERS:
+            raise ValueError(f"Unknown cache layer: {layer}")
+        return os.path.join(self.cache_dir, layer, key)
+
+    def _read_meta(self, entry_dir: str) -> Optional[Dict]:
+        """Load an entry's metadata, or None if missing or expired; refreshes its access time on a hit"""
+        meta_path = os.path.join(entry_dir, META_FILE)
+        try:
+            if time.time() - os.path.getmtime(meta_path) > self.ttl:
+                return None
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            os.utime(meta_path)
+            return meta
+        except (OSError, ValueError):
+            return None
+
+    def _commit(self, layer: str, key: str, staging_dir: str):
+        """Atomically move a fully written staging directory into place"""
+        entry_dir = self._entry_dir(layer, key)
+        try:
+            os.rename(staging_dir, entry_dir)
+        except OSError:
+            # Another job stored the same entry first; keep theirs, or replace an expired one
+            if self._read_meta(entry_dir) is None:
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                try:
+                    os.rename(staging_dir, entry_dir)
+                except OSError:
+                    shutil.rmtree(staging_dir, ignore_errors=True)
+            else:
+                shutil.rmtree(staging_dir, ignore_errors=True)
+        self.maybe_evict()
+
+    def _staging_dir(self, layer: str) -> str:
+        """Create a temporary directory next to the layer so the final rename stays on one filesystem"""
+        return tempfile.mkdtemp(prefix=".tmp-", dir=os.path.join(self.cache_dir, layer))
+
+    def get_json(self, layer: str, key: str) -> Optional[Dict]:
+        """
+        Look up a JSON value
+
+        Args:
+            layer: Cache layer
+            key: Cache key from cache_key()
+
+        Returns:
+            The stored value, or None on a miss
+        """
+        meta = self._read_meta(self._entry_dir(layer, key))
+        return meta["value"] if meta else None
+
+    def put_json(self, layer: str, key: str, value):
+        """Store a JSON-serializable value"""
+        staging_dir = self._staging_dir(layer)
+        with open(os.path.join(staging_dir, META_FILE), "w", encoding="utf-8") as f:
+            json.dump({"created_at": time.time(), "value": value}, f, ensure_ascii=False)
+        self._commit(layer, key, staging_dir)
+
+    def get_files(self, layer: str, key: str) -> Optional[Dict[str, str]]:
+        """
+        Look up a set of cached files
+
+        Returns:
+            Dict[str, str]: Name to absolute path of each cached file, or None on a miss
+        """
+        entry_dir = self._entry_dir(layer, key)
+        meta = self._read_meta(entry_dir)
+        if meta is None:
+            return None
+        paths = {name: os.path.join(entry_dir, filename) for name, filename in meta["files"].items()}
+        if not all(os.path.isfile(path) for path in paths.values()):
+            return None
+        return paths
+
+    def put_files(self, layer: str, key: str, files: Dict[str, str]) -> Dict[str, str]:
+        """
+        Store a set of files, hardlinking them when possible
+
+        Args:
+            layer: Cache layer
+            key: Cache key from cache_key()
+            files: Name to source path of each file
+
+        Returns:
+            Dict[str, str]: Name to cached path of each file
+        """
+        staging_dir = self._staging_dir(layer)
+        stored = {}
+        for name, path in files.items():
+            filename = os.path.basename(path)
+            target = os.path.join(staging_dir, filename)
+            try:
+                os.link(path, target)
+            except OSError:
+                shutil.copy2(path, target)
+            stored[name] = filename
+        with open(os.path.join(staging_dir, META_FILE), "w", encoding="utf-8") as f:
+            json.dump({"created_at": time.time(), "files": stored}, f, ensure_ascii=False)
+        self._commit(layer, key, staging_dir)
+        return self.get_files(layer, key) or files
+
+    def _entries(self):
+        """Yield (last_used, size, path) for every committed entry"""
+        for layer in LAYERS:
+            layer_dir = os.path.join(self.cache_dir, layer)
+            for name in os.listdir(layer_dir):
+                entry_dir = os.path.join(layer_dir, name)
+                try:
+                    last_used = os.path.getmtime(os.path.join(entry_dir, META_FILE))
+                    size = sum(entry.stat().st_size for entry in os.scandir(entry_dir) if entry.is_file())
+                except OSError:
+                    # Staging directories and half-deleted entries have no meta.json
+                    if name.startswith(".tmp-"):
+                        try:
+                            stale = time.time() - os.path.getmtime(entry_dir) > 3600
+                        except OSError:
+                            # Committed or removed by another process meanwhile
+                            continue
+                        if stale:
+                            shutil.rmtree(entry_dir, ignore_errors=True)
+                    continue
+                yield last_used, size, entry_dir
+
+    def evict(self) -> int:
+        """
+        Remove expired entries, then least recently used ones until the cache fits max_bytes
+
+        Returns:
+            int: Number of entries removed
+        """
+        with self._lock:
+            now = time.time()
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            removed = 0
+            for last_used, size, entry_dir in entries:
+                if now - last_used <= self.ttl and total <= self.max_bytes:
+                    break
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                total -= size
+                removed += 1
+            self._last_sweep = now
+            return removed
+
+    def maybe_evict(self):
+        """Run an eviction sweep if the last one is older than RESULT_CACHE_SWEEP_INTERVAL"""
+        if time.time() - self._last_sweep >= RESULT_CACHE_SWEEP_INTERVAL:
+            self.evict()
@@ -0,0 +1,225 @@
+import os
+import json
+import re
+import sqlite3
+import time
+from typing import Dict, List, Optional
+from timeline import format_timestamp, parse_segments
+from metrics import registry as metrics
+
+# Results store settings
+RESULTS_STORE_ENABLED = os.getenv("RESULTS_STORE_ENABLED", "1") != "0"
+RESULTS_DB_PATH = os.getenv("RESULTS_DB_PATH", "results.db")
+
+# View name of the merged timeline's segments
+TIMELINE_VIEW = "timeline"
+# View whose video frame links of merged timeline segments point to
+TIMELINE_FRAME_VIEW = "top"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    video_hash TEXT PRIMARY KEY,
+    filename TEXT,
+    job_id TEXT,
+    summary TEXT,
+    video_paths TEXT NOT NULL DEFAULT '{}',
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY,
+    video_hash TEXT NOT NULL,
+    view TEXT NOT NULL,
+    start REAL NOT NULL,
+    end REAL NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_segments_video ON segments(video_hash, view, start);
+CREATE INDEX IF NOT EXISTS idx_segments_time ON segments(start, end);
+CREATE VIRTUAL TABLE IF NOT EXISTS segments_fts USING fts5(
+    text, content='segments', content_rowid='id', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS segments_ai AFTER INSERT ON segments BEGIN
+    INSERT INTO segments_fts(rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS segments_ad AFTER DELETE ON segments BEGIN
+    INSERT INTO segments_fts(segments_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+"""
+
+WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def fts_query(text: str) -> str:
+    """
+    Turn free text into an FTS5 query matching segments that contain every word
+
+    Words are quoted so that punctuation and FTS5 operators in user input are taken
+    literally; a trailing "*" on a word keeps its prefix search.
+    """
+    terms = []
+    for word in text.split():
+        prefix = word.endswith("*")
+        for token in WORD_PATTERN.findall(word):
+            terms.append(f'"{token}"')
+        if prefix and terms:
+            terms[-1] += "*"
+    return " ".join(terms)
+
+
+class ResultsStore:
+    def __init__(self, db_path: Optional[str] = None):
+        """
+        Initialize the SQLite store of analyzed videos
+
+        Every per-view segment list and the merged timeline are stored as one row per
+        MM:SS–MM:SS segment, indexed by time range and by an FTS5 full-text index on the
+        description, so segments can be found without reprocessing any video.
+
+        Args:
+            db_path: SQLite database path, if None then use RESULTS_DB_PATH
+        """
+        self.db_path = db_path or RESULTS_DB_PATH
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection; one per operation keeps the store safe across threads and processes"""
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        """Create the tables and the full-text index"""
+        db_dir = os.path.dirname(os.path.abspath(self.db_path))
+        os.makedirs(db_dir, exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+
+    def save(self, video_hash: str, result: Dict, filename: Optional[str] = None,
+             job_id: Optional[str] = None) -> int:
+        """
+        Store the segments of a processed video, replacing what was stored for it before
+
+        Args:
+            video_hash: SHA-256 of the video
+            result: process_video result with analysis_results, combined_result and the video paths
+            filename: Original file name, shown in search results
+            job_id: Job that produced the result, for /api/download
+
+        Returns:
+            int: Number of segments stored
+        """
+        rows = []
+        for view, text in (result.get("analysis_results") or {}).items():
+            rows += [(video_hash, view, *segment) for segment in parse_segments(text)]
+        combined = result.get("combined_result") or {}
+        rows += [(video_hash, TIMELINE_VIEW, *segment) for segment in parse_segments(combined.get("timeline") or "")]
+        # Full-resolution views are in source time and the better frames; analysis clips otherwise
+        video_paths = {**(result.get("separated_videos") or {}), **(result.get("full_res_videos") or {})}
+
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM segments WHERE video_hash = ?", (video_hash,))
+            conn.execute(
+                "INSERT OR REPLACE INTO videos (video_hash, filename, job_id, summary, video_paths, indexed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (video_hash, filename, job_id, combined.get("summary"), json.dumps(video_paths), time.time()),
+            )
+            conn.executemany(
+                "INSERT INTO segments (video_hash, view, start, end, text) VALUES (?, ?, ?, ?, ?)", rows
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return len(rows)
+
+    def search(self, query: Optional[str] = None, view: Optional[str] = None,
+               start: Optional[float] = None, end: Optional[float] = None,
+               video_hash: Optional[str] = None, limit: int = 50, offset: int = 0) -> List[Dict]:
+        """
+        Find segments by description and time range
+
+        Args:
+            query: Words every matching description contains (stemmed, e.g. "close" finds
+                "closes"); most recently indexed first. Without a query, segments are ordered
+                by video and time
+            view: Only segments of this view, or "timeline" for the merged timeline
+            start: Only segments ending at or after this second
+            end: Only segments starting at or before this second
+            video_hash: Only segments of this video
+            limit: Maximum number of segments returned
+            offset: Number of matching segments skipped, for paging
+
+        Returns:
+            List[Dict]: Segments with video_hash, filename, job_id, view, start, end, text
+                and video_path, the video to read frames of the segment from
+        """
+        conditions = []
+        params: List = []
+        if query:
+            match = fts_query(query)
+            if not match:
+                return []
+            if video_hash:
+                # Check the few segments of one video against the index instead of scanning every match
+                source = "segments s CROSS JOIN segments_fts ON segments_fts.rowid = s.id"
+                order = "s.id DESC"
+            else:
+                source = "segments_fts JOIN segments s ON s.id = segments_fts.rowid"
+                # Ranking would score every match; the index returns them by rowid and stops at the limit
+                order = "segments_fts.rowid DESC"
+            conditions.append("segments_fts MATCH ?")
+            params.append(match)
+        else:
+            source = "segments s"
+            order = "s.video_hash, s.start"
+        if view:
+            conditions.append("s.view = ?")
+            params.append(view)
+        if start is not None:
+            conditions.append("s.end >= ?")
+            params.append(start)
+        if end is not None:
+            conditions.append("s.start <= ?")
+            params.append(end)
+        if video_hash:
+            conditions.append("s.video_hash = ?")
+            params.append(video_hash)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        conn = self._connect()
+        try:
+            with metrics.span("results_search"):
+                rows = conn.execute(
+                    f"SELECT s.video_hash, s.view, s.start, s.end, s.text, v.filename, v.job_id, v.video_paths "
+                    f"FROM {source} JOIN videos v ON v.video_hash = s.video_hash "
+                    f"{where} ORDER BY {order} LIMIT ? OFFSET ?",
+                    (*params, limit, offset),
+                ).fetchall()
+        finally:
+            conn.close()
+
+        results = []
+        for row in rows:
+            video_paths = json.loads(row["video_paths"])
+            frame_view = TIMELINE_FRAME_VIEW if row["view"] == TIMELINE_VIEW else row["view"]
+            results.append({
+                "video_hash": row["video_hash"],
+                "filename": row["filename"],
+                "job_id": row["job_id"],
+                "view": row["view"],
+                "start": row["start"],
+                "end": row["end"],
+                "time_range": f"{format_timestamp(row['start'])}–{format_timestamp(row['end'])}",
+                "text": row["text"],
+                "video_path": video_paths.get(frame_view),
+            })
+        return results
@@ -0,0 +1,288 @@
+import os
+import errno
+import fcntl
+import shutil
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+from result_cache import hash_file
+from metrics import registry as metrics
+
+# Storage settings for uploads and separated videos (the result cache has its own limits)
+STORAGE_QUOTA_BYTES = int(os.getenv("STORAGE_QUOTA_BYTES", str(20 * 1024 ** 3)))
+STORAGE_TTL = float(os.getenv("STORAGE_TTL", str(3 * 24 * 3600)))
+# Files younger than this are never evicted, e.g. an upload whose job is being submitted
+STORAGE_MIN_AGE = float(os.getenv("STORAGE_MIN_AGE", "600"))
+STORAGE_JANITOR_INTERVAL = float(os.getenv("STORAGE_JANITOR_INTERVAL", "300"))
+# Hardlink uploads with the same content to a single copy
+STORAGE_DEDUP = os.getenv("STORAGE_DEDUP", "1") != "0"
+
+# Hardlinks named by content hash, next to the uploads they deduplicate
+INDEX_DIR = ".by-hash"
+LOCK_FILE = ".janitor.lock"
+
+
+class Entry(NamedTuple):
+    """A file or job directory that is evicted as a whole"""
+    area: str
+    path: str
+    last_used: float
+    files: List[os.stat_result]
+
+
+def dedup(path: str, digest: Optional[str] = None, index_dir: Optional[str] = None) -> str:
+    """
+    Replace a file by a hardlink to an earlier file with the same content
+
+    Args:
+        path: Uploaded or downloaded video
+        digest: SHA-256 of the file if already known, otherwise it is computed
+        index_dir: Directory of the content hash links, if None then INDEX_DIR next to the file
+
+    Returns:
+        str: SHA-256 of the file
+    """
+    digest = digest or hash_file(path)
+    index_dir = index_dir or os.path.join(os.path.dirname(os.path.abspath(path)), INDEX_DIR)
+    os.makedirs(index_dir, exist_ok=True)
+    index_path = os.path.join(index_dir, digest)
+    try:
+        os.link(path, index_path)
+        # First file with this content
+        return digest
+    except FileExistsError:
+        pass
+    except OSError:
+        # e.g. a filesystem without hardlinks; keep the copy
+        return digest
+
+    try:
+        if os.path.samefile(index_path, path) or os.path.getsize(index_path) != os.path.getsize(path):
+            return digest
+        size = os.path.getsize(path)
+        staging_path = f"{path}.dedup"
+        os.link(index_path, staging_path)
+        os.replace(staging_path, path)
+    except OSError:
+        # The janitor removed the unused link meanwhile; keep the copy
+        return digest
+    metrics.inc("storage_dedup_bytes_total", size)
+    return digest
+
+
+class StorageManager:
+    def __init__(self, roots: Dict[str, str], quota_bytes: Optional[int] = None, ttl: Optional[float] = None,
+                 min_age: Optional[float] = None, in_use: Optional[Callable[[], Iterable[str]]] = None):
+        """
+        Initialize the storage manager of uploads and separated videos
+
+        Every file directly in a root, and every directory in it (one per job), is an
+        entry. Entries unused for longer than ttl are removed, then the least recently
+        used ones until the roots fit the quota. Paths returned by in_use (the files of
+        queued and running jobs) and entries younger than min_age are kept. Files that
+        are also hardlinked from the result cache do not free space when removed, so
+        they are only removed once expired.
+
+        Args:
+            roots: Area name to directory, e.g. {"uploads": "uploads", "separated": "separated_videos"}
+            quota_bytes: Total size limit, if None then use STORAGE_QUOTA_BYTES
+            ttl: Seconds an entry is kept after its last use, if None then use STORAGE_TTL
+            min_age: Seconds a new entry is always kept, if None then use STORAGE_MIN_AGE
+            in_use: Callable returning paths that must not be removed; a path also covers
+                files that start with it (such as a download's .part file)
+        """
+        self.roots = {area: os.path.abspath(root) for area, root in roots.items()}
+        self.quota_bytes = STORAGE_QUOTA_BYTES if quota_bytes is None else quota_bytes
+        self.ttl = STORAGE_TTL if ttl is None else ttl
+        self.min_age = STORAGE_MIN_AGE if min_age is None else min_age
+        self.in_use = in_use or (lambda: [])
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        for root in self.roots.values():
+            os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def touch(path: str):
+        """
+        Mark a file as used now, e.g. when it is downloaded or frames are read from it
+
+        Only the access time is set: the frame server and the Gemini upload registry key
+        files by their modification time, which has to stay as it is.
+        """
+        try:
+            stat = os.stat(path)
+            os.utime(path, ns=(time.time_ns(), stat.st_mtime_ns))
+        except OSError:
+            pass
+
+    @staticmethod
+    def _last_used(stat: os.stat_result) -> float:
+        """When a file was written or last marked as used"""
+        return max(stat.st_mtime, stat.st_atime)
+
+    @staticmethod
+    def _files(path: str) -> List[os.stat_result]:
+        """Stats of a file, or of every file below a directory"""
+        if not os.path.isdir(path):
+            return [os.stat(path)]
+        stats = []
+        for dir_path, _, names in os.walk(path):
+            for name in names:
+                try:
+                    stats.append(os.stat(os.path.join(dir_path, name)))
+                except OSError:
+                    continue
+        return stats
+
+    def _scan(self) -> Tuple[List[Entry], Dict[tuple, int], Dict[tuple, int]]:
+        """Return the entries, plus entry and hash index links per inode"""
+        entries = []
+        links: Dict[tuple, int] = {}
+        index_links: Dict[tuple, int] = {}
+        for area, root in self.roots.items():
+            for item in os.scandir(root):
+                # Index links, locks and in-progress stream directories are managed elsewhere
+                if item.name.startswith("."):
+                    if item.name == INDEX_DIR:
+                        for stat in self._files(item.path):
+                            inode = (stat.st_dev, stat.st_ino)
+                            index_links[inode] = index_links.get(inode, 0) + 1
+                    continue
+                try:
+                    stats = self._files(item.path)
+                    own_mtime = item.stat().st_mtime
+                except OSError:
+                    continue
+                for stat in stats:
+                    inode = (stat.st_dev, stat.st_ino)
+                    links[inode] = links.get(inode, 0) + 1
+                last_used = max([own_mtime] + [self._last_used(stat) for stat in stats])
+                entries.append(Entry(area, item.path, last_used, stats))
+        return entries, links, index_links
+
+    @staticmethod
+    def _pinned(stat: os.stat_result, links: Dict[tuple, int], index_links: Dict[tuple, int]) -> bool:
+        """Whether a file is also linked from outside the roots, i.e. from the result cache"""
+        inode = (stat.st_dev, stat.st_ino)
+        return stat.st_nlink > links.get(inode, 0) + index_links.get(inode, 0)
+
+    def usage(self) -> Dict[str, int]:
+        """Bytes used per area, counting hardlinked files once"""
+        entries, _, _ = self._scan()
+        usage = {area: 0 for area in self.roots}
+        counted = set()
+        for entry in entries:
+            for stat in entry.files:
+                if (stat.st_dev, stat.st_ino) not in counted:
+                    counted.add((stat.st_dev, stat.st_ino))
+                    usage[entry.area] += stat.st_size
+        return usage
+
+    def _protected(self) -> List[str]:
+        return [os.path.abspath(path) for path in self.in_use() if path]
+
+    def sweep(self) -> int:
+        """
+        Run one eviction pass; skipped when another process is already sweeping the same roots
+
+        Returns:
+            int: Number of entries removed
+        """
+        lock_path = os.path.join(next(iter(self.roots.values())), LOCK_FILE)
+        with self._lock, open(lock_path, "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EACCES):
+                    return 0
+                raise
+            try:
+                return self._sweep()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _sweep(self) -> int:
+        protected = self._protected()
+        entries, links, index_links = self._scan()
+        # Links left after each removal; pins are judged against the links found by the scan
+        remaining = dict(links)
+        total = sum(self.usage().values())
+        now = time.time()
+        removed = 0
+        for entry in sorted(entries, key=lambda entry: entry.last_used):
+            age = now - entry.last_used
+            expired = age > self.ttl
+            if not expired and total <= self.quota_bytes:
+                break
+            if age < self.min_age or any(entry.path.startswith(path) or path.startswith(entry.path + os.sep)
+                                         for path in protected):
+                continue
+            if not expired and entry.files and all(self._pinned(stat, links, index_links) for stat in entry.files):
+                # Also held by the result cache; removing it would not free anything
+                continue
+            if os.path.isdir(entry.path):
+                shutil.rmtree(entry.path, ignore_errors=True)
+            else:
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    continue
+            # Space comes back once the last link of a file is gone (identical uploads share one file)
+            freed = 0
+            for stat in entry.files:
+                inode = (stat.st_dev, stat.st_ino)
+                remaining[inode] -= 1
+                if remaining[inode] == 0 and not self._pinned(stat, links, index_links):
+                    freed += stat.st_size
+            total -= freed
+            removed += 1
+            metrics.inc("storage_evicted_total", area=entry.area, reason="ttl" if expired else "quota")
+            metrics.inc("storage_evicted_bytes_total", freed, area=entry.area)
+
+        # Drop hash links whose uploads are gone
+        for root in self.roots.values():
+            index_dir = os.path.join(root, INDEX_DIR)
+            if not os.path.isdir(index_dir):
+                continue
+            for item in os.scandir(index_dir):
+                try:
+                    if item.stat().st_nlink <= 1:
+                        os.remove(item.path)
+                except OSError:
+                    continue
+
+        for area, used in self.usage().items():
+            metrics.set_gauge("storage_bytes", used, area=area)
+        metrics.set_gauge("storage_quota_bytes", self.quota_bytes)
+        if removed:
+            print(f"Storage janitor removed {removed} entries")
+        return removed
+
+    def _janitor_loop(self, interval: float):
+        while not self._stop.is_set():
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Storage janitor failed: {e}")
+            self._stop.wait(interval)
+
+    def start(self, interval: Optional[float] = None):
+        """Start the background janitor thread"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._janitor_loop,
+            args=(STORAGE_JANITOR_INTERVAL if interval is None else interval,),
+            name="storage-janitor",
+            daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Stop the janitor thread"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -1,107 +1,195 @@
 import os
+import json
 from pathlib import Path
 from dotenv import load_dotenv
-from google import genai
-from typing import Dict, List
+from typing import Callable, Dict, List, Optional
+from google.genai import types
+from gemini_client import GeminiPool
+from gemini_cache import generate_with_instructions
+from prompts import COMBINED_SCHEMA, FUSION, MERGE, SUMMARY, WITH_SUMMARY, prompt_version, with_summary
+from timeline import format_segments, merge_view_segments, parse_segments
 
 # 加载环境变量
 env_path = Path(__file__).parent / '.env'
 load_dotenv(env_path)
 
-def generate_video_summary(combined_result: str) -> str:
+DEFAULT_MODEL = "gemini-2.0-flash"
+# Versions of the merge and summary prompts (see prompts.py), so cached results are not reused after a change
+PROMPT_VERSION = prompt_version(MERGE, FUSION, SUMMARY, WITH_SUMMARY)
+
+# How the four views are merged into one timeline:
+#   local  - deterministic sweep-line merge, no API call
+#   fusion - local merge, then Gemini rewrites each merged description
+#   model  - Gemini merges the raw segment lists
+TIMELINE_MERGE_MODE = os.getenv("TIMELINE_MERGE_MODE", "local")
+# Thresholds of the local merge, see timeline.merge_view_segments
+TIMELINE_MERGE_OVERLAP = float(os.getenv("TIMELINE_MERGE_OVERLAP", "0.5"))
+TIMELINE_MERGE_SIMILARITY = float(os.getenv("TIMELINE_MERGE_SIMILARITY", "0.2"))
+# Let the fusion/model merge call also write the summary as JSON, saving the separate summary request
+SUMMARY_IN_COMBINE = os.getenv("SUMMARY_IN_COMBINE", "0") == "1"
+# Part of the combined cache key
+MERGE_FORMAT = f"merge-v3-{TIMELINE_MERGE_MODE}-{TIMELINE_MERGE_OVERLAP:g}-{TIMELINE_MERGE_SIMILARITY:g}" + \
+    ("-with-summary" if SUMMARY_IN_COMBINE else "")
+
+VIEW_ORDER = ["top", "front", "right", "left"]
+
+def generate_video_summary(combined_result: str, on_text: Optional[Callable[[str, int], None]] = None) -> str:
     """
     使用 Gemini 生成视频内容的英文总结
     
     Args:
         combined_result: 合并后的视频分析结果
+        on_text: 可选，流式返回时以 on_text(片段, 尝试次数) 回调每段文字
         
     Returns:
         视频内容的英文总结
     """
     # 验证API密钥
-    api_key = os.getenv("GOOGLE_API_KEY")
-    if not api_key:
+    if not GeminiPool.keys():
         raise RuntimeError("GOOGLE_API_KEY not found in environment variables")
 
-    # 生成提示词
-    prompt = f"""Based on the following detailed action sequence from a robot manipulation video, provide a concise English summary of what the robot did in this video. Focus on the main actions and their purpose.
-
-Action sequence:
-{combined_result}
-
-Please provide a brief summary in 2-3 sentences, focusing on the key actions and their purpose."""
-
-    # 调用Gemini API
-    client = genai.Client(api_key=api_key)
-    response = client.models.generate_content(
-        model="gemini-2.0-flash",
-        contents=prompt
-    )
+    # 调用Gemini API（共享客户端池负责限流与重试）；固定的指令放在上下文缓存或系统指令中，请求只带时间轴
+    response = generate_with_instructions(DEFAULT_MODEL, SUMMARY, combined_result, call="summary", on_text=on_text)
 
     return response.text
 
-def combine_analysis_results(analysis_results: Dict[str, str]) -> Dict[str, str]:
+def merge_timelines(analysis_results: Dict[str, str], mode: Optional[str] = None) -> str:
     """
-    Combine analysis results from four perspectives into a complete description and generate a summary
+    Merge the segment lists from four perspectives into a single chronological timeline
     
     Args:
         analysis_results: Dictionary containing analysis results from four perspectives
+        mode: local, fusion or model, if None then use TIMELINE_MERGE_MODE
         
     Returns:
-        Dictionary containing summary and detailed timeline
+        Unified timeline, one MM:SS–MM:SS segment per line
     """
-    # Verify API key
-    api_key = os.getenv("GOOGLE_API_KEY")
-    if not api_key:
-        raise RuntimeError("GOOGLE_API_KEY not found in environment variables")
+    mode = mode or TIMELINE_MERGE_MODE
+    if mode == "model":
+        return _merge_with_model(analysis_results)
+    
+    timeline = _merge_locally(analysis_results)
+    if not timeline:
+        # Nothing followed the segment format; let the model make sense of it
+        print("No segments could be parsed locally, merging with Gemini")
+        return _merge_with_model(analysis_results)
+    if mode == "fusion":
+        return _fuse_descriptions(timeline)
+    return format_segments(timeline)
+
+def _merge_locally(analysis_results: Dict[str, str]):
+    """Sweep-line merge of the parsed view segments; empty when nothing followed the segment format"""
+    view_segments = {view: parse_segments(analysis_results.get(view, "")) for view in VIEW_ORDER}
+    return merge_view_segments(
+        view_segments,
+        min_overlap=TIMELINE_MERGE_OVERLAP,
+        min_similarity=TIMELINE_MERGE_SIMILARITY
+    )
+
+def _keep_time_ranges(answer: str, timeline) -> str:
+    """Fused descriptions, or the local ones when the answer does not keep every time range"""
+    fused = parse_segments(answer or "")
+    if [(segment.start, segment.end) for segment in fused] != [(segment.start, segment.end) for segment in timeline]:
+        print("Fused timeline changed the time ranges, keeping the local descriptions")
+        return format_segments(timeline)
+    return format_segments(fused)
 
-    # Generate prompt
-    prompt_lines = [
-        "You have four synchronized camera views of the same action sequence, each providing time-stamped segments in MM:SS–MM:SS : description format:",
-        "- Top: overhead view",
-        "- Front: frontal view",
-        "- Right: camera on the right robotic arm",
-        "- Left: camera on the left robotic arm",
-        "",
-        "Generate a single chronological list of unified action segments with these rules:",
-        "1. Order by start time (then end time).",
-        "2. When segments share identical times, merge their information into one description without view labels.",
-        "3. Merge overlapping segments only if they describe the same continuous motion—use the earliest start, latest end, and combine details.",
-        "4. Do not separate actions by individual arms; describe arm actions collectively (e.g., 'Both arms pick up…').",
-        "5. Keep segments granular: start a new segment whenever the action changes (e.g., moving vs. grasping vs. placing).",
-        "6. Preserve the exact MM:SS–MM:SS format.",
-        "7. Ensure no two segments start at the same timestamp: if two would share a start, set the later one's start to the earlier segment's end.",
-        "8. Output ONLY the unified list, one segment per line, with no extra text.",
-        "",
-        "# Expected unified output:",
-        "00:00–00:06 : Both arms pick up an AA Duracell battery and insert it into the battery compartment.",
-        "00:06–00:09 : Left arms pick up a second AA Duracell battery and insert it into the battery compartment.",
-        "00:09–00:14 : Right arms retract upward, Right arm rotates slightly, and close the battery compartment door.",
-        "00:14–00:17 : Both arms move away from the closed battery compartment."
-    ]
+def _fuse_descriptions(timeline) -> str:
+    """
+    Have Gemini rewrite the descriptions of a locally merged timeline, keeping its time ranges
+    
+    Falls back to the local descriptions when the answer does not keep every time range.
+    """
+    response = generate_with_instructions(DEFAULT_MODEL, FUSION, format_segments(timeline), call="fusion")
+    return _keep_time_ranges(response.text, timeline)
 
+def _view_segment_lines(analysis_results: Dict[str, str]) -> List[str]:
+    """The four segment lists as request contents for the model merge"""
+    lines = []
     # 添加各个视角的描述
-    for view in ["top", "front", "right", "left"]:
+    for view in VIEW_ORDER:
         segments = analysis_results.get(view, "")
-        prompt_lines.append(f"\n{view.capitalize()} view segments:")
+        lines.append(f"\n{view.capitalize()} view segments:")
         if segments:
-            prompt_lines.append(segments)
+            lines.append(segments)
         else:
-            prompt_lines.append("No analysis available")
+            lines.append("No analysis available")
+    return lines
 
-    # 调用Gemini API
-    client = genai.Client(api_key=api_key)
-    response = client.models.generate_content(
-        model="gemini-2.0-flash",
-        contents=prompt_lines
-    )
+def _merge_with_model(analysis_results: Dict[str, str]) -> str:
+    """Merge the four segment lists with Gemini, following the rules in the MERGE instructions"""
+    # Verify API key
+    if not GeminiPool.keys():
+        raise RuntimeError("GOOGLE_API_KEY not found in environment variables")
+
+    # 调用Gemini API（共享客户端池负责限流与重试）
+    response = generate_with_instructions(DEFAULT_MODEL, MERGE, _view_segment_lines(analysis_results), call="merge")
+
+    return response.text
+
+def merge_and_summarize(analysis_results: Dict[str, str], mode: Optional[str] = None) -> Optional[Dict[str, str]]:
+    """
+    Merge the timeline and write the summary with a single Gemini call returning JSON
+    
+    Only applies when SUMMARY_IN_COMBINE is on and the merge mode calls Gemini anyway
+    (fusion or model); the local merge has no call to fold the summary into.
+    
+    Args:
+        analysis_results: Dictionary containing analysis results from four perspectives
+        mode: local, fusion or model, if None then use TIMELINE_MERGE_MODE
+        
+    Returns:
+        Dictionary containing summary and timeline, or None when the timeline and summary
+        have to be produced separately (folding off, local mode, or an unusable answer)
+    """
+    mode = mode or TIMELINE_MERGE_MODE
+    if not SUMMARY_IN_COMBINE or mode == "local":
+        return None
+
+    config = types.GenerateContentConfig(response_mime_type="application/json", response_schema=COMBINED_SCHEMA)
+    local = _merge_locally(analysis_results) if mode == "fusion" else []
+    if local:
+        prompt, contents, call = with_summary(FUSION), format_segments(local), "fusion"
+    else:
+        prompt, contents, call = with_summary(MERGE), _view_segment_lines(analysis_results), "merge"
+    response = generate_with_instructions(DEFAULT_MODEL, prompt, contents, call=call, config=config)
+
+    try:
+        answer = json.loads(response.text)
+        timeline = "\n".join(line.strip() for line in answer["timeline"])
+        summary = answer["summary"].strip()
+    except (TypeError, ValueError, KeyError, AttributeError) as e:
+        print(f"Combined answer is not the expected JSON ({e}), merging and summarizing separately")
+        return None
+    if local:
+        timeline = _keep_time_ranges(timeline, local)
+    return {
+        "summary": summary,
+        "timeline": timeline
+    }
+
+def combine_analysis_results(analysis_results: Dict[str, str]) -> Dict[str, str]:
+    """
+    Combine analysis results from four perspectives into a complete description and generate a summary
+    
+    Args:
+        analysis_results: Dictionary containing analysis results from four perspectives
+        
+    Returns:
+        Dictionary containing summary and detailed timeline
+    """
+    combined = merge_and_summarize(analysis_results)
+    if combined is not None:
+        return combined
+
+    timeline = merge_timelines(analysis_results)
 
     # 生成总结
-    summary = generate_video_summary(response.text)
+    summary = generate_video_summary(timeline)
 
     return {
         "summary": summary,
-        "timeline": response.text
+        "timeline": timeline
     }
 
 def main():
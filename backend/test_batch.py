@@ -0,0 +1,93 @@
+import json
+import os
+import shutil
+import batch
+import pipeline
+from batch import BatchRunner, find_videos, load_manifest
+from video_separator import VIEWS
+
+
+def _fake_process_video(video_path, video_hash=None, separated_videos=None, engine=None, **kwargs):
+    failed = "broken" in os.path.basename(video_path)
+    return {
+        "video_hash": video_hash,
+        "separated_videos": separated_videos,
+        "full_res_videos": {},
+        "analysis_results": {view: "Analysis failed: timed out" if failed else "00:00–00:01 : Gripper opens."
+                             for view in separated_videos},
+        "combined_result": {"timeline": "", "summary": ""},
+        "engine": engine,
+    }
+
+
+def _read_jsonl(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_find_videos_from_directories_and_lists(tmp_path):
+    (tmp_path / "b").mkdir()
+    for name in ("a/2.mp4", "a/1.MOV", "b/3.mkv", "a/notes.txt"):
+        path = tmp_path / name
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(b"")
+    listing = tmp_path / "list.txt"
+    listing.write_text('# recordings\nb/3.mkv\n{"path": "extra.mp4"}\n')
+    assert find_videos([str(tmp_path / "a"), str(tmp_path / "b"), str(listing)]) == [
+        str(tmp_path / "a/1.MOV"), str(tmp_path / "a/2.mp4"), str(tmp_path / "b/3.mkv"), str(tmp_path / "extra.mp4")]
+
+
+def test_load_manifest_ignores_cut_off_line(tmp_path):
+    manifest = tmp_path / "out.jsonl.manifest.jsonl"
+    manifest.write_text('{"path": "a.mp4", "state": "split"}\n{"path": "a.mp4", "state": "done"}\n{"path": "b.mp')
+    assert load_manifest(str(manifest)) == {"a.mp4": {"path": "a.mp4", "state": "done"}}
+
+
+def test_run_checkpoints_and_resumes(tmp_path, video_file, monkeypatch):
+    monkeypatch.setattr(pipeline, "RESULT_CACHE_ENABLED", False)
+    monkeypatch.setattr(batch, "process_video", _fake_process_video)
+    monkeypatch.setattr(batch, "index_result", lambda *args, **kwargs: None)
+    videos = [str(tmp_path / "good.mp4"), str(tmp_path / "broken.mp4")]
+    for video in videos:
+        shutil.copy(video_file, video)
+    output = str(tmp_path / "results.jsonl")
+
+    runner = BatchRunner(output, str(tmp_path / "work"), split_workers=1, analyze_workers=1)
+    assert runner.run(videos) == {"done": 1, "failed": 1, "skipped": 0}
+    records = {record["path"]: record for record in _read_jsonl(output)}
+    assert records[videos[0]]["status"] == "done"
+    assert set(records[videos[0]]["separated_videos"]) == set(VIEWS)
+    assert records[videos[0]]["engine"] == "opencv"
+    assert records[videos[1]]["error"].startswith("top: Analysis failed")
+
+    # Only the failed recording runs again
+    runner = BatchRunner(output, str(tmp_path / "work"), split_workers=1, analyze_workers=1)
+    assert runner.run(videos) == {"done": 0, "failed": 1, "skipped": 1}
+    records = _read_jsonl(output)
+    assert len(records) == 3
+    assert records[-1]["path"] == videos[1] and records[-1]["error"].startswith("top: Analysis failed")
+    assert load_manifest(runner.manifest_path)[videos[1]]["state"] == "failed"
+
+    runner = BatchRunner(output, str(tmp_path / "work"), split_workers=1, analyze_workers=1, retry_failed=False)
+    assert runner.run(videos) == {"done": 0, "failed": 0, "skipped": 2}
+
+
+def test_split_checkpoint_is_analyzed_without_splitting(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline, "RESULT_CACHE_ENABLED", False)
+    monkeypatch.setattr(batch, "process_video", _fake_process_video)
+    monkeypatch.setattr(batch, "index_result", lambda *args, **kwargs: None)
+    video = str(tmp_path / "good.mp4")
+    clips = {view: str(tmp_path / f"{view}.mp4") for view in VIEWS}
+    for path in (video, *clips.values()):
+        open(path, "wb").close()
+    output = str(tmp_path / "results.jsonl")
+    with open(output + batch.MANIFEST_SUFFIX, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"path": video, "state": "split", "video_hash": "abc",
+                            "separated_videos": clips, "engine": "ffmpeg"}) + "\n")
+
+    runner = BatchRunner(output, str(tmp_path / "work"), split_workers=1, analyze_workers=1)
+    assert runner.run([video]) == {"done": 1, "failed": 0, "skipped": 0}
+    record = _read_jsonl(output)[0]
+    assert record["separated_videos"] == clips
+    # The clips stay keyed by the engine that wrote them
+    assert record["engine"] == "ffmpeg"
@@ -0,0 +1,86 @@
+import os
+import shutil
+import cv2
+import pytest
+import video_separator
+from ffmpeg_separator import FFmpegSeparator, codec_args
+from video_separator import FFMPEG_BINARY, VIEWS, VideoSeparator, create_separator, output_format
+
+needs_ffmpeg = pytest.mark.skipif(shutil.which(FFMPEG_BINARY) is None, reason="ffmpeg is not installed")
+
+
+def _filter_graph(command):
+    return command[command.index("-filter_complex") + 1].split(";")
+
+
+def test_build_command_filter_graph(tmp_path):
+    separator = FFmpegSeparator("in.mp4", str(tmp_path), profiles={view: {"fps": 1, "max_dim": 0, "quality": 0}
+                                                                  for view in VIEWS})
+    paths = separator._output_paths()
+    full_res_paths = separator._output_paths("_full")
+    command = separator._build_command(paths, full_res_paths, quadrant=161, w_sub=160, h_sub=120,
+                                       source_fps=30.0, clip_fps=[1.0] * 4, sizes=[None, (60, 45), None, None])
+
+    graph = _filter_graph(command)
+    assert graph[0] == "[0:v]split=9[in_count][in_v0][in_v1][in_v2][in_v3][in_f0][in_f1][in_f2][in_f3]"
+    sample = ("select='eq(n,0)+gt(floor(n/30.000000),floor((n-1)/30.000000))',"
+              "setpts=N/(1.000000*TB)")
+    assert graph[1] == f"[in_v0]{sample},crop=160:120:0:0[v0]"
+    assert graph[2] == "[in_f0]crop=160:120:0:0[f0]"
+    # The front view is scaled, then rotated
+    assert graph[3] == f"[in_v1]{sample},crop=160:120:161:0,scale=60:45:flags=area,transpose=1[v1]"
+    assert graph[4] == "[in_f1]crop=160:120:161:0,transpose=1[f1]"
+    assert graph[7] == f"[in_v3]{sample},crop=160:120:483:0[v3]"
+
+    assert command[command.index("-map") + 1] == "[in_count]"
+    codec = codec_args(separator.preset)
+    for i, view in enumerate(VIEWS):
+        position = command.index(paths[view])
+        assert command[position - len(codec) - 5:position] == ["-map", f"[v{i}]", "-an", "-r", "1.000000", *codec]
+        position = command.index(full_res_paths[view])
+        assert command[position - len(codec) - 3:position] == ["-map", f"[f{i}]", "-an", *codec]
+
+
+def test_sample_keeps_every_frame_at_source_rate():
+    assert FFmpegSeparator._sample(30.0, 30.0) == []
+
+
+def test_static_threshold_falls_back_to_opencv_key(tmp_path, video_file, monkeypatch):
+    # Pretend the binary is installed; static-frame dropping is only done by the OpenCV engine
+    monkeypatch.setattr(video_separator.shutil, "which", lambda name: "/usr/bin/ffmpeg")
+    separator = create_separator(video_file, str(tmp_path / "out"), engine="ffmpeg", static_threshold=2.0)
+    assert type(separator) is VideoSeparator
+    assert video_separator.separator_engine("ffmpeg", video_file, static_threshold=2.0) == "opencv"
+
+    separator = FFmpegSeparator(video_file, str(tmp_path / "out"), static_threshold=2.0)
+    separator.separate_video()
+    assert separator.engine == "opencv"
+    assert output_format(separator.engine) == output_format("opencv")
+
+
+def test_pipe_input_uses_opencv_key(tmp_path, monkeypatch):
+    monkeypatch.setattr(video_separator, "ANALYSIS_STATIC_THRESHOLD", 0.0)
+    monkeypatch.setattr(video_separator.shutil, "which", lambda name: "/usr/bin/ffmpeg")
+    fifo = str(tmp_path / "stream.mp4")
+    os.mkfifo(fifo)
+    assert output_format("ffmpeg", fifo) == output_format("opencv")
+    (tmp_path / "file.mp4").write_bytes(b"")
+    assert output_format("ffmpeg", str(tmp_path / "file.mp4")) != output_format("opencv")
+
+
+@needs_ffmpeg
+def test_ffmpeg_split_matches_opencv(tmp_path, video_file):
+    ffmpeg = FFmpegSeparator(video_file, str(tmp_path / "ffmpeg"), full_res=True, static_threshold=0)
+    clips = ffmpeg.separate_video()
+    opencv = VideoSeparator(video_file, str(tmp_path / "opencv"), static_threshold=0)
+    opencv.separate_video()
+
+    assert ffmpeg.engine == "ffmpeg" and ffmpeg.stats["engine"] == "ffmpeg"
+    assert ffmpeg.stats["frames"] == opencv.stats["frames"]
+    assert ffmpeg.stats["clip_frames"] == opencv.stats["clip_frames"]
+    for view in VIEWS:
+        cap = cv2.VideoCapture(clips[view])
+        size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        cap.release()
+        assert size == ((60, 80) if view == "front" else (80, 60))
+        assert os.path.exists(ffmpeg.full_res_videos[view])
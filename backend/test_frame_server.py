@@ -0,0 +1,88 @@
+import io
+import json
+import os
+import shutil
+import zipfile
+import cv2
+import numpy as np
+from benchmark import generate_video
+from frame_server import FrameServer, build_sprite, build_zip, read_frames
+
+
+def _all_frames(path):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while True:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def test_read_frames_in_any_order(video_file):
+    expected = _all_frames(video_file)
+    frames = read_frames(video_file, [0.7, 0.0, 0.35, 0.7, 5.0])
+    assert np.array_equal(frames[0], expected[7])
+    assert np.array_equal(frames[1], expected[0])
+    assert np.array_equal(frames[2], expected[3])
+    assert np.array_equal(frames[3], expected[7])
+    assert frames[4] is None
+
+
+def test_decoder_pool_is_bounded(tmp_path, video_file):
+    server = FrameServer(pool_size=2)
+    paths = []
+    for i in range(3):
+        path = str(tmp_path / f"copy{i}.mp4")
+        shutil.copy(video_file, path)
+        paths.append(path)
+    try:
+        for path in paths + paths[:1]:
+            assert server.get_jpeg(path, 0.5)
+        assert len(server._decoders) == 2
+        assert server.get_jpeg(paths[0], 9.0) is None
+    finally:
+        server.close()
+    assert not server._decoders and not server._jpegs
+
+
+def test_rewritten_video_is_decoded_again(tmp_path):
+    path = str(tmp_path / "recording.mp4")
+    generate_video(path, width=320, height=60, duration=1, fps=10)
+    server = FrameServer()
+    first = server.get_jpeg(path, 0.0)
+    generate_video(path, width=160, height=60, duration=1, fps=10)
+    os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 1_000_000_000))
+    second = server.get_jpeg(path, 0.0)
+    server.close()
+    shapes = [cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR).shape[:2] for data in (first, second)]
+    assert shapes == [(60, 320), (60, 160)]
+
+
+def test_jpeg_cache_is_bounded(video_file):
+    limit = len(FrameServer().get_jpeg(video_file, 0.0)) * 5 // 2
+    server = FrameServer(cache_max_bytes=limit)
+    try:
+        for i in range(10):
+            assert server.get_jpeg(video_file, i / 10)
+        assert 0 < len(server._jpegs) < 10
+        assert server._jpeg_bytes <= limit
+        assert server._jpeg_bytes == sum(len(data) for data in server._jpegs.values())
+    finally:
+        server.close()
+
+
+def test_sprite_and_zip_layout(video_file):
+    timestamps = [0.0, 0.5, 5.0]
+    frames = read_frames(video_file, timestamps)
+    data, layout = build_sprite(frames, width=40)
+    assert layout == {"columns": 2, "rows": 2, "tile_width": 40, "tile_height": 8}
+    sheet = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    assert sheet.shape[:2] == (16, 80)
+
+    with zipfile.ZipFile(io.BytesIO(build_zip(frames, timestamps, width=40))) as archive:
+        index = json.loads(archive.read("index.json"))
+        assert [entry["index"] for entry in index] == [0, 1]
+        assert sorted(archive.namelist()) == sorted([entry["file"] for entry in index] + ["index.json"])
@@ -0,0 +1,35 @@
+from types import SimpleNamespace
+from gemini_cache import CachedContentRegistry
+from prompts import Prompt
+
+PROMPT = Prompt("merge", "1", "Merge the segment lists.")
+
+
+class FakeCaches:
+    def __init__(self):
+        self.created = 0
+
+    def create(self, model, config):
+        self.created += 1
+        return SimpleNamespace(name=f"cachedContents/{self.created}")
+
+
+def test_cached_content_is_reused_until_it_expires():
+    registry = CachedContentRegistry()
+    client = SimpleNamespace(caches=FakeCaches())
+    assert registry.get_or_create(client, "key", "model", PROMPT, ttl=3600) == "cachedContents/1"
+    assert registry.get_or_create(client, "key", "model", PROMPT, ttl=3600) == "cachedContents/1"
+    assert client.caches.created == 1
+
+
+def test_expired_entries_are_evicted_on_lookup():
+    registry = CachedContentRegistry()
+    client = SimpleNamespace(caches=FakeCaches())
+    # A TTL below the expiry margin expires right away
+    for version in range(5):
+        registry.get_or_create(client, "key", "model", Prompt("merge", str(version), PROMPT.text), ttl=0)
+    assert len(registry._entries) == 1
+    assert list(registry._key_locks) == list(registry._entries)
+
+    registry.invalidate("key", "model", Prompt("merge", "4", PROMPT.text))
+    assert registry._entries == {} and registry._key_locks == {}
@@ -0,0 +1,114 @@
+import time
+import pytest
+import gemini_client
+from gemini_client import GeminiPool
+
+
+class ApiError(Exception):
+    def __init__(self, code):
+        super().__init__(f"{code} error")
+        self.code = code
+
+
+class Response:
+    text = "ok"
+    usage_metadata = None
+
+
+class FakeClient:
+    def __init__(self, api_key, failures):
+        self.api_key = api_key
+        self.failures = failures
+        self.models = self
+
+    def generate_content(self, model, contents, **kwargs):
+        self.failures["calls"].append(self.api_key)
+        errors = self.failures.get(self.api_key) or []
+        if errors:
+            raise ApiError(errors.pop(0))
+        return Response()
+
+
+@pytest.fixture
+def fake_pool(monkeypatch):
+    failures = {"calls": []}
+    monkeypatch.setattr(gemini_client, "_client_factory", lambda api_key: FakeClient(api_key, failures))
+    monkeypatch.setenv("GEMINI_API_KEYS", "key-a,key-b")
+    return GeminiPool(rpm=0, tpm=0), failures
+
+
+def test_zero_retries_still_makes_one_attempt(fake_pool):
+    pool, failures = fake_pool
+    response = pool.generate_content("model", "hello", "test", max_retries=0)
+    assert response.text == "ok"
+    assert len(failures["calls"]) == 1
+
+    failures["key-a"] = [500]
+    failures["key-b"] = [500]
+    with pytest.raises(ApiError):
+        pool.generate_content("model", "hello", "test", max_retries=0)
+    assert len(failures["calls"]) == 2
+
+
+def test_forbidden_key_is_rested_and_backed_off(fake_pool):
+    pool, failures = fake_pool
+    failures["key-a"] = [403]
+    failures["key-b"] = [403]
+    invalidated = []
+    start = time.monotonic()
+    response = pool.generate_content("model", "hello", "test", backoff_base=0.1,
+                                     on_not_found=invalidated.append)
+    assert response.text == "ok"
+    # Backoff of at least half of 0.1s, then of 0.2s
+    assert time.monotonic() - start >= 0.15
+    first, second = failures["calls"][:2]
+    assert invalidated == [first, second]
+    # The retry goes to the other key while the forbidden one cools down
+    assert second != first
+    assert pool._state(first).cooldown_until > start and pool._state(second).cooldown_until > start
+
+
+def test_forbidden_key_rotates_without_on_not_found(fake_pool):
+    pool, failures = fake_pool
+    failures["key-a"] = [403]
+    failures["key-b"] = [403]
+    assert pool.generate_content("model", "hello", "test", backoff_base=0.01).text == "ok"
+    assert len(set(failures["calls"][:2])) == 2
+
+    # A request pinned to its key has nowhere else to go
+    failures["key-a"] = [403]
+    with pytest.raises(ApiError):
+        pool.generate_content("model", "hello", "test", api_key="key-a", backoff_base=0.01)
+
+
+def test_not_found_is_raised_on_the_last_attempt(fake_pool):
+    pool, failures = fake_pool
+    failures["key-a"] = [404, 404]
+    failures["key-b"] = [404, 404]
+    invalidated = []
+    with pytest.raises(ApiError):
+        pool.generate_content("model", "hello", "test", max_retries=2, backoff_base=0.01,
+                              on_not_found=invalidated.append)
+    assert len(invalidated) == 1
+    assert len(failures["calls"]) == 2
+
+
+def test_token_bucket_waits_for_refill():
+    bucket = gemini_client.TokenBucket(60)
+    now = time.monotonic()
+    assert bucket.wait_time(60, now) == 0
+    bucket.take(60)
+    assert bucket.wait_time(1, now) == pytest.approx(1.0)
+    # A request larger than the bucket waits for a full bucket, not forever
+    assert bucket.wait_time(120, now) == pytest.approx(60.0)
+    assert gemini_client.TokenBucket(0).wait_time(10 ** 6, now) == 0
+
+
+def test_acquire_spreads_requests_over_keys_with_quota(fake_pool):
+    pool, failures = fake_pool
+    pool.rpm = 1
+    keys = [pool.acquire(10), pool.acquire(10)]
+    assert sorted(keys) == ["key-a", "key-b"]
+    # Both keys used their request; the next one would have to wait
+    now = time.monotonic()
+    assert all(pool._state(key).requests.wait_time(1, now) > 0 for key in keys)
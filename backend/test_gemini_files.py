@@ -0,0 +1,64 @@
+import os
+from google.genai import types
+import gemini_files
+from gemini_files import UploadedFileRegistry
+
+
+class FakeFiles:
+    def __init__(self):
+        self.uploads = []
+
+    def upload(self, file, config=None):
+        self.uploads.append(file)
+        return types.File(name=f"files/{len(self.uploads)}", uri=f"https://files/{len(self.uploads)}",
+                          state=types.FileState.ACTIVE)
+
+
+class FakeClient:
+    def __init__(self):
+        self.files = FakeFiles()
+
+
+def _clip(tmp_path, name):
+    path = tmp_path / name
+    path.write_bytes(b"\0" * 64)
+    return str(path)
+
+
+def test_upload_is_reused_for_unchanged_clip(tmp_path):
+    registry = UploadedFileRegistry()
+    client = FakeClient()
+    clip = _clip(tmp_path, "a.mp4")
+    first = registry.get_or_upload(client, "key", clip, "video/mp4")
+    assert registry.get_or_upload(client, "key", clip, "video/mp4") is first
+    assert client.files.uploads == [clip]
+
+
+def test_deleted_and_expired_clips_are_pruned_with_their_locks(tmp_path, monkeypatch):
+    registry = UploadedFileRegistry()
+    client = FakeClient()
+    deleted = _clip(tmp_path, "deleted.mp4")
+    registry.get_or_upload(client, "key", deleted, "video/mp4")
+    os.remove(deleted)
+
+    kept = _clip(tmp_path, "kept.mp4")
+    registry.get_or_upload(client, "key", kept, "video/mp4")
+    assert [key[1] for key in registry._entries] == [os.path.realpath(kept)]
+    assert list(registry._key_locks) == list(registry._entries)
+
+    monkeypatch.setattr(gemini_files, "GEMINI_FILE_REUSE_SECONDS", 0)
+    other = _clip(tmp_path, "other.mp4")
+    registry.get_or_upload(client, "key", other, "video/mp4")
+    assert [key[1] for key in registry._entries] == [os.path.realpath(other)]
+    assert len(registry._key_locks) == 1
+
+
+def test_invalidate_drops_entry_and_lock(tmp_path):
+    registry = UploadedFileRegistry()
+    client = FakeClient()
+    clip = _clip(tmp_path, "a.mp4")
+    registry.get_or_upload(client, "key", clip, "video/mp4")
+    registry.invalidate("key", clip)
+    assert registry._entries == {} and registry._key_locks == {}
+    registry.get_or_upload(client, "key", clip, "video/mp4")
+    assert len(client.files.uploads) == 2
@@ -0,0 +1,111 @@
+import hashlib
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import ingest
+from ingest import DownloadTooLarge, download, download_and_split
+from video_separator import VIEWS
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """Serves the bytes in server.files, with byte ranges"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def _body(self):
+        data = self.server.files.get(self.path)
+        if data is None:
+            self.send_error(404)
+            return None
+        start, end = 0, len(data) - 1
+        requested = self.headers.get("Range")
+        if requested:
+            first, _, last = requested[len("bytes="):].partition("-")
+            start, end = int(first), int(last) if last else end
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(end + 1 - start))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        return data[start:end + 1]
+
+    def do_HEAD(self):
+        self._body()
+
+    def do_GET(self):
+        body = self._body()
+        if body is not None:
+            self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    httpd.files = {}
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _url(server, path):
+    return f"http://127.0.0.1:{server.server_address[1]}{path}"
+
+
+def test_download_hashes_while_streaming(tmp_path, server):
+    data = os.urandom(300_000)
+    server.files["/video.mp4"] = data
+    chunks = []
+    result = download(_url(server, "/video.mp4"), str(tmp_path / "video.mp4"), sink=chunks.append)
+    assert result["bytes"] == len(data)
+    assert result["sha256"] == hashlib.sha256(data).hexdigest()
+    assert b"".join(chunks) == data
+    assert not os.path.exists(str(tmp_path / "video.mp4") + ingest.PART_SUFFIX)
+
+
+def test_download_resumes_part_file(tmp_path, server):
+    data = os.urandom(100_000)
+    server.files["/video.mp4"] = data
+    dest = str(tmp_path / "video.mp4")
+    with open(dest + ingest.PART_SUFFIX, "wb") as f:
+        f.write(data[:40_000])
+    result = download(_url(server, "/video.mp4"), dest)
+    assert result["sha256"] == hashlib.sha256(data).hexdigest()
+    with open(dest, "rb") as f:
+        assert f.read() == data
+
+
+def test_parallel_ranges_match_the_file(tmp_path, server, monkeypatch):
+    monkeypatch.setattr(ingest, "INGEST_PARALLEL_MIN_BYTES", 1)
+    monkeypatch.setattr(ingest, "INGEST_RANGE_SIZE", 64 * 1024)
+    data = os.urandom(1_000_000)
+    server.files["/video.mp4"] = data
+    result = download(_url(server, "/video.mp4"), str(tmp_path / "video.mp4"))
+    assert result["sha256"] == hashlib.sha256(data).hexdigest()
+    with open(result["path"], "rb") as f:
+        assert f.read() == data
+    assert os.listdir(tmp_path) == ["video.mp4"]
+
+
+def test_download_over_the_limit_is_removed(tmp_path, server):
+    server.files["/video.mp4"] = os.urandom(10_000)
+    with pytest.raises(DownloadTooLarge):
+        download(_url(server, "/video.mp4"), str(tmp_path / "video.mp4"), max_bytes=1_000)
+    assert os.listdir(tmp_path) == []
+
+
+def test_download_and_split_reports_the_engine(tmp_path, server, video_file):
+    with open(video_file, "rb") as f:
+        server.files["/recording.mp4"] = f.read()
+    dest = str(tmp_path / "downloads" / "recording.mp4")
+    os.makedirs(os.path.dirname(dest))
+    result = download_and_split(_url(server, "/recording.mp4"), dest, output_dir=str(tmp_path / "split"))
+    assert set(result["separated_videos"]) == set(VIEWS)
+    assert all(os.path.exists(path) for path in result["separated_videos"].values())
+    assert result["engine"] == "opencv"
+    assert os.listdir(os.path.dirname(dest)) == ["recording.mp4"]
@@ -0,0 +1,96 @@
+import threading
+import time
+import job_queue
+from job_queue import JobQueue
+
+
+def _wait_for(queue, job_id, status, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job["status"] == status:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} never reached {status}: {queue.get(job_id)}")
+
+
+def test_heartbeat_keeps_long_stage_from_being_requeued(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_queue, "JOB_STALE_SECONDS", 0.3)
+    monkeypatch.setattr(job_queue, "JOB_HEARTBEAT_INTERVAL", 0.05)
+    release = threading.Event()
+    calls = []
+
+    def handler(payload, context):
+        calls.append(payload)
+        context.stage("analyze")
+        release.wait(5)
+        return {"ok": True}
+
+    queue = JobQueue(handler, db_path=str(tmp_path / "jobs.db"), workers=1)
+    queue.start()
+    try:
+        job_id = queue.submit("file", {"n": 1})
+        _wait_for(queue, job_id, "running")
+        time.sleep(0.6)
+        # Another server process starting up must not take over the job
+        other = JobQueue(handler, db_path=str(tmp_path / "jobs.db"), workers=0)
+        assert other.requeue_stale() == 0
+        release.set()
+        job = _wait_for(queue, job_id, "done")
+    finally:
+        release.set()
+        queue.stop(timeout=5)
+    assert job["result"] == {"ok": True}
+    assert calls == [{"n": 1}]
+
+
+def test_requeue_stale_without_heartbeat(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_queue, "JOB_STALE_SECONDS", 0.1)
+    queue = JobQueue(lambda payload, context: {}, db_path=str(tmp_path / "jobs.db"), workers=0)
+    job_id = queue.submit("file", {})
+    assert queue._claim()["id"] == job_id
+    time.sleep(0.2)
+    assert queue.requeue_stale() == 1
+    assert queue.get(job_id)["status"] == "queued"
+
+
+def test_job_reports_stages_and_events(tmp_path):
+    def handler(payload, context):
+        context.plan(["split", "analyze"])
+        context.stage("split")
+        context.emit("segments_delta", view="top", text="00:00")
+        context.stage("analyze", views=["top"])
+        context.emit("segments", view="top", segments="00:00–00:01 : Gripper opens.")
+        return {"filename": payload["filename"]}
+
+    queue = JobQueue(handler, db_path=str(tmp_path / "jobs.db"), workers=1)
+    queue.start()
+    try:
+        job = _wait_for(queue, queue.submit("file", {"filename": "a.mp4"}), "done")
+    finally:
+        queue.stop(timeout=5)
+    assert job["result"] == {"filename": "a.mp4"}
+    assert job["progress"] == 1.0
+    assert [job["stages"][name]["status"] for name in ("split", "analyze")] == ["done", "done"]
+    assert job["stages"]["analyze"]["views"] == ["top"]
+    # Streamed fragments are dropped once the job is finished
+    assert [event["type"] for event in queue.events(job["id"])] == ["stage", "stage", "segments", "done"]
+    assert queue.counts() == {"done": 1}
+
+
+def test_failed_job_marks_its_stage(tmp_path):
+    def handler(payload, context):
+        context.stage("download")
+        raise RuntimeError("connection reset")
+
+    queue = JobQueue(handler, db_path=str(tmp_path / "jobs.db"), workers=1)
+    queue.start()
+    try:
+        job = _wait_for(queue, queue.submit("url", {"url": "http://example.invalid/a.mp4"}), "failed")
+    finally:
+        queue.stop(timeout=5)
+    assert job["error"] == "connection reset"
+    assert job["stages"]["download"]["status"] == "failed"
+    event = queue.events(job["id"])[-1]
+    assert (event["type"], event["data"]) == ("failed", {"error": "connection reset"})
+    assert queue.active() == []
@@ -0,0 +1,74 @@
+import hashlib
+import os
+import time
+import result_cache
+from result_cache import ResultCache, cache_key, hash_file
+
+
+def _age(entry_dir, seconds):
+    then = time.time() - seconds
+    os.utime(os.path.join(entry_dir, result_cache.META_FILE), (then, then))
+
+
+def test_cache_key_depends_on_every_part(tmp_path):
+    path = tmp_path / "video.mp4"
+    path.write_bytes(b"video")
+    video_hash = hash_file(str(path), chunk_size=2)
+    assert video_hash == hashlib.sha256(b"video").hexdigest()
+    assert cache_key(video_hash, "opencv") != cache_key(video_hash, "ffmpeg")
+    assert cache_key("a", "bc") != cache_key("ab", "c")
+
+
+def test_json_and_files_round_trip(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"))
+    assert cache.get_json("combined", "k") is None
+    cache.put_json("combined", "k", {"summary": "A robot opens a box."})
+    assert cache.get_json("combined", "k") == {"summary": "A robot opens a box."}
+
+    clip = tmp_path / "top.mp4"
+    clip.write_bytes(b"clip")
+    stored = cache.put_files("split", "k", {"top": str(clip)})
+    assert stored["top"] != str(clip)
+    assert cache.get_files("split", "k") == stored
+    with open(stored["top"], "rb") as f:
+        assert f.read() == b"clip"
+    os.remove(stored["top"])
+    assert cache.get_files("split", "k") is None
+
+
+def test_expired_entries_miss_and_are_evicted(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"), ttl=60)
+    cache.put_json("segments", "old", "00:00–00:01 : Gripper opens.")
+    cache.put_json("segments", "new", "00:00–00:01 : Gripper closes.")
+    _age(cache._entry_dir("segments", "old"), 120)
+    assert cache.get_json("segments", "old") is None
+    assert cache.evict() == 1
+    assert os.listdir(os.path.join(cache.cache_dir, "segments")) == ["new"]
+
+
+def test_eviction_keeps_recently_used_entries_within_size(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"), max_bytes=100)
+    for key in ("a", "b", "c"):
+        cache.put_json("combined", key, "x" * 40)
+        _age(cache._entry_dir("combined", key), 30)
+    # Reading an entry counts as a use
+    assert cache.get_json("combined", "a") == "x" * 40
+    assert cache.evict() == 2
+    assert os.listdir(os.path.join(cache.cache_dir, "combined")) == ["a"]
+
+
+def test_entries_skip_staging_dir_removed_during_scan(tmp_path, monkeypatch):
+    cache = ResultCache(str(tmp_path / "cache"))
+    cache.put_json("segments", "a", {"segments": "00:00-00:01 gripper opens"})
+    staging_dir = cache._staging_dir("segments")
+    getmtime = os.path.getmtime
+
+    def racing_getmtime(path):
+        if path == staging_dir:
+            # Another process commits the entry between listdir and getmtime
+            os.rmdir(staging_dir)
+        return getmtime(path)
+
+    monkeypatch.setattr(result_cache.os.path, "getmtime", racing_getmtime)
+    assert [os.path.basename(path) for _, _, path in cache._entries()] == ["a"]
+    assert cache.evict() == 0
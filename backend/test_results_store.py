@@ -0,0 +1,44 @@
+from results_store import ResultsStore, fts_query
+
+
+def _result(top, timeline="", summary="A robot opens a container."):
+    return {
+        "analysis_results": {"top": top},
+        "combined_result": {"timeline": timeline, "summary": summary},
+        "separated_videos": {"top": "separated_videos/job/top.mp4"},
+        "full_res_videos": {"top": "separated_videos/job/top_full.mp4"},
+    }
+
+
+def test_fts_query_quotes_words():
+    assert fts_query('lid OR "gripper" clos*') == '"lid" "OR" "gripper" "clos"*'
+    assert fts_query("-- !") == ""
+
+
+def test_search_by_words_view_and_time(tmp_path):
+    store = ResultsStore(str(tmp_path / "results.db"))
+    assert store.save("a", _result("00:00–00:03 : Left arm grasps the container.\n"
+                                   "00:03–00:09 : Right arm closes the lid.",
+                                   timeline="00:00–00:09 : Both arms close the container."),
+                      filename="a.mp4", job_id="job-a") == 3
+    store.save("b", _result("00:05–00:07 : Gripper closes on the battery."), filename="b.mp4")
+
+    hits = store.search("close")
+    assert [(hit["video_hash"], hit["view"]) for hit in hits] == [("b", "top"), ("a", "timeline"), ("a", "top")]
+    assert hits[2]["time_range"] == "00:03–00:09"
+    assert hits[2]["video_path"] == "separated_videos/job/top_full.mp4"
+    # Merged timeline segments link to the top view's frames
+    assert hits[1]["video_path"] == "separated_videos/job/top_full.mp4"
+
+    assert [hit["text"] for hit in store.search(view="top", start=4, end=6)] == [
+        "Right arm closes the lid.", "Gripper closes on the battery."]
+    assert [hit["start"] for hit in store.search("close", video_hash="a")] == [0, 3]
+    assert store.search("battery", limit=1, offset=1) == []
+
+
+def test_save_replaces_earlier_segments(tmp_path):
+    store = ResultsStore(str(tmp_path / "results.db"))
+    store.save("a", _result("00:00–00:03 : Left arm grasps the container."))
+    store.save("a", _result("00:00–00:02 : Right arm lifts the lid."))
+    assert store.search("container") == []
+    assert [hit["text"] for hit in store.search(video_hash="a")] == ["Right arm lifts the lid."]
@@ -0,0 +1,55 @@
+import os
+import time
+from frame_server import FrameServer
+from storage import StorageManager
+
+
+def _age(path: str, seconds: float):
+    then = time.time() - seconds
+    os.utime(path, (then, then))
+
+
+def test_touch_keeps_modification_time(tmp_path):
+    path = tmp_path / "clip.mp4"
+    path.write_bytes(b"video")
+    _age(path, 3600)
+    mtime_ns = os.stat(path).st_mtime_ns
+
+    StorageManager.touch(str(path))
+
+    stat = os.stat(path)
+    assert stat.st_mtime_ns == mtime_ns
+    assert stat.st_atime > time.time() - 60
+
+
+def test_touch_keeps_frame_server_caches(video_file):
+    server = FrameServer(pool_size=2)
+    for timestamp in (0.0, 0.0, 0.5, 0.5):
+        assert server.get_jpeg(video_file, timestamp)
+        StorageManager.touch(video_file)
+    assert len(server._decoders) == 1
+    assert len(server._jpegs) == 2
+
+
+def test_sweep_evicts_least_recently_touched(tmp_path):
+    uploads = tmp_path / "uploads"
+    storage = StorageManager({"uploads": str(uploads)}, quota_bytes=150, ttl=86400, min_age=0)
+    for name in ("used.mp4", "unused.mp4"):
+        (uploads / name).write_bytes(b"x" * 100)
+        _age(uploads / name, 3600)
+    storage.touch(str(uploads / "used.mp4"))
+
+    assert storage.sweep() == 1
+    assert sorted(os.listdir(uploads)) == [".janitor.lock", "used.mp4"]
+
+
+def test_sweep_removes_expired_but_keeps_in_use(tmp_path):
+    uploads = tmp_path / "uploads"
+    storage = StorageManager({"uploads": str(uploads)}, quota_bytes=10 ** 9, ttl=60, min_age=0,
+                             in_use=lambda: [str(uploads / "running.mp4")])
+    for name in ("old.mp4", "running.mp4"):
+        (uploads / name).write_bytes(b"x")
+        _age(uploads / name, 3600)
+
+    assert storage.sweep() == 1
+    assert sorted(os.listdir(uploads)) == [".janitor.lock", "running.mp4"]
@@ -0,0 +1,99 @@
+from timeline import Segment, merge_view_segments, stitch_windows
+
+
+def test_stitch_windows_keeps_segments_by_midpoint():
+    windows = [
+        (0, [Segment(0, 10, "left arm grasps the container"), Segment(28, 30, "right arm lifts the lid")]),
+        (28, [Segment(0, 2, "right arm lifts the lid"), Segment(2, 8, "both arms place the battery")]),
+    ]
+    assert stitch_windows(windows, overlap=2) == [
+        Segment(0, 10, "left arm grasps the container"),
+        Segment(28, 30, "right arm lifts the lid"),
+        Segment(30, 36, "both arms place the battery"),
+    ]
+
+
+def test_stitch_windows_merges_action_crossing_the_cut():
+    # Window 0 sees 27–30, window 1 (from 28s) sees 28–30; each midpoint lands on its own side of 29
+    windows = [
+        (0, [Segment(20, 27, "a"), Segment(27, 30, "b")]),
+        (28, [Segment(0, 2, "b"), Segment(2, 6, "c")]),
+    ]
+    assert stitch_windows(windows, overlap=2) == [
+        Segment(20, 27, "a"),
+        Segment(27, 30, "b"),
+        Segment(30, 34, "c"),
+    ]
+
+
+def test_stitch_windows_keeps_different_actions_at_the_cut():
+    windows = [
+        (0, [Segment(27, 30, "left arm opens the battery door")]),
+        (28, [Segment(0, 2, "right arm presses the switch")]),
+    ]
+    assert stitch_windows(windows, overlap=2) == [
+        Segment(27, 30, "left arm opens the battery door"),
+        Segment(28, 30, "right arm presses the switch"),
+    ]
+
+
+def test_merge_view_segments_merges_identical_times():
+    merged = merge_view_segments({
+        "top": [Segment(0, 3, "left arm grasps the battery")],
+        "front": [Segment(0, 3, "right arm holds the container")],
+    })
+    assert merged == [Segment(0, 3, "Both arms: left arm grasps the battery. right arm holds the container.")]
+
+
+def test_merge_view_segments_merges_same_overlapping_motion():
+    merged = merge_view_segments({
+        "top": [Segment(0, 4, "left arm pushes the battery into the compartment")],
+        "front": [Segment(1, 4, "left arm pushes the battery into the compartment slowly")],
+    })
+    assert [(segment.start, segment.end) for segment in merged] == [(0, 4)]
+
+
+def test_merge_view_segments_shifts_only_shared_starts():
+    merged = merge_view_segments({
+        "top": [Segment(0, 3, "gripper opens"), Segment(2, 4, "lid rotates")],
+        "front": [Segment(0, 10, "container slides")],
+    })
+    assert merged == [
+        Segment(0, 3, "gripper opens."),
+        Segment(2, 4, "lid rotates."),
+        Segment(3, 10, "container slides."),
+    ]
+
+
+def test_merge_view_segments_folds_shifted_entry_into_taken_start():
+    # The 0–6 entry moves to 4–6, where the 4–5 entry already starts; they share one entry
+    merged = merge_view_segments({
+        "top": [Segment(0, 4, "gripper opens"), Segment(4, 5, "lid rotates")],
+        "front": [Segment(0, 6, "container slides")],
+    })
+    assert merged == [
+        Segment(0, 4, "gripper opens."),
+        Segment(4, 6, "lid rotates. container slides."),
+    ]
+    assert len({segment.start for segment in merged}) == len(merged)
+
+
+def test_merge_view_segments_shift_does_not_cascade():
+    merged = merge_view_segments({
+        "top": [Segment(0, 5, "grippers swing inward")],
+        "front": [Segment(0, 3, "camera shows the table"),
+                  Segment(3, 9, "container lid is removed")],
+        "left": [Segment(0, 4, "cup tilts")],
+    })
+    # Entries shifted onto 3 are folded into the 3–9 entry, which keeps its times
+    assert [(segment.start, segment.end) for segment in merged] == [(0, 3), (3, 9)]
+    assert merged[1].text.startswith("container lid is removed.")
+
+
+def test_merge_view_segments_merges_zero_length_segments():
+    merged = merge_view_segments({
+        "top": [Segment(3, 3, "gripper closes")],
+        "front": [Segment(3, 3, "gripper closes firmly")],
+    })
+    # Both land in one entry, where the near-duplicate description is dropped
+    assert merged == [Segment(3, 3, "gripper closes.")]
@@ -0,0 +1,30 @@
+import os
+import threading
+import time
+import video_analyzer
+from video_analyzer import analyze_all_videos
+
+
+def test_timed_out_windows_keep_their_clips_until_done(video_file, monkeypatch):
+    release = threading.Event()
+    seen = []
+
+    def slow_view(view, label, path, api_key, on_text=None):
+        release.wait(5)
+        seen.append((path, os.path.exists(path)))
+        return "00:00-00:01 left arm grasps the battery"
+
+    monkeypatch.setattr(video_analyzer, "_analyze_view", slow_view)
+    results = analyze_all_videos({"top": video_file}, max_workers=4, timeout=0.3, window=0.4, overlap=0.1)
+    assert results["top"].startswith("Analysis failed: timed out")
+
+    release.set()
+    deadline = time.time() + 5
+    while len(seen) < 3 and time.time() < deadline:
+        time.sleep(0.02)
+    assert len(seen) >= 3
+    assert all(exists for _, exists in seen)
+    work_dir = os.path.dirname(os.path.dirname(seen[0][0]))
+    while os.path.exists(work_dir) and time.time() < deadline:
+        time.sleep(0.02)
+    assert not os.path.exists(work_dir)
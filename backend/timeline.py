@@ -0,0 +1,278 @@
+import re
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+# "MM:SS–MM:SS : description"; models sometimes use a hyphen instead of the en dash
+SEGMENT_PATTERN = re.compile(
+    r"^\s*(?P<start>\d+(?::\d{1,2}){1,2})\s*[–—-]\s*(?P<end>\d+(?::\d{1,2}){1,2})\s*:?\s*(?P<text>.*)$"
+)
+
+
+class Segment(NamedTuple):
+    """One timeline line; start and end are in seconds"""
+    start: float
+    end: float
+    text: str
+
+
+def parse_timestamp(value: str) -> float:
+    """Convert "MM:SS" or "HH:MM:SS" to seconds"""
+    seconds = 0.0
+    for part in value.split(":"):
+        seconds = seconds * 60 + int(part)
+    return seconds
+
+
+def format_timestamp(seconds: float) -> str:
+    """Convert seconds to "MM:SS"; minutes keep counting past an hour, like the model output"""
+    total = int(round(seconds))
+    return f"{total // 60:02d}:{total % 60:02d}"
+
+
+def parse_segments(text: str) -> List[Segment]:
+    """
+    Parse a segment list in MM:SS–MM:SS : description format
+
+    Args:
+        text: Model output or combined timeline, one segment per line
+
+    Returns:
+        List[Segment]: Segments in input order; lines without a time range are skipped
+    """
+    segments = []
+    for line in text.splitlines():
+        match = SEGMENT_PATTERN.match(line)
+        if match is None:
+            continue
+        start = parse_timestamp(match.group("start"))
+        end = parse_timestamp(match.group("end"))
+        segments.append(Segment(start, max(start, end), match.group("text").strip()))
+    return segments
+
+
+def format_segments(segments: List[Segment]) -> str:
+    """Render segments back to MM:SS–MM:SS : description lines"""
+    return "\n".join(
+        f"{format_timestamp(segment.start)}–{format_timestamp(segment.end)} : {segment.text}"
+        for segment in segments
+    )
+
+
+def remap_segments(segments: List[Segment], mapping: Callable[[float], float]) -> List[Segment]:
+    """Move every segment boundary through a time mapping, e.g. from clip time to source time"""
+    return [Segment(mapping(segment.start), mapping(segment.end), segment.text) for segment in segments]
+
+
+def stitch_windows(windows: List[Tuple[float, List[Segment]]], overlap: float,
+                   min_overlap: float = 0.5, min_similarity: float = 0.2) -> List[Segment]:
+    """
+    Join segments analyzed in overlapping time windows into one list
+
+    Every overlap is cut at its middle and a segment is kept by the window whose side
+    of the cut its midpoint falls on, so an action seen by both windows appears once.
+    An action crossing the cut is seen in part by each window, so both halves can pass
+    that rule; halves from neighbouring windows that reach into the overlap and
+    describe the same action are merged into one segment.
+
+    Args:
+        windows: (window start, segments in window-local time) for each window, in time order
+        overlap: Seconds each window shares with the next one
+        min_overlap: Time overlap (IoU) needed to merge segments of neighbouring windows
+        min_similarity: Word similarity needed to merge segments of neighbouring windows
+
+    Returns:
+        List[Segment]: Segments in video time, sorted by start
+    """
+    kept: List[List[Segment]] = []
+    for index, (start, segments) in enumerate(windows):
+        lower = start + overlap / 2 if index > 0 else float("-inf")
+        upper = windows[index + 1][0] + overlap / 2 if index + 1 < len(windows) else float("inf")
+        shifted = [Segment(segment.start + start, segment.end + start, segment.text) for segment in segments]
+        kept.append([segment for segment in shifted if lower <= (segment.start + segment.end) / 2 < upper])
+
+    for index in range(len(kept) - 1):
+        zone_start = windows[index + 1][0]
+        zone_end = zone_start + overlap
+        earlier = kept[index]
+        later = []
+        for segment in kept[index + 1]:
+            match: Optional[int] = None
+            best_score = 0.0
+            if segment.start < zone_end:
+                words = _words(segment.text)
+                for position, candidate in enumerate(earlier):
+                    if candidate.end <= zone_start:
+                        continue
+                    time_overlap = _overlap(candidate.start, candidate.end, segment.start, segment.end)
+                    similarity = _similarity(_words(candidate.text), words)
+                    if time_overlap < min_overlap or similarity < min_similarity:
+                        continue
+                    if time_overlap + similarity > best_score:
+                        match, best_score = position, time_overlap + similarity
+            if match is None:
+                later.append(segment)
+                continue
+            # Keep the description of the window that saw more of the action
+            candidate = earlier[match]
+            text = segment.text if segment.end - segment.start > candidate.end - candidate.start else candidate.text
+            earlier[match] = Segment(min(candidate.start, segment.start), max(candidate.end, segment.end), text)
+        kept[index + 1] = later
+
+    stitched = [segment for segments in kept for segment in segments]
+    stitched.sort(key=lambda segment: (segment.start, segment.end))
+    return stitched
+
+
+# Words ignored when comparing descriptions
+STOP_WORDS = {
+    "a", "an", "and", "the", "of", "to", "in", "into", "on", "onto", "at", "by", "with", "from",
+    "its", "it", "is", "are", "as", "while", "then", "toward", "towards", "robotic", "arm", "arms",
+}
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+ARM_PATTERNS = {
+    "left": re.compile(r"\bleft (?:robotic )?arm\b", re.IGNORECASE),
+    "right": re.compile(r"\bright (?:robotic )?arm\b", re.IGNORECASE),
+}
+
+
+def _words(text: str) -> frozenset:
+    return frozenset(word for word in WORD_PATTERN.findall(text.lower()) if word not in STOP_WORDS)
+
+
+def _similarity(a: frozenset, b: frozenset) -> float:
+    """Jaccard similarity of two word sets"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _overlap(a_start: float, a_end: float, b_start: float, b_end: float) -> float:
+    """Intersection over union of two time ranges; zero-length ranges count as one second"""
+    a_end, b_end = max(a_end, a_start + 1), max(b_end, b_start + 1)
+    intersection = min(a_end, b_end) - max(a_start, b_start)
+    if intersection <= 0:
+        return 0.0
+    return intersection / (max(a_end, b_end) - min(a_start, b_start))
+
+
+class _Group:
+    """Segments merged into one timeline entry; texts are (view priority, description)"""
+    __slots__ = ("start", "end", "texts", "words")
+
+    def __init__(self, start: float, end: float, priority: int, text: str, words: frozenset):
+        self.start = start
+        self.end = end
+        self.texts = [(priority, text)]
+        self.words = words
+
+    def add(self, start: float, end: float, priority: int, text: str, words: frozenset, duplicate: float):
+        self.start = min(self.start, start)
+        self.end = max(self.end, end)
+        # Skip details another view already described in almost the same words
+        if all(_similarity(words, _words(existing)) < duplicate for _, existing in self.texts):
+            self.texts.append((priority, text))
+        self.words = self.words | words
+
+
+def _fuse_texts(texts: List[str]) -> str:
+    """Join the descriptions of one entry; actions seen for both arms are described collectively"""
+    sentences = [text.strip().rstrip(".") + "." for text in texts if text.strip()]
+    fused = " ".join(sentences)
+    arms = [arm for arm, pattern in ARM_PATTERNS.items() if any(pattern.search(text) for text in texts)]
+    if len(arms) == 2 and not re.match(r"^\s*both (?:robotic )?arms\b", fused, re.IGNORECASE):
+        fused = "Both arms: " + fused
+    return fused
+
+
+def merge_view_segments(view_segments: Dict[str, List[Segment]], min_overlap: float = 0.5,
+                        min_similarity: float = 0.2, duplicate: float = 0.6) -> List[Segment]:
+    """
+    Merge the segment lists of several synchronized views into one timeline
+
+    A sweep line over the segments sorted by (start, end) keeps the entries that are
+    still open; each segment joins the open entry it matches best, otherwise it starts
+    a new one. The rules are the ones the merge prompt gives the model:
+      1. Order by start time, then end time.
+      2. Segments with identical times are merged into one description.
+      3. Overlapping segments are merged only when they describe the same motion:
+         time overlap (IoU) >= min_overlap and word similarity >= min_similarity.
+         The result spans the earliest start to the latest end.
+      4. Actions of the left and right arm in one entry are described collectively.
+      5. Anything else stays a separate, granular segment.
+      6. Times stay in whole seconds for the MM:SS–MM:SS format.
+      7. No two entries share a start: a later one starts where the first entry with
+         that start ends, or is folded into it when it ends there anyway. Entries keep
+         the start the views gave them; one moved onto a start that is already taken
+         is folded into that entry instead of moving again.
+      8. Only segments are returned; format_segments() renders the list.
+
+    Args:
+        view_segments: Segments of each view, views in priority order (their details come first)
+        min_overlap: Time overlap needed to merge different descriptions
+        min_similarity: Word similarity needed to merge different descriptions
+        duplicate: Word similarity above which a description adds nothing and is dropped
+
+    Returns:
+        List[Segment]: Merged timeline
+    """
+    items = []
+    for priority, segments in enumerate(view_segments.values()):
+        for segment in segments:
+            items.append((round(segment.start), round(segment.end), priority, segment.text))
+    items.sort(key=lambda item: (item[0], item[1], item[2]))
+
+    finished: List[_Group] = []
+    open_groups: List[_Group] = []
+    for start, end, priority, text in items:
+        # Entries that ended before this segment starts can no longer change
+        still_open = []
+        for group in open_groups:
+            (still_open if group.end >= start else finished).append(group)
+        open_groups = still_open
+
+        words = _words(text)
+        best: Optional[_Group] = None
+        best_score = 0.0
+        for group in open_groups:
+            if (group.start, group.end) == (start, end):
+                score = 2.0
+            else:
+                overlap = _overlap(group.start, group.end, start, end)
+                similarity = _similarity(group.words, words)
+                if overlap < min_overlap or similarity < min_similarity:
+                    continue
+                score = overlap + similarity
+            if score > best_score:
+                best, best_score = group, score
+        if best is not None:
+            best.add(start, end, priority, text, words, duplicate)
+        else:
+            open_groups.append(_Group(start, end, priority, text, words))
+    finished.extend(open_groups)
+
+    merged = sorted(
+        (Segment(group.start, group.end, _fuse_texts([text for _, text in sorted(group.texts, key=lambda item: item[0])]))
+         for group in finished),
+        key=lambda segment: (segment.start, segment.end)
+    )
+    # The first entry at each start keeps it; the others move to its original end
+    by_start: Dict[float, Segment] = {}
+    shifted: List[Segment] = []
+    for segment in merged:
+        previous = by_start.get(segment.start)
+        if previous is None:
+            by_start[segment.start] = segment
+        elif segment.end <= previous.end:
+            # Starting at the earlier entry's end would leave nothing; fold it in instead
+            by_start[segment.start] = Segment(previous.start, previous.end,
+                                              _fuse_texts([previous.text, segment.text]))
+        else:
+            shifted.append(Segment(previous.end, segment.end, segment.text))
+    for segment in shifted:
+        previous = by_start.get(segment.start)
+        if previous is None:
+            by_start[segment.start] = segment
+        else:
+            # Moving again would cascade through the timeline; share the entry that starts there
+            by_start[segment.start] = Segment(previous.start, max(previous.end, segment.end),
+                                              _fuse_texts([previous.text, segment.text]))
+    return sorted(by_start.values(), key=lambda segment: (segment.start, segment.end))
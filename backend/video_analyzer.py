@@ -1,10 +1,21 @@
 import os
 from pathlib import Path
 from dotenv import load_dotenv
-from google import genai
+import cv2
 from google.genai import types
-from typing import Dict, Optional
+from typing import Callable, Dict, List, Optional, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+import shutil
+import tempfile
+import threading
 import time
+from gemini_files import registry, video_part
+from gemini_client import GeminiPool, estimate_text_tokens, generate_content
+from gemini_cache import generate_with_instructions
+from prompts import VIEW_PROMPTS, prompt_version, segments_prompt
+from timeline import format_segments, parse_segments, remap_segments, stitch_windows
+from video_separator import clip_time_to_source, cut_windows, load_time_map
+from metrics import run_in_context
 
 # Load environment variables
 # 1) Get the absolute path of app.py
@@ -19,134 +30,286 @@ else:
     print("Warning: .env file not found, using system environment variables")
 print("GOOGLE_API_KEY=", os.getenv("GOOGLE_API_KEY"))
 
+DEFAULT_MODEL = "gemini-2.0-flash"
+# Versions of the view and default prompts (see prompts.py), so cached segments are not reused after a change
+PROMPT_VERSION = prompt_version(*(segments_prompt(view) for view in VIEW_PROMPTS))
+
+# Concurrency settings for analyze_all_videos
+ANALYZE_MAX_WORKERS = int(os.getenv("ANALYZE_MAX_WORKERS", "4"))
+ANALYZE_VIEW_TIMEOUT = float(os.getenv("ANALYZE_VIEW_TIMEOUT", "600"))
+# Input tokens per second of video (frames sampled at 1 fps), used for the tokens/min quota
+VIDEO_TOKENS_PER_SECOND = 300
+
+# Long views are analyzed as overlapping windows of this many seconds (0 sends each view whole)
+ANALYZE_WINDOW_SECONDS = float(os.getenv("ANALYZE_WINDOW_SECONDS", "0"))
+ANALYZE_WINDOW_OVERLAP = float(os.getenv("ANALYZE_WINDOW_OVERLAP", "2"))
+# Part of the segment cache key; windowed and whole-view answers differ, and windowed
+# answers change with the stitching rules
+WINDOW_FORMAT = f"window-{ANALYZE_WINDOW_SECONDS:g}-{ANALYZE_WINDOW_OVERLAP:g}" + \
+    ("-stitch2" if ANALYZE_WINDOW_SECONDS > 0 else "")
+
 def generate_action_segments(
     video_path: str,
     api_key: str | None = None,
-    model: str = "gemini-2.0-flash",
+    model: str = DEFAULT_MODEL,
     view: str | None = None,
     prompt: str | None = None,
-    max_retries: int = 5,
-    retry_delay: int = 2,
+    max_retries: int | None = None,
+    retry_delay: float | None = None,
+    on_text: Callable[[str, int], None] | None = None,
 ) -> str:
     """
     Use Gemini to split video into detailed action segments and return text results.
 
     Args:
         video_path: Local video file path.
-        api_key: Your Google API Key; if empty, will be loaded from .env automatically.
+        api_key: Your Google API Key; if empty, the shared pool picks one of the configured keys.
         model: Name of the Gemini model to call.
         view: View label, optional up/front/left/right, corresponding to different perspectives.
-        prompt: Custom prompt; default format requirements are embedded based on view.
-        max_retries: Maximum number of retries.
-        retry_delay: Retry interval (seconds).
+        prompt: Custom prompt sent after the video; by default the view's versioned instructions
+            from prompts.segments_prompt are used.
+        max_retries: Maximum number of attempts, if None then use GEMINI_MAX_RETRIES.
+        retry_delay: First backoff delay (seconds), doubled on every retry; if None then use GEMINI_BACKOFF_BASE.
+        on_text: Stream the answer, calling on_text(fragment, attempt) as text arrives.
 
     Returns:
         Model's returned plain text segment list.
     """
-    # If no api_key provided, try loading from .env
-    if api_key is None:
-        api_key = os.getenv("GOOGLE_API_KEY")
-    if not api_key:
+    # If no api_key provided, the pool rotates over the keys loaded from .env
+    if not api_key and not GeminiPool.keys():
         raise RuntimeError("Environment variable GOOGLE_API_KEY not found, please check .env file")
 
-    # Validate and read video bytes
+    # Validate video path
     if not os.path.isfile(video_path):
         raise FileNotFoundError(f"Video file not found: {video_path}")
-    with open(video_path, "rb") as f:
-        video_bytes = f.read()
-
-    # View prompt mapping
-    view_prompts = {
-        'up': (
-            "This video is captured from an overhead camera. Provide the most detailed description possible of all movements, spatial relationships between objects, relative displacements, angle changes, and sense of speed, and note any observable changes in object state (e.g., opening, locking, deformation, tension)."
-        ),
-        'front': (
-            "This video is captured from a front-facing camera. Provide the most detailed description possible of the action sequence, including each arm's motion trajectory, the sense of gripping force, changes in object surface characteristics, and any subtle adjustments in object orientation, angle, or position."
-        ),
-        'left': (
-            "This video is captured by a camera mounted on the left robotic arm. From the left-arm perspective, provide a thorough description of each extension, rotation, and gripping action, focusing on any deformation, posture changes, and relative position shifts of objects upon contact, as well as changes in the left arm's joint angles."
-        ),
-        'right': (
-            "This video is captured by a camera mounted on the right robotic arm. From the right-arm perspective, provide a thorough description of each movement, gripping action, direction and magnitude of applied force, and describe any changes in object state, including position, orientation, locking, or any physical interactions."
-        ),
-    }
 
-    default_prompt = "Split the video into the finest-grained action segments, each focusing on one distinct action, and include the following details:\n" + \
-        "1. Time range (MM:SS–MM:SS)\n" + \
-        "2. Actor (left arm, right arm, or both)\n" + \
-        "3. Target object and any relevant properties (material, shape, etc.)\n" + \
-        "4. Motion trajectory, sense of speed, and direction of force\n" + \
-        "5. Any changes in object state or position (e.g., locked, released, rotated, displaced)\n\n" + \
-        "6. Output ONLY the unified list, one segment per line, with no extra text.\n\n" + \
-        "Example:\n" + \
-        "00:00–00:03 : The left robotic arm moves along a straight trajectory toward the center, grasps the translucent plastic container with slight locking pressure.\n" + \
-        "00:03–00:06 : The right robotic arm rotates clockwise by 45° at a slow pace, pushing a Duracell battery into the compartment until an audible click.\n" + \
-        "00:06–00:09 : Both arms lift upward and retract in synchronization, leaving the closed battery compartment behind."
-
-    # Assemble the final prompt
-    if prompt is None:
-        prompt = ""
-        if view in view_prompts:
-            prompt += view_prompts[view] + "\n\n"
-        prompt += default_prompt
-
-
-    # Call Gemini, with retry mechanism
-    client = genai.Client(api_key=api_key)
-    content = types.Content(parts=[
-        types.Part(inline_data=types.Blob(data=video_bytes, mime_type="video/mp4")),
-        types.Part(text=prompt),
-    ])
-    
-    for attempt in range(max_retries):
-        try:
-            response = client.models.generate_content(model=model, contents=content)
-            return response.text
-        except Exception as e:
-            error_str = str(e)
-            if ("503" in error_str or "500" in error_str) and attempt < max_retries - 1:
-                print(f"Encountered error ({error_str}), waiting {retry_delay} seconds before retrying... (Attempt {attempt + 1}/{max_retries})")
-                time.sleep(retry_delay)
-            else:
-                raise e
-
-def analyze_all_videos(video_paths: Dict[str, str], api_key: Optional[str] = None) -> Dict[str, str]:
+    # Call Gemini through the shared pool, which handles quota, backoff and key rotation
+    def build_content(client, key):
+        # Small clips are sent inline, large ones are uploaded once per key and reused across retries
+        parts = [video_part(client, key, video_path)]
+        if prompt is not None:
+            parts.append(types.Part(text=prompt))
+        return types.Content(parts=parts)
+
+    request = dict(
+        call="segments",
+        api_key=api_key,
+        max_retries=max_retries,
+        backoff_base=retry_delay,
+        # The uploaded file expired or was deleted; upload it again
+        on_not_found=lambda key: registry.invalidate(key, video_path),
+        on_text=on_text,
+    )
+    if prompt is not None:
+        response = generate_content(
+            model, build_content,
+            estimated_tokens=_estimate_video_tokens(video_path) + estimate_text_tokens(prompt),
+            **request
+        )
+    else:
+        # The view's instructions are the same for every video; keep them in the context cache
+        response = generate_with_instructions(
+            model, segments_prompt(view), build_content,
+            estimated_tokens=_estimate_video_tokens(video_path),
+            **request
+        )
+    return response.text
+
+def _estimate_video_tokens(video_path: str) -> int:
+    """Gemini samples one frame per second at about VIDEO_TOKENS_PER_SECOND tokens each"""
+    cap = cv2.VideoCapture(video_path)
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 1.0
+        seconds = cap.get(cv2.CAP_PROP_FRAME_COUNT) / fps
+    finally:
+        cap.release()
+    return int(max(1.0, seconds) * VIDEO_TOKENS_PER_SECOND)
+
+def _analyze_view(view: str, label: str, path: str, api_key: Optional[str],
+                  on_text: Optional[Callable[[str, int], None]] = None) -> str:
+    """Analyze a single perspective video (or one time window of it); runs inside the worker pool"""
+    print(f"\nAnalyzing {view} perspective video:")
+    print(f"Video path: {path}")
+    print(f"Perspective label: {label}")
+
+    segments = generate_action_segments(
+        video_path=path,
+        api_key=api_key,
+        view=label,
+        on_text=on_text
+    )
+
+    print(f"Analysis results ({view}):\n{segments}")
+    print("-" * 50)
+    return segments
+
+def _join_windows(windows: List[Tuple[float, str]], overlap: float, path: str) -> str:
+    """
+    Turn the per-window results of one view into a single segment list in source video time
+
+    Args:
+        windows: (window start in clip time, model output) for each window
+        overlap: Seconds each window shares with the next one
+        path: The view's analysis clip, whose time map (if any) maps clip time to source time
+    """
+    if len(windows) == 1:
+        segments = windows[0][1]
+    else:
+        stitched = stitch_windows([(start, parse_segments(text)) for start, text in windows], overlap)
+        # Keep the raw answers if the model ignored the segment format
+        segments = format_segments(stitched) if stitched else "\n".join(text for _, text in windows)
+
+    # Static frames were dropped from this clip; move the segments back to source time
+    time_map = load_time_map(path)
+    parsed = parse_segments(segments) if time_map else []
+    if parsed:
+        segments = format_segments(remap_segments(parsed, lambda seconds: clip_time_to_source(time_map, seconds)))
+    return segments
+
+def _remove_when_done(futures: List[Future], path: str):
+    """Delete path once every future has finished; requests that timed out may still read their window clips"""
+    pending = [future for future in futures if not future.done()]
+    if not pending:
+        shutil.rmtree(path, ignore_errors=True)
+        return
+    lock = threading.Lock()
+    remaining = [len(pending)]
+
+    def on_done(_future):
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            shutil.rmtree(path, ignore_errors=True)
+
+    for future in pending:
+        future.add_done_callback(on_done)
+
+def _delta_callback(on_event: Optional[Callable[..., None]], view: str, window: int):
+    """on_text callback that forwards streamed text of one window as segments_delta events"""
+    if on_event is None:
+        return None
+    return lambda text, attempt: on_event("segments_delta", view=view, window=window, attempt=attempt, text=text)
+
+def analyze_all_videos(
+    video_paths: Dict[str, str],
+    api_key: Optional[str] = None,
+    max_workers: Optional[int] = None,
+    timeout: Optional[float] = None,
+    window: Optional[float] = None,
+    overlap: Optional[float] = None,
+    on_event: Optional[Callable[..., None]] = None,
+) -> Dict[str, str]:
     """
-    Analyze videos from all perspectives
+    Analyze videos from all perspectives concurrently
+    
+    Views longer than the window are cut into overlapping time windows first. All
+    windows of all views share one worker pool, so a long recording takes about as
+    long as its windows divided by the number of workers. Segments from overlapping
+    windows are shifted back to video time and de-duplicated.
     
     Args:
         video_paths: Dictionary containing paths of videos from four perspectives
         api_key: Google API Key
+        max_workers: Maximum number of Gemini requests at the same time; 1 runs them sequentially.
+            Defaults to ANALYZE_MAX_WORKERS.
+        timeout: Seconds to wait for each view before reporting it as failed.
+            Defaults to ANALYZE_VIEW_TIMEOUT.
+        window: Window length in seconds, 0 analyzes each view in one request.
+            Defaults to ANALYZE_WINDOW_SECONDS.
+        overlap: Seconds shared by consecutive windows. Defaults to ANALYZE_WINDOW_OVERLAP.
+        on_event: Optional callback on_event(type, **data); answers are streamed as
+            "segments_delta" (view, window, attempt, text) and every finished view is
+            reported as "segments" (view, segments)
         
     Returns:
         Dictionary containing analysis results for each perspective
     """
-    results = {}
     view_mapping = {
         'top': 'up',
         'front': 'front',
         'left': 'left',
         'right': 'right'
     }
-    
-    for view, path in video_paths.items():
-        try:
-            print(f"\nAnalyzing {view} perspective video:")
-            print(f"Video path: {path}")
-            print(f"Perspective label: {view_mapping[view]}")
-            
-            segments = generate_action_segments(
-                video_path=path,
-                api_key=api_key,
-                view=view_mapping[view]
-            )
-            results[view] = segments
-            
-            print(f"Analysis results:\n{segments}")
-            print("-" * 50)
-        except Exception as e:
-            error_msg = f"Analysis failed: {str(e)}"
-            print(f"Analysis failed: {error_msg}")
-            results[view] = error_msg
+    if max_workers is None:
+        max_workers = ANALYZE_MAX_WORKERS
+    if timeout is None:
+        timeout = ANALYZE_VIEW_TIMEOUT
+    if window is None:
+        window = ANALYZE_WINDOW_SECONDS
+    if overlap is None:
+        overlap = ANALYZE_WINDOW_OVERLAP
+    max_workers = max(1, max_workers)
+
+    results = {}
+    work_dir = tempfile.mkdtemp(prefix="analyze-windows-") if window > 0 else None
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analyze")
+    submitted: List[Future] = []
+    try:
+        # Every view gets the same deadline measured from submission, so the whole
+        # call is bounded by the slowest view rather than the sum of all views.
+        # Requests still queued behind the concurrency limit share that deadline.
+        deadline = time.monotonic() + timeout
+
+        windows = {view: [(0.0, path)] for view, path in video_paths.items()}
+        if work_dir is not None:
+            # Analysis clips are small, so cutting them is quick next to a Gemini call
+            cuts = {
+                view: executor.submit(run_in_context(cut_windows), path, window, overlap, os.path.join(work_dir, view))
+                for view, path in video_paths.items()
+            }
+            submitted.extend(cuts.values())
+            for view, future in cuts.items():
+                try:
+                    windows[view] = future.result(timeout=max(0.0, deadline - time.monotonic()))
+                except Exception as e:
+                    error_msg = f"Analysis failed: could not cut into windows: {e}"
+                    print(f"Analysis failed ({view}): {error_msg}")
+                    results[view] = error_msg
+                    if on_event is not None:
+                        on_event("segments", view=view, segments=error_msg)
+
+        futures = {}
+        for view, path in video_paths.items():
+            if view in results:
+                continue
+            if len(windows[view]) > 1:
+                print(f"Analyzing {view} perspective in {len(windows[view])} windows of {window:g}s")
+            # run_in_context carries the caller's per-job metrics into the worker thread
+            futures[view] = [
+                (start, executor.submit(run_in_context(_analyze_view), view, view_mapping[view], window_path, api_key,
+                                        _delta_callback(on_event, view, index)))
+                for index, (start, window_path) in enumerate(windows[view])
+            ]
+            submitted.extend(future for _, future in futures[view])
+
+        wait([future for parts in futures.values() for _, future in parts],
+             timeout=max(0.0, deadline - time.monotonic()))
+
+        for view, parts in futures.items():
+            try:
+                answers = []
+                for start, future in parts:
+                    remaining = max(0.0, deadline - time.monotonic())
+                    answers.append((start, future.result(timeout=remaining)))
+                results[view] = _join_windows(answers, overlap, video_paths[view])
+            except TimeoutError:
+                for _, future in parts:
+                    future.cancel()
+                error_msg = f"Analysis failed: timed out after {timeout:g} seconds"
+                print(f"Analysis failed ({view}): {error_msg}")
+                results[view] = error_msg
+            except Exception as e:
+                error_msg = f"Analysis failed: {str(e)}"
+                print(f"Analysis failed ({view}): {error_msg}")
+                results[view] = error_msg
+            if on_event is not None:
+                on_event("segments", view=view, segments=results[view])
+    finally:
+        # Do not block on views that timed out; their threads finish in the background
+        # and the last one to finish removes the window clips
+        executor.shutdown(wait=False, cancel_futures=True)
+        if work_dir is not None:
+            _remove_when_done(submitted, work_dir)
             
-    return results 
\ No newline at end of file
+    return {view: results[view] for view in video_paths}
@@ -1,25 +1,251 @@
 import os
+import bisect
+import hashlib
+import json
+import queue
+import shutil
+import threading
+import time
 from pathlib import Path
 import cv2
-from typing import Dict, Optional
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from metrics import registry as metrics
+
+# Frames buffered per view between the decode thread and each encoder thread
+SEPARATOR_QUEUE_SIZE = int(os.getenv("SEPARATOR_QUEUE_SIZE", "32"))
+
+# Analysis clips: Gemini samples video at about one frame per second, so the clips it
+# receives are written at a reduced frame rate and size instead of the full camera output
+ANALYSIS_FPS = float(os.getenv("ANALYSIS_FPS", "1"))
+ANALYSIS_MAX_DIM = int(os.getenv("ANALYSIS_MAX_DIM", "768"))
+# Encoder quality 1-100 where the backend supports it (e.g. MJPG); 0 keeps the codec default
+ANALYSIS_QUALITY = int(os.getenv("ANALYSIS_QUALITY", "0"))
+ANALYSIS_CODEC = os.getenv("ANALYSIS_CODEC", "mp4v")
+# Per-view overrides of fps, max_dim and quality, e.g. {"left": {"fps": 2, "max_dim": 512}}
+ANALYSIS_VIEW_PROFILES: Dict[str, Dict] = json.loads(os.getenv("ANALYSIS_VIEW_PROFILES", "{}"))
+# Drop analysis frames whose mean absolute pixel difference from the last kept frame is
+# below this threshold (0-255); 0 keeps every sampled frame
+ANALYSIS_STATIC_THRESHOLD = float(os.getenv("ANALYSIS_STATIC_THRESHOLD", "0"))
+# Keep at least one frame this often, even in a static scene
+ANALYSIS_STATIC_MAX_GAP = float(os.getenv("ANALYSIS_STATIC_MAX_GAP", "10"))
+# Also write full-resolution per-camera files, only needed for downloads
+SEPARATOR_FULL_RES = os.getenv("SEPARATOR_FULL_RES", "0") == "1"
+# Splitting engine: "opencv" (VideoSeparator) or "ffmpeg" (ffmpeg_separator.FFmpegSeparator,
+# a single multi-threaded filter graph); ffmpeg falls back to opencv when the binary is missing
+SEPARATOR_ENGINE = os.getenv("SEPARATOR_ENGINE", "opencv")
+# Codec preset of the ffmpeg engine, see ffmpeg_separator.CODEC_PRESETS
+SEPARATOR_FFMPEG_PRESET = os.getenv("SEPARATOR_FFMPEG_PRESET", "mpeg4")
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+
+VIEWS = ["top", "front", "right", "left"]
+
+# Sidecar written next to a clip that had static frames dropped
+TIME_MAP_SUFFIX = ".times.json"
+# Width of the thumbnails compared for static-frame detection
+STATIC_THUMB_WIDTH = 64
+
+
+def analysis_profile(view: str, profiles: Optional[Dict[str, Dict]] = None) -> Dict:
+    """Frame rate, size and quality of one view's analysis clip"""
+    profile = {"fps": ANALYSIS_FPS, "max_dim": ANALYSIS_MAX_DIM, "quality": ANALYSIS_QUALITY}
+    profile.update((ANALYSIS_VIEW_PROFILES if profiles is None else profiles).get(view, {}))
+    return profile
+
+
+def separator_engine(engine: Optional[str] = None, input_path: Optional[str] = None,
+                     static_threshold: Optional[float] = None) -> str:
+    """
+    Engine that will split videos
+
+    Args:
+        engine: "opencv" or "ffmpeg", if None then use SEPARATOR_ENGINE
+        input_path: Video to split, if known; pipes are only read by opencv
+        static_threshold: Static-frame drop threshold, if None then use ANALYSIS_STATIC_THRESHOLD
+
+    Returns:
+        str: "ffmpeg" when requested, the binary is installed and the FFmpeg filter graph
+            can split the input, otherwise "opencv"
+    """
+    engine = engine or SEPARATOR_ENGINE
+    if engine != "ffmpeg" or not shutil.which(FFMPEG_BINARY):
+        return "opencv"
+    threshold = ANALYSIS_STATIC_THRESHOLD if static_threshold is None else static_threshold
+    # Static-frame dropping decides per frame in Python, and a pipe cannot be probed for its size
+    if threshold > 0 or (input_path is not None and not os.path.isfile(input_path)):
+        return "opencv"
+    return "ffmpeg"
+
+
+def output_format(engine: Optional[str] = None, input_path: Optional[str] = None) -> str:
+    """
+    Description of the separated output, part of the split and result cache keys
+
+    Args:
+        engine: Engine splitting the video, if None then use SEPARATOR_ENGINE; an
+            engine that cannot split input_path is replaced like in create_separator
+        input_path: Video to split, if known
+
+    Returns:
+        str: Format identifier of the engine's clips
+    """
+    # The ffmpeg engine encodes with its own codec preset
+    codec = f"ffmpeg-{SEPARATOR_FFMPEG_PRESET}" if separator_engine(engine, input_path) == "ffmpeg" else ANALYSIS_CODEC
+    settings = [codec, [analysis_profile(view) for view in VIEWS],
+                ANALYSIS_STATIC_THRESHOLD, ANALYSIS_STATIC_MAX_GAP]
+    digest = hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+    return f"4view-3-{codec}-{digest}"
+
+
+# Output of the configured engine; bump the version in output_format() when it changes so
+# cached splits are not reused
+OUTPUT_FORMAT = output_format()
+
+
+def time_map_path(clip_path: str) -> str:
+    """Path of the time map sidecar of an analysis clip"""
+    return os.path.splitext(clip_path)[0] + TIME_MAP_SUFFIX
+
+
+def load_time_map(clip_path: str) -> Optional[Dict]:
+    """
+    Load the time map of an analysis clip
+
+    Returns:
+        Dict: {"fps": clip frame rate, "times": source seconds of each clip frame},
+            or None when no frames were dropped and clip time equals source time
+    """
+    try:
+        with open(time_map_path(clip_path), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def clip_time_to_source(time_map: Dict, seconds: float) -> float:
+    """Convert a time in an analysis clip to the time in the source video"""
+    times = time_map["times"]
+    if not times:
+        return seconds
+    position = max(0.0, seconds * time_map["fps"])
+    index = int(position)
+    if index >= len(times) - 1:
+        return times[-1] + (position - (len(times) - 1)) / time_map["fps"]
+    return times[index] + (position - index) * (times[index + 1] - times[index])
+
+
+def source_time_to_clip(time_map: Dict, seconds: float) -> float:
+    """Convert a source video time to the clip time of the last frame kept at or before it"""
+    index = max(0, bisect.bisect_right(time_map["times"], seconds) - 1)
+    return index / time_map["fps"]
+
+
+def with_time_maps(separated_videos: Dict[str, str]) -> Dict[str, str]:
+    """Analysis clips plus their time map sidecars, e.g. for storing them in the result cache"""
+    files = dict(separated_videos)
+    for view, path in separated_videos.items():
+        if os.path.isfile(time_map_path(path)):
+            files[f"{view}_times"] = time_map_path(path)
+    return files
+
+
+def without_time_maps(files: Dict[str, str]) -> Dict[str, str]:
+    """Inverse of with_time_maps(); the sidecars stay next to the clips"""
+    return {view: path for view, path in files.items() if view in VIEWS}
+
+
+def cut_windows(clip_path: str, window: float, overlap: float, output_dir: str) -> List[Tuple[float, str]]:
+    """
+    Cut an analysis clip into overlapping time windows
+
+    Args:
+        clip_path: Analysis clip
+        window: Window length in seconds
+        overlap: Seconds each window shares with the next one
+        output_dir: Directory for the window clips
+
+    Returns:
+        List[Tuple[float, str]]: Start (in clip time) and path of every window; just the
+            clip itself when it fits in a single window
+    """
+    if overlap >= window:
+        raise ValueError(f"Window overlap ({overlap:g}s) must be shorter than the window ({window:g}s)")
+    cap = cv2.VideoCapture(clip_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Cannot open video file: {clip_path}")
+
+    writers: Dict[int, cv2.VideoWriter] = {}
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 1.0
+        duration = cap.get(cv2.CAP_PROP_FRAME_COUNT) / fps
+        if duration <= window:
+            return [(0.0, clip_path)]
+
+        step = window - overlap
+        starts = [0.0]
+        while starts[-1] + window < duration:
+            starts.append(starts[-1] + step)
+        size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        base_name = os.path.splitext(os.path.basename(clip_path))[0]
+        paths = [os.path.join(output_dir, f"{base_name}_w{k:03d}.mp4") for k in range(len(starts))]
+        os.makedirs(output_dir, exist_ok=True)
+
+        index = 0
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            seconds = index / fps
+            for k in [k for k in writers if starts[k] + window <= seconds]:
+                writers.pop(k).release()
+            # Only the windows around this frame can contain it
+            first = max(0, int((seconds - window) // step))
+            for k in range(first, min(len(starts), int(seconds // step) + 1)):
+                if not starts[k] <= seconds < starts[k] + window:
+                    continue
+                if k not in writers:
+                    writers[k] = cv2.VideoWriter(paths[k], cv2.VideoWriter_fourcc(*ANALYSIS_CODEC), fps, size)
+                writers[k].write(frame)
+            index += 1
+    finally:
+        for writer in writers.values():
+            writer.release()
+        cap.release()
+
+    return [(start, path) for start, path in zip(starts, paths) if os.path.exists(path)]
+
 
 class VideoSeparator:
-    def __init__(self, input_path: Optional[str] = None, output_dir: Optional[str] = None):
+    def __init__(self, input_path: Optional[str] = None, output_dir: Optional[str] = None,
+                 queue_size: Optional[int] = None, full_res: Optional[bool] = None,
+                 profiles: Optional[Dict[str, Dict]] = None, static_threshold: Optional[float] = None):
         """
         Initialize video separator
         
         Args:
             input_path: Input video path, if None then use default path
             output_dir: Output directory path, if None then use default path
+            queue_size: Frames buffered per view before decoding blocks, if None then use SEPARATOR_QUEUE_SIZE
+            full_res: Also write full-resolution views, if None then use SEPARATOR_FULL_RES
+            profiles: Per-view fps/max_dim/quality overrides, if None then use ANALYSIS_VIEW_PROFILES
+            static_threshold: Static-frame drop threshold, if None then use ANALYSIS_STATIC_THRESHOLD
         """
         self.base_path = Path(__file__).parent
         self.input_path = input_path
         self.output_dir = output_dir or str(self.base_path / "separated_videos")
-        
+        self.queue_size = queue_size or SEPARATOR_QUEUE_SIZE
+        self.full_res = SEPARATOR_FULL_RES if full_res is None else full_res
+        self.profiles = {view: analysis_profile(view, profiles) for view in VIEWS}
+        self.static_threshold = ANALYSIS_STATIC_THRESHOLD if static_threshold is None else static_threshold
+        self.stats: Dict = {}
+        self.full_res_videos: Dict[str, str] = {}
+        # Engine that wrote the clips, for the output_format() of the cache keys
+        self.engine = "opencv"
+    
     def _setup_output_dir(self):
         """Create output directory"""
         os.makedirs(self.output_dir, exist_ok=True)
-        
+    
     def _get_video_info(self, cap: cv2.VideoCapture) -> Dict:
         """Get video information"""
         return {
@@ -27,74 +253,258 @@ class VideoSeparator:
             "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
             "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         }
-        
-    def _create_writers(self, video_info: Dict) -> list:
-        """Create video writers"""
-        w_sub = video_info["width"] // 4
-        h_sub = video_info["height"]
+    
+    def _output_paths(self, suffix: str = "") -> Dict[str, str]:
+        """Output path of each view"""
         base_name = os.path.splitext(os.path.basename(self.input_path))[0]
-        fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-        
+        return {
+            view: str(Path(self.output_dir) / f"{base_name}_cam{i+1}{suffix}.mp4")
+            for i, view in enumerate(VIEWS)
+        }
+    
+    @staticmethod
+    def _analysis_size(w_sub: int, h_sub: int, max_dim: int) -> Optional[Tuple[int, int]]:
+        """Analysis clip size before rotation, or None when the view is already small enough"""
+        longest = max(w_sub, h_sub)
+        if not max_dim or longest <= max_dim:
+            return None
+        scale = max_dim / longest
+        # Even dimensions keep codecs with chroma subsampling happy
+        return (max(2, int(w_sub * scale) // 2 * 2), max(2, int(h_sub * scale) // 2 * 2))
+    
+    def _create_writers(self, paths: Dict[str, str], fourcc: str, fps: List[float],
+                        sizes: List[Tuple[int, int]], quality: Optional[List[int]] = None) -> list:
+        """Create video writers"""
         writers = []
-        for i in range(4):
-            out_name = f"{base_name}_cam{i+1}.mp4"
-            out_path = os.path.join(self.output_dir, out_name)
-            
+        for i, view in enumerate(VIEWS):
+            w_sub, h_sub = sizes[i]
             # The second video needs to be rotated 90 degrees
-            if i == 1:
-                writers.append(cv2.VideoWriter(out_path, fourcc, video_info["fps"], (h_sub, w_sub)))
-            else:
-                writers.append(cv2.VideoWriter(out_path, fourcc, video_info["fps"], (w_sub, h_sub)))
-                
+            frame_size = (h_sub, w_sub) if i == 1 else (w_sub, h_sub)
+            writer = cv2.VideoWriter(paths[view], cv2.VideoWriter_fourcc(*fourcc), fps[i], frame_size)
+            writers.append(writer)
+            if not writer.isOpened():
+                for created in writers:
+                    created.release()
+                raise RuntimeError(f"Cannot create video file {paths[view]} with codec {fourcc}")
+            if quality and quality[i]:
+                # Ignored by backends without a quality setting, such as FFmpeg's mp4v
+                writer.set(cv2.VIDEOWRITER_PROP_QUALITY, quality[i])
         return writers
-        
+    
+    def _encode_worker(self, index: int, writer: cv2.VideoWriter, frames: queue.Queue, errors: List,
+                       size: Optional[Tuple[int, int]] = None):
+        """Encode one view's frames until the end-of-stream marker (None) arrives"""
+        failed = False
+        while True:
+            roi = frames.get()
+            if roi is None:
+                break
+            # Keep draining after a failure so the decode thread never blocks on a full queue
+            if failed:
+                continue
+            try:
+                # Crop (already a slice), resize and rotate in one pass; resizing first keeps
+                # the rotation cheap, and both produce a contiguous copy for VideoWriter
+                if size is not None:
+                    roi = cv2.resize(roi, size, interpolation=cv2.INTER_AREA)
+                # The second video needs to be rotated 90 degrees
+                if index == 1:
+                    roi = cv2.rotate(roi, cv2.ROTATE_90_CLOCKWISE)
+                elif size is None:
+                    # VideoWriter can crash on strided input; copy here, off the decode thread
+                    roi = np.ascontiguousarray(roi)
+                writer.write(roi)
+            except Exception as e:
+                errors.append(e)
+                failed = True
+    
+    def _start_encoders(self, writers: list, sizes: List[Optional[Tuple[int, int]]], errors: List,
+                        name: str) -> Tuple[List[queue.Queue], List[threading.Thread]]:
+        """Start one encoder thread per view"""
+        queues = []
+        workers = []
+        for i, writer in enumerate(writers):
+            frames = queue.Queue(maxsize=self.queue_size)
+            worker = threading.Thread(
+                target=self._encode_worker,
+                args=(i, writer, frames, errors, sizes[i]),
+                name=f"{name}-cam{i+1}",
+                daemon=True
+            )
+            worker.start()
+            queues.append(frames)
+            workers.append(worker)
+        return queues, workers
+    
+    def _write_time_maps(self, paths: Dict[str, str], clip_fps: List[float],
+                         times: List[List[float]], dropped: List[int]):
+        """Write a time map next to each clip that had static frames dropped, remove stale ones"""
+        for i, view in enumerate(VIEWS):
+            sidecar = time_map_path(paths[view])
+            if dropped[i]:
+                with open(sidecar, "w", encoding="utf-8") as f:
+                    json.dump({"fps": clip_fps[i], "times": times[i]}, f)
+            elif os.path.exists(sidecar):
+                os.remove(sidecar)
+    
     def separate_video(self) -> Dict[str, str]:
         """
         Separate video into four perspectives
         
+        Frames are decoded on the calling thread and each view is handed to its own
+        encoder thread through a bounded queue, so the encodes run in parallel
+        (OpenCV releases the GIL while encoding). Views are numpy slices of the decoded
+        frame, so no pixel data is copied on the decode thread.
+        
+        The returned clips are sized for analysis: each view keeps only frames at its
+        profile's fps, scaled to its max_dim. Frames no view needs are grabbed but not
+        converted unless full-resolution views are also written; those paths are
+        stored in self.full_res_videos. With a static threshold, sampled frames that
+        barely differ from the view's last kept frame are dropped as well, and the
+        source time of every kept frame is written to a time map sidecar.
+        
         Returns:
-            Dict[str, str]: Dictionary containing paths to four perspectives videos
+            Dict[str, str]: Dictionary containing paths to four perspectives analysis clips
         """
         self._setup_output_dir()
         
         cap = cv2.VideoCapture(self.input_path)
         if not cap.isOpened():
             raise RuntimeError(f"Cannot open video file: {self.input_path}")
-            
+        
+        writers = []
+        queues = []
+        workers = []
+        full_queues = []
+        errors: List[Exception] = []
+        frame_count = 0
+        times: List[List[float]] = [[] for _ in VIEWS]
+        dropped = [0] * len(VIEWS)
+        analysis_paths = self._output_paths()
+        full_res_paths = self._output_paths("_full") if self.full_res else {}
+        start_time = time.perf_counter()
         try:
             video_info = self._get_video_info(cap)
-            writers = self._create_writers(video_info)
             w_sub = video_info["width"] // 4
+            h_sub = video_info["height"]
+            source_fps = video_info["fps"] or 30.0
+            
+            # Each view keeps every step-th frame (fractional steps spread the kept frames evenly)
+            clip_fps = []
+            steps = []
+            sizes = []
+            for view in VIEWS:
+                profile = self.profiles[view]
+                fps = profile["fps"] if 0 < profile["fps"] < source_fps else source_fps
+                clip_fps.append(fps)
+                steps.append(source_fps / fps)
+                sizes.append(self._analysis_size(w_sub, h_sub, profile["max_dim"]))
+            
+            writers = self._create_writers(
+                analysis_paths, ANALYSIS_CODEC, clip_fps,
+                [size or (w_sub, h_sub) for size in sizes],
+                [self.profiles[view]["quality"] for view in VIEWS]
+            )
+            queues, workers = self._start_encoders(writers, sizes, errors, "clip")
+            if self.full_res:
+                full_writers = self._create_writers(full_res_paths, "mp4v", [source_fps] * 4, [(w_sub, h_sub)] * 4)
+                writers += full_writers
+                full_queues, full_workers = self._start_encoders(full_writers, [None] * 4, errors, "full")
+                workers += full_workers
+            
+            # Static-frame detection compares small strided thumbnails, which costs far
+            # less than the encode it saves
+            thumb_stride = max(1, w_sub // STATIC_THUMB_WIDTH)
+            last_thumbs: List[Optional[np.ndarray]] = [None] * len(VIEWS)
             
             # Process each frame
-            while True:
-                ret, frame = cap.read()
+            next_frames = [0.0] * len(VIEWS)
+            while not errors:
+                due = [frame_count >= next_frame for next_frame in next_frames]
+                if any(due) or self.full_res:
+                    ret, frame = cap.read()
+                else:
+                    # Skipped frames still have to be decoded, but not converted to BGR
+                    ret, frame = cap.grab(), None
                 if not ret:
                     break
-                    
-                for i, writer in enumerate(writers):
+                
+                for i, frames in enumerate(full_queues):
                     x0 = i * w_sub
-                    roi = frame[0:video_info["height"], x0:x0 + w_sub]
-                    
-                    if i == 1:
-                        roi = cv2.rotate(roi, cv2.ROTATE_90_CLOCKWISE)
-                        
-                    writer.write(roi)
-                    
+                    frames.put(frame[:, x0:x0 + w_sub])
+                
+                seconds = frame_count / source_fps
+                for i, frames in enumerate(queues):
+                    if not due[i]:
+                        continue
+                    next_frames[i] += steps[i]
+                    x0 = i * w_sub
+                    roi = frame[:, x0:x0 + w_sub]
+                    if self.static_threshold > 0:
+                        thumb = roi[::thumb_stride, ::thumb_stride].astype(np.int16)
+                        if (last_thumbs[i] is not None
+                                and seconds - times[i][-1] < ANALYSIS_STATIC_MAX_GAP
+                                and np.abs(thumb - last_thumbs[i]).mean() < self.static_threshold):
+                            dropped[i] += 1
+                            continue
+                        last_thumbs[i] = thumb
+                    frames.put(roi)
+                    times[i].append(round(seconds, 3))
+                frame_count += 1
+        
         finally:
-            # Release resources
+            # Signal end of stream, wait for encoders, then release resources
+            for frames in queues + full_queues:
+                frames.put(None)
+            for worker in workers:
+                worker.join()
             cap.release()
             for writer in writers:
                 writer.release()
-                
-        # Return separated video paths
-        base_name = os.path.splitext(os.path.basename(self.input_path))[0]
-        return {
-            "top": str(Path(self.output_dir) / f"{base_name}_cam1.mp4"),
-            "front": str(Path(self.output_dir) / f"{base_name}_cam2.mp4"),
-            "right": str(Path(self.output_dir) / f"{base_name}_cam3.mp4"),
-            "left": str(Path(self.output_dir) / f"{base_name}_cam4.mp4")
+        
+        if errors:
+            raise RuntimeError(f"Failed to encode separated video: {errors[0]}")
+        
+        self._write_time_maps(analysis_paths, clip_fps, times, dropped)
+        
+        elapsed = time.perf_counter() - start_time
+        self.stats = {
+            "frames": frame_count,
+            "clip_frames": {view: len(times[i]) for i, view in enumerate(VIEWS)},
+            "static_frames_dropped": {view: dropped[i] for i, view in enumerate(VIEWS)},
+            "seconds": round(elapsed, 3),
+            "fps": round(frame_count / elapsed, 1) if elapsed > 0 else 0.0,
+            "engine": self.engine
         }
+        metrics.inc("frames_processed_total", frame_count)
+        metrics.inc("static_frames_dropped_total", sum(dropped))
+        metrics.observe("separate_video_seconds", elapsed)
+        metrics.set_gauge("separator_last_fps", self.stats["fps"])
+        print(f"Separated {frame_count} frames in {elapsed:.2f}s ({self.stats['fps']} fps), "
+              f"analysis clip frames {self.stats['clip_frames']}, static frames dropped {sum(dropped)}")
+        
+        self.full_res_videos = full_res_paths
+        return analysis_paths
+
+def create_separator(input_path: Optional[str] = None, output_dir: Optional[str] = None,
+                     engine: Optional[str] = None, **kwargs) -> VideoSeparator:
+    """
+    Separator of the configured engine
+
+    Args:
+        input_path: Input video path
+        output_dir: Output directory path
+        engine: "opencv" or "ffmpeg", if None then use SEPARATOR_ENGINE
+        **kwargs: Passed on to the separator (full_res, profiles, ...)
+
+    Returns:
+        VideoSeparator: A VideoSeparator, or an FFmpegSeparator which has the same interface
+    """
+    if separator_engine(engine, input_path, kwargs.get("static_threshold")) == "ffmpeg":
+        # Imported here because ffmpeg_separator builds on this module
+        from ffmpeg_separator import FFmpegSeparator
+        return FFmpegSeparator(input_path, output_dir, **kwargs)
+    return VideoSeparator(input_path, output_dir, **kwargs)
 
 def separate_video(input_path: str, output_dir: Optional[str] = None) -> Dict[str, str]:
     """
@@ -103,9 +513,9 @@ def separate_video(input_path: str, output_dir: Optional[str] = None) -> Dict[st
     Args:
         input_path: Input video path
         output_dir: Output directory path
-        
+    
     Returns:
-        Dict[str, str]: Dictionary containing paths to four perspectives videos
+        Dict[str, str]: Dictionary containing paths to four perspectives analysis clips
     """
-    separator = VideoSeparator(input_path, output_dir)
-    return separator.separate_video() 
\ No newline at end of file
+    separator = create_separator(input_path, output_dir)
+    return separator.separate_video()
@@ -1,6 +1,17 @@
 import React, { useState, useEffect, useRef, useLayoutEffect } from "react";
 import "./App.css";
 
+// 取帧用的视角视频：优先全分辨率版本，否则为分析用的小视频（与后端 _view_path 一致）
+const frameVideos = (result) => {
+  const videos = { ...(result?.separated_videos || {}) };
+  Object.entries(result?.full_res_videos || {}).forEach(([view, path]) => {
+    if (path) {
+      videos[view] = path;
+    }
+  });
+  return videos;
+};
+
 function App() {
   const [message, setMessage] = useState("");
   const [selectedFile, setSelectedFile] = useState(null);
@@ -36,6 +47,98 @@ function App() {
     setOutputData(null);
   };
 
+  // Poll the background job until it finishes; returns the job result or null on failure
+  const pollJob = async (jobId) => {
+    while (true) {
+      const statusResponse = await fetch(`http://localhost:5000/api/status/${jobId}`);
+      const job = await statusResponse.json();
+
+      if (!statusResponse.ok) {
+        setUploadStatus("Upload failed");
+        return null;
+      }
+      if (job.status === "done") {
+        return job.result;
+      }
+      if (job.status === "failed") {
+        setResponse(job);
+        setUploadStatus("Processing failed");
+        return null;
+      }
+
+      setUploadStatus(job.stage ? `Processing (${job.stage})...` : "Queued...");
+      await new Promise((resolve) => setTimeout(resolve, 2000));
+    }
+  };
+
+  // Follow the background job's event stream, showing segments, timeline and summary as they arrive;
+  // falls back to polling when the stream is unavailable. Returns the job result or null on failure
+  const waitForJob = (jobId) => {
+    if (!window.EventSource) {
+      return pollJob(jobId);
+    }
+
+    return new Promise((resolve) => {
+      const source = new EventSource(`http://localhost:5000/api/events/${jobId}`);
+      // Streamed text per view and window; a new attempt replaces the text of a failed one
+      const partial = {};
+      const attempts = {};
+      let summaryAttempt = null;
+      let finished = false;
+
+      const listen = (type, handler) => source.addEventListener(type, (e) => handler(JSON.parse(e.data)));
+      const update = (changes) => setResponse((previous) => ({ ...previous, ...changes(previous || {}) }));
+      const finish = (result) => {
+        finished = true;
+        source.close();
+        resolve(result);
+      };
+
+      listen("stage", (data) => setUploadStatus(`Processing (${data.stage})...`));
+      listen("segments_delta", ({ view, window: part, attempt, text }) => {
+        const key = `${view}:${part}`;
+        partial[view] = partial[view] || {};
+        partial[view][part] = (attempts[key] === attempt ? partial[view][part] : "") + text;
+        attempts[key] = attempt;
+        const streamed = Object.keys(partial[view])
+          .sort((a, b) => a - b)
+          .map((index) => partial[view][index])
+          .join("");
+        update((previous) => ({ analysis_results: { ...previous.analysis_results, [view]: streamed } }));
+      });
+      listen("segments", ({ view, segments }) => {
+        update((previous) => ({ analysis_results: { ...previous.analysis_results, [view]: segments } }));
+      });
+      listen("timeline", ({ timeline }) => {
+        update((previous) => ({ combined_result: { summary: "", ...previous.combined_result, timeline } }));
+      });
+      listen("summary_delta", ({ attempt, text }) => {
+        const restart = summaryAttempt !== attempt;
+        summaryAttempt = attempt;
+        update((previous) => ({
+          combined_result: { ...previous.combined_result, summary: (restart ? "" : previous.combined_result?.summary || "") + text },
+        }));
+      });
+      listen("summary", ({ summary }) => {
+        update((previous) => ({ combined_result: { ...previous.combined_result, summary } }));
+      });
+      listen("done", ({ result }) => finish(result));
+      listen("failed", ({ error }) => {
+        update(() => ({ status: "failed", error }));
+        setUploadStatus("Processing failed");
+        finish(null);
+      });
+
+      // The browser reconnects by itself after network errors; a closed stream means the endpoint is unavailable
+      source.onerror = () => {
+        if (!finished && source.readyState === EventSource.CLOSED) {
+          finished = true;
+          resolve(pollJob(jobId));
+        }
+      };
+    });
+  };
+
   const handleUpload = async () => {
     if (!file) {
       setUploadStatus("Please select a file");
@@ -57,13 +160,17 @@ function App() {
       setResponse(data);
 
       if (response.ok) {
-        setUploadStatus("Upload successful!");
-        setOutputData({
-          status: "Processing completed",
-          originalFile: data.filename,
-          videos: data.separated_videos,
-          analysis: data.analysis_results,
-        });
+        const result = await waitForJob(data.job_id);
+        if (result) {
+          setResponse(result);
+          setUploadStatus("Upload successful!");
+          setOutputData({
+            status: "Processing completed",
+            originalFile: result.filename,
+            videos: frameVideos(result),
+            analysis: result.analysis_results,
+          });
+        }
       } else {
         setUploadStatus("Upload failed");
       }
@@ -96,13 +203,17 @@ function App() {
       setResponse(data);
 
       if (response.ok) {
-        setUploadStatus("Upload successful!");
-        setOutputData({
-          status: "Processing completed",
-          originalFile: data.filename,
-          videos: data.separated_videos,
-          analysis: data.analysis_results,
-        });
+        const result = await waitForJob(data.job_id);
+        if (result) {
+          setResponse(result);
+          setUploadStatus("Upload successful!");
+          setOutputData({
+            status: "Processing completed",
+            originalFile: result.filename,
+            videos: frameVideos(result),
+            analysis: result.analysis_results,
+          });
+        }
       } else {
         setUploadStatus("Upload failed");
       }
@@ -160,10 +271,11 @@ function App() {
   };
 
   useEffect(() => {
-    if (response?.combined_result && response?.separated_videos?.front && response?.separated_videos?.top) {
+    const videos = frameVideos(response);
+    if (response?.combined_result && videos.front && videos.top) {
       console.log("Video paths:", {
-        top: response.separated_videos.top,
-        front: response.separated_videos.front,
+        top: videos.top,
+        front: videos.front,
       });
 
       timelineLines.forEach((line, index) => {
@@ -178,8 +290,8 @@ function App() {
           }
           console.log(`Processing line ${index}:`, { line, timeStr, originalTimestamp: minutes * 60 + seconds, adjustedTimestamp: timestamp });
 
-          const topPath = response.separated_videos.top.replace(/\\/g, "/");
-          const frontPath = response.separated_videos.front.replace(/\\/g, "/");
+          const topPath = videos.top.replace(/\\/g, "/");
+          const frontPath = videos.front.replace(/\\/g, "/");
 
           if (timestamp >= 0) {
             handleGetFrame(topPath, timestamp, index, "top");
@@ -194,8 +306,8 @@ function App() {
     } else {
       console.log("Missing necessary video information:", {
         hasResult: !!response?.combined_result,
-        hasFront: !!response?.separated_videos?.front,
-        hasTop: !!response?.separated_videos?.top,
+        hasFront: !!videos.front,
+        hasTop: !!videos.top,
       });
     }
   }, [timelineLines, response]);
@@ -3,5 +3,8 @@
 # 启动nginx
 nginx
 
-# 启动Flask应用
-python app.py 
\ No newline at end of file
+# 启动Flask应用（gunicorn 多进程；设置 FLASK_DEBUG=1 时使用 Flask 开发服务器）
+if [ "$FLASK_DEBUG" = "1" ]; then
+    exec python app.py
+fi
+exec gunicorn -c gunicorn.conf.py app:app